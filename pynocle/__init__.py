@@ -9,14 +9,23 @@ Simply create a new Monocle object with the directories
 and files you want to analyze (along with coverage data if you have it),
 and call generate_all.
 """
+import cgi
 import datetime
 import os
 import shutil
 import sys
 
+__version__ = '0.3.1'
+
+import _modulefinder as modulefinder
+import analysiscache
 import cyclcompl
 import depgraph
+import exporting
+import history
 import sloc
+import sourceunits
+import tracing
 import utils
 
 #  * http://en.wikipedia.org/wiki/Dependency_graph
@@ -36,27 +45,48 @@ def ensure_clean_output(outputdir, _ran=0):
     # I don't want to believe it exists, but it does.
     try:
         shutil.rmtree(outputdir)
-    except WindowsError:
+    except OSError:
         pass
     if os.path.exists(outputdir):
         raise IOError('%s was not deleted.' % outputdir)
     try:
         os.makedirs(outputdir)
-    except WindowsError:
+    except OSError:
         if _ran < 3:
             ensure_clean_output(outputdir, _ran=_ran + 1)
         if not os.path.isdir(outputdir):
             raise
 
 
-def _create_dependency_group(codefilenames):
+def _create_source_store(filenames, sloc_filenames, max_bytes):
+    """Returns a SourceUnitStore with sloc_filenames registered for the
+    SLOC stage and filenames for the cyclomatic complexity and
+    dependency stages, so files are only kept for the stages that read
+    them."""
+    codestages = (cyclcompl.statbuilder.SOURCE_STAGE,
+                  depgraph.depbuilder.SOURCE_STAGE)
+    store = sourceunits.SourceUnitStore(
+        (sloc.slocing.SOURCE_STAGE,) + codestages, max_bytes)
+    store.register(sloc_filenames, [sloc.slocing.SOURCE_STAGE])
+    store.register(filenames, codestages)
+    return store
+
+
+def _create_dependency_group(codefilenames, store=None, jobs=None, cache=None,
+                             tracer=tracing.NULL_TRACER,
+                             modulefinder_cache=None):
     """Generates a new DependencyGroup from codefilenames."""
-    depb = depgraph.DepBuilder(codefilenames)
-    dependencygroup = depgraph.DependencyGroup(depb.dependencies, depb.failed)
+    depb = depgraph.DepBuilder(
+        codefilenames, store=store, jobs=jobs, cache=cache, tracer=tracer,
+        modulefinder_cache=modulefinder_cache)
+    with tracer.span('DependencyGroup'):
+        dependencygroup = depgraph.DependencyGroup(
+            depb.dependencies, depb.failed)
     return dependencygroup
 
 
-def generate_html_jump(htmlfilename, projectname, css_filename, jumpinfos):
+def generate_html_jump(htmlfilename, projectname, css_filename, jumpinfos,
+                       notes=()):
     """Generates an html file at filename that contains links
     to all items in paths.
 
@@ -65,6 +95,8 @@ def generate_html_jump(htmlfilename, projectname, css_filename, jumpinfos):
     :param css_filename: The path the css file for the reports.
     :param jumpinfos: Paths to all files the resultant file should
       display links to.
+    :param notes: Lines of text to include in the footer,
+      such as cache statistics.
     """
     jumppaths = sorted(jumpinfos, key=lambda jump: jump[0])
     htmldir = os.path.dirname(os.path.abspath(htmlfilename))
@@ -82,6 +114,7 @@ def generate_html_jump(htmlfilename, projectname, css_filename, jumpinfos):
 
     datestr = datetime.date.today().strftime('%b %d, %Y')
     jumpshtml = getJumpsHtml()
+    noteshtml = ''.join('%s<br />\n' % cgi.escape(n) for n in notes)
 
     def getLinksHtml():
         links = ['http://www.ndepend.com/Metrics.aspx',
@@ -114,7 +147,7 @@ are important), check out the following pages:
     <br />
     <div class="footer">
     <p>Metrics generated on %(datestr)s<br />
-    <a href="http://code.google.com/p/pynocle/">Pynocle</a> copyright
+    %(noteshtml)s    <a href="http://code.google.com/p/pynocle/">Pynocle</a> copyright
     <a href="http://robg3d.com">Rob Galanakis</a> 2012</p>
     </div>
       </body>
@@ -133,19 +166,73 @@ class Monocle(object):
       You can get this from running coverage,
       or loading a coverage data file.
     :param css_filename: The path to the css file. Uses default.css if None.
+    :param max_source_bytes: Approximate memory budget for the source files
+      and ASTs shared between metrics during `generate_all`.
+      If None, use `sourceunits.DEFAULT_MAX_BYTES`.
+    :param cachedir: If provided, per-file results are cached in this
+      directory, and files that have not changed since a previous run
+      are not analyzed again.  See `analysiscache.AnalysisCache`.
+      Resolved imports are also stored there, and reused as long as
+      the directories they were found in have not changed,
+      as is the rendered about text of reports.
+    :param jobs: Number of worker processes to analyze files in.
+      None runs everything in this process,
+      0 uses one process per CPU.  Reports are identical either way.
+      When more than one process is used, each worker reads and parses
+      its own files, so no source store is shared between metrics.
+    :param trace_filename: If provided, `generate_all` records how long
+      each stage, file, and external process took, and saves the trace
+      to this file in the Trace Event Format.  See `tracing.Tracer`.
+    :param graph_reduction: A `depgraph.GraphReduction` to apply to the
+      dependency graph before rendering it, such as collapsing modules
+      into packages, so that large graphs can be laid out and read.
+      If None, use `depgraph.GraphReduction.default()`, which only
+      prunes graphs too large for dot to lay out in a reasonable time.
+    :param sloc_patterns: If provided, a collection of fnmatch patterns
+      of the files under rootdir to report SLOC for, such as
+      ``('*.py', '*.pyx', '*.c', '*.h', '*.cfg')``.
+      Comments are recognized by extension, see
+      `sloc.slocing.COMMENT_SYNTAXES`.  If None, only python files.
+    :param export_formats: Collection of any of `exporting.FORMATS`
+      to also write the rows of the SLOC, cyclomatic complexity,
+      coupling, and PageRank reports in, for other programs to read.
+      jsonl and csv rows are written to report_<name>.<format>,
+      and sqlite rows to a table per report in reports.sqlite.
+    :param history_filename: If provided, `write_reports` (and so
+      `generate_all`) also records the metrics of the run in the `history.HistoryStore` at this filename,
+      which is kept between runs (put it outside outputdir).
+    :param commit: Commit id to tag the run with in the history.
+      If None, use the git commit checked out at rootdir, if any.
     """
     def __init__(self,
                  projectname,
                  outputdir,
                  rootdir=None,
                  coveragedata=None,
-                 css_filename=None):
+                 css_filename=None,
+                 max_source_bytes=None,
+                 cachedir=None,
+                 jobs=None,
+                 trace_filename=None,
+                 sloc_patterns=None,
+                 graph_reduction=None,
+                 export_formats=(),
+                 history_filename=None,
+                 commit=None):
         self.rootdir = os.path.abspath(rootdir or os.getcwd())
         self.filenames = list(utils.walk_recursive(self.rootdir))
+        self.sloc_filenames = self.filenames
+        self.sloc_patterns = sloc_patterns
+        if sloc_patterns is not None:
+            self.sloc_filenames = list(
+                utils.walk_recursive(self.rootdir, sloc_patterns))
 
         self.projectname = projectname
         self.outputdir = outputdir
         self.coveragedata = coveragedata
+        self.graph_reduction = (graph_reduction or
+                                depgraph.GraphReduction.default())
+        self._graph_note = None
 
         join = lambda x: os.path.join(self.outputdir, x)
         self.coverhtml_dir = join('report_covhtml')
@@ -154,54 +241,131 @@ class Monocle(object):
         self.depgraph_filename = join('depgraph.png')
         self.coupling_filename = join('report_coupling.html')
         self.couplingrank_filename = join('report_couplingrank.html')
+        self.cycles_filename = join('report_cycles.html')
         self.htmljump_filename = join('index.html')
+        for fmt in export_formats:
+            if fmt not in exporting.FORMATS:
+                raise ValueError('Unknown export format %r, must be one of '
+                                 '%s.' % (fmt, ', '.join(exporting.FORMATS)))
+        self.export_formats = tuple(export_formats)
+        self.sqlite_filename = join('reports.sqlite')
+        self.history_filename = history_filename
+        self.commit = commit
 
         if css_filename is None:
             css_filename = os.path.join(
                 os.path.dirname(__file__), 'default.css')
         self.css_filename = css_filename
 
+        self.max_source_bytes = max_source_bytes or sourceunits.DEFAULT_MAX_BYTES
+        self.jobs = jobs
+        self.analysiscache = None
+        self.modulefinder_filename = None
+        if cachedir:
+            self.analysiscache = analysiscache.AnalysisCache(cachedir)
+            self.modulefinder_filename = os.path.join(
+                cachedir, 'modulefinder.pickle')
+        self.modulefinder_cache = None
+        self.trace_filename = trace_filename
+        self.tracer = tracing.NULL_TRACER
+        if trace_filename:
+            self.tracer = tracing.Tracer()
+        #Only set while generate_all is running.
+        self._sourcestore = None
         self._filesforjump = {}
 
     def ensure_clean_output(self):
         ensure_clean_output(self.outputdir)
 
+    def _export(self, report, data):
+        """Writes the rows of report for data in each of
+        self.export_formats."""
+        for fmt in self.export_formats:
+            if fmt == 'sqlite':
+                p = self.sqlite_filename
+            else:
+                p = os.path.join(self.outputdir,
+                                 'report_%s.%s' % (report, fmt))
+            exporting.export_report(report, fmt, p, data, self.rootdir,
+                                    self.tracer)
+
     def generate_cover_html(self):
         """Outputs a coverage html report from cov into directory."""
         self.coveragedata.html_report(directory=self.coverhtml_dir)
         p = os.path.join(self.coverhtml_dir, 'index.html')
         self._filesforjump[p] = p, 'Report: Coverage'
 
-    def generate_cyclomatic_complexity(self):
+    def _measure_cyclcompl(self):
+        """Returns (CCTable, failures) for self.filenames."""
+        return cyclcompl.measure_cyclcompl(
+            self.filenames, store=self._sourcestore, jobs=self.jobs,
+            cache=self.analysiscache, tracer=self.tracer)
+
+    def _count_sloc(self):
+        """Returns a SlocGroup for self.sloc_filenames."""
+        return sloc.SlocGroup(
+            self.sloc_filenames, store=self._sourcestore, jobs=self.jobs,
+            cache=self.analysiscache, tracer=self.tracer)
+
+    def generate_cyclomatic_complexity(self, ccdata=None, failures=()):
         """Generates a cyclomatic complexity report for all files in self.files,
         output to self.cyclcompl_filename.
+        Returns the (ccdata, failures) reported.
+
+        :param ccdata: If provided, a CCTable (or collection of
+          (filename, FlatStats)) to report instead of measuring the files,
+          with the files that failed to parse in failures.
         """
-        ccdata, failures = cyclcompl.measure_cyclcompl(self.filenames)
+        if ccdata is None:
+            ccdata, failures = self._measure_cyclcompl()
         def makeFormatter(f):
             return cyclcompl.CCGoogleChartFormatter(
                 f, leading_path=self.rootdir)
         p = self.cyclcompl_filename
-        utils.write_report(p, (ccdata, failures), makeFormatter)
+        utils.write_report(p, (ccdata, failures), makeFormatter, self.tracer,
+                           self.analysiscache)
         self._filesforjump[p] = p, 'Report: Cyclomatic Complexity'
+        self._export('cyclcompl', (ccdata, failures))
+        return ccdata, failures
+
+    def generate_sloc(self, slocgrp=None):
+        """Generates a Source Lines of Code report for all files in
+        self.sloc_filenames, output to self.sloc_filename.
+        Returns the SlocGroup reported.
 
-    def generate_sloc(self):
-        """Generates a Source Lines of Code report for all files in self.files,
-        output to self.sloc_filename.
+        :param slocgrp: If provided, a SlocGroup to report instead of
+          counting the files.
         """
-        slocgrp = sloc.SlocGroup(self.filenames)
+        if slocgrp is None:
+            slocgrp = self._count_sloc()
         def makeSlocFmt(f):
             return sloc.SlocGoogleChartFormatter(f, self.rootdir)
         p = self.sloc_filename
-        utils.write_report(p, slocgrp, makeSlocFmt)
+        utils.write_report(p, slocgrp, makeSlocFmt, self.tracer,
+                           self.analysiscache)
         self._filesforjump[p] = p, 'Report: SLOC'
+        self._export('sloc', slocgrp)
+        return slocgrp
 
-    def generate_dependency_graph(self, depgrp):
+    def generate_dependency_graph(self, depgrp, dotfilename=None):
         """Generates a dependency graph image to self.depgraph_filename
         for the files in self.files.
+
+        :param dotfilename: If provided, also keep the dot file the
+          image is rendered from there.
         """
-        renderer = depgraph.DefaultRenderer(depgrp, leading_path=self.rootdir)
+        reduced = self.graph_reduction.apply(
+            depgrp, self.tracer, leading_path=self.rootdir)
+        if reduced is not depgrp:
+            self._graph_note = (
+                'Dependency graph reduced from %s to %s modules and '
+                'packages (%r)' % (len(depgrp.id_to_node),
+                                   len(reduced.id_to_node),
+                                   self.graph_reduction))
+        renderer = depgraph.DefaultRenderer(
+            reduced, leading_path=self.rootdir, tracer=self.tracer)
         p = self.depgraph_filename
-        renderer.render(p)
+        renderer.render(p, dotfilename=dotfilename)
         self._filesforjump[p] = p, 'Report: Dependency Graph'
 
     def generate_coupling_report(self, depgrp):
@@ -212,8 +376,10 @@ class Monocle(object):
         def factory(f):
             return depgraph.CouplingGoogleChartFormatter(f, self.rootdir)
         p = self.coupling_filename
-        utils.write_report(p, depgrp, factory)
+        utils.write_report(p, depgrp, factory, self.tracer,
+                           self.analysiscache)
         self._filesforjump[p] = p, 'Report: Coupling'
+        self._export('coupling', depgrp)
 
     def generate_couplingrank_report(self, depgrp):
         """Generates a PageRank report for all code in self.filenames to
@@ -222,8 +388,89 @@ class Monocle(object):
         def factory(f):
             return depgraph.RankGoogleChartFormatter(f, self.rootdir)
         p = self.couplingrank_filename
-        utils.write_report(p, depgrp, factory)
+        utils.write_report(p, depgrp, factory, self.tracer,
+                           self.analysiscache)
         self._filesforjump[p] = p, 'Report: Coupling PageRank'
+        self._export('couplingrank', depgrp)
+
+    def generate_cycles_report(self, depgrp):
+        """Generates a report of the import cycles between all modules
+        in depgrp to self.cycles_filename.
+        """
+        def factory(f):
+            return depgraph.CyclesGoogleChartFormatter(f, self.rootdir)
+        p = self.cycles_filename
+        utils.write_report(p, depgrp, factory, self.tracer,
+                           self.analysiscache)
+        self._filesforjump[p] = p, 'Report: Import Cycles'
+
+    def record_history(self, slocgrp=None, ccdata=None, depgrp=None):
+        """Records the metrics of this run in the history.HistoryStore at
+        self.history_filename, and returns the run id.
+        Any of the results can be None if they were not measured."""
+        commit = self.commit or history.current_commit(self.rootdir)
+        with history.HistoryStore(self.history_filename) as store:
+            return store.record_run(commit, slocgrp, ccdata, depgrp,
+                                    self.rootdir)
+
+    def write_reports(self, slocgrp=None, ccdata=None, depgrp=None,
+                      failed=None, record_history=True):
+        """Writes the reports made from each of the results that is
+        provided, records them with `record_history` if
+        self.history_filename is set, and writes the html jump page.
+        Every report is written even if the ones before it fail.
+        Returns a list of the names of the reports that were written.
+
+        :param slocgrp: SlocGroup for the SLOC report.
+        :param ccdata: Output of cyclcompl.measure_cyclcompl
+          (CCTable, failures) for the cyclomatic complexity report.
+        :param depgrp: DependencyGroup for the coupling, rank, and cycles
+          reports and the dependency graph.
+        :param failed: If provided, a list to append a
+          (report name, sys.exc_info()) to for each report that failed.
+          If None, raise an AggregateError of them after all reports
+          are written.
+        :param record_history: If False, do not record the results in
+          the history, such as when they are not for a whole run.
+        """
+        reports = []
+        if slocgrp is not None:
+            reports.append(('generate_sloc',
+                            lambda: self.generate_sloc(slocgrp)))
+        if ccdata is not None:
+            reports.append(('generate_cyclomatic_complexity',
+                            lambda: self.generate_cyclomatic_complexity(
+                                *ccdata)))
+        if depgrp is not None:
+            reports.extend([
+                ('generate_coupling_report',
+                 lambda: self.generate_coupling_report(depgrp)),
+                ('generate_couplingrank_report',
+                 lambda: self.generate_couplingrank_report(depgrp)),
+                ('generate_cycles_report',
+                 lambda: self.generate_cycles_report(depgrp)),
+                ('generate_dependency_graph',
+                 lambda: self.generate_dependency_graph(depgrp))])
+        if record_history and self.history_filename:
+            reports.append(('record_history',
+                            lambda: self.record_history(
+                                slocgrp, ccdata, depgrp)))
+        reports.append(('generate_html_jump', self.generate_html_jump))
+        raise_failed = failed is None
+        if raise_failed:
+            failed = []
+        written = []
+        for name, func in reports:
+            try:
+                with self.tracer.span(name):
+                    func()
+            except Exception:
+                failed.append((name, sys.exc_info()))
+            else:
+                written.append(name)
+        if raise_failed and failed:
+            raise utils.AggregateError([ei for _, ei in failed])
+        return written
 
     def generate_html_jump(self):
         """Generates an html page that links to any generated reports."""
@@ -231,37 +478,86 @@ class Monocle(object):
             self.htmljump_filename,
             self.projectname,
             self.css_filename,
-            self._filesforjump.values())
+            self._filesforjump.values(),
+            notes=self._notes())
+
+    def _notes(self):
+        """Returns lines of information about the run for the index page."""
+        notes = []
+        if self.analysiscache is not None:
+            notes.append(self.analysiscache.report())
+        if self.modulefinder_filename and self.modulefinder_cache:
+            notes.append(self.modulefinder_cache.report())
+        if self._graph_note:
+            notes.append(self._graph_note)
+        return notes
+
+    def _create_source_store(self):
+        """Returns a SourceUnitStore with each file registered for
+        the stages run by generate_all that read it,
+        or None if files are analyzed in worker processes."""
+        if utils.resolve_jobs(self.jobs) > 1:
+            return None
+        return _create_source_store(self.filenames, self.sloc_filenames,
+                                    self.max_source_bytes)
+
+    def _create_dependency_group(self):
+        """Returns a DependencyGroup for self.filenames,
+        loading and saving resolved imports at self.modulefinder_filename
+        if it is set."""
+        self.modulefinder_cache = modulefinder.ModuleFinderCache()
+        if self.modulefinder_filename:
+            self.modulefinder_cache.load(self.modulefinder_filename)
+        depgrp = _create_dependency_group(
+            self.filenames, self._sourcestore, self.jobs,
+            self.analysiscache, self.tracer, self.modulefinder_cache)
+        if self.modulefinder_filename:
+            self.modulefinder_cache.save(self.modulefinder_filename)
+        return depgrp
 
     def generate_all(self, cleanoutput=True):
         """Run all report generation functions.
+        Each file is read and parsed once, and shared between all metrics.
 
         If coveragedata is not set, skip the coverage functions.
+        If trace_filename is set, the trace is saved there
+        even if some reports fail.
 
         :param cleanoutput: If True, run ensure_clean_output to clear
           the output directory.
         """
+        try:
+            with self.tracer.span('generate_all'):
+                self._generate_all(cleanoutput)
+        finally:
+            if self.trace_filename:
+                self.tracer.save(self.trace_filename)
+
+    def _generate_all(self, cleanoutput):
         if cleanoutput:
             self.ensure_clean_output()
-        exc_infos = []
-        def trydo(func):
+        failed = []
+        def trydo(name, func):
             try:
-                return func()
+                with self.tracer.span(name):
+                    return func()
             except Exception:
-                exc_infos.append(sys.exc_info())
+                failed.append((name, sys.exc_info()))
 
-        trydo(self.generate_sloc)
-        trydo(self.generate_cyclomatic_complexity)
+        self._sourcestore = self._create_source_store()
+        try:
+            slocgrp = trydo('count_sloc', self._count_sloc)
+            ccdata = trydo('measure_cyclcompl', self._measure_cyclcompl)
 
-        if self.coveragedata:
-            trydo(self.generate_cover_html)
+            if self.coveragedata:
+                trydo('generate_cover_html', self.generate_cover_html)
 
-        depgrp = _create_dependency_group(self.filenames)
-        trydo(lambda: self.generate_coupling_report(depgrp))
-        trydo(lambda: self.generate_couplingrank_report(depgrp))
-        trydo(lambda: self.generate_dependency_graph(depgrp))
-        trydo(self.generate_html_jump)
+            with self.tracer.span('create_dependency_group'):
+                depgrp = self._create_dependency_group()
+        finally:
+            self._sourcestore = None
+        self.write_reports(slocgrp, ccdata, depgrp, failed)
         #self.generate_funcinfo_report,
         #self.generate_inheritance_report,
-        if exc_infos:
-            raise utils.AggregateError(exc_infos)
+        if failed:
+            raise utils.AggregateError([ei for _, ei in failed])
@@ -3,19 +3,198 @@
 through python's import machinery.
 Ideally it does not have to run any code in order to analyze.
 """
+import cPickle
 import imp
 import os
 import sys
+import tempfile
+
+import pynocle.utils as utils
 
 _oabs = os.path.abspath
 _ojoin = os.path.join
 
 
+class ModuleIndex(object):
+    """In-memory index of the directories modules are looked up in.
+
+    find_module answers the same as imp.find_module, but each directory
+    is listed only once, instead of stat'ing every suffix in every
+    directory for every lookup.
+    Like ModuleFinderCache, an index should only be used for a single run,
+    since it does not notice files being added or removed
+    unless told about them with `refresh`.
+
+    :param path: Directories to search for top-level modules.
+      If None, use sys.path.
+
+    listdirs is the number of directories that have been listed.
+    Every question a lookup asked of the filesystem is a probe,
+    either ('in', dirname, name) for whether dirname contains name,
+    or ('isdir', path, None) for whether path is a directory.
+    Probes are added to consulted, and their answers (at the time they
+    were first asked) stored in probes.
+    """
+    def __init__(self, path=None):
+        if path is None:
+            path = sys.path
+        self.path = [p for p in path if isinstance(p, basestring)]
+        self.suffixes = [suf[0] for suf in imp.get_suffixes()]
+        self.listdirs = 0
+        self.consulted = set()
+        self.probes = {}
+        self._listings = {}
+        self._toplevel = {}
+
+    def evaluate(self, probe):
+        """Returns the answer to probe, without recording that
+        a lookup depends on it."""
+        try:
+            return self.probes[probe]
+        except KeyError:
+            pass
+        kind, path, name = probe
+        if kind == 'isdir':
+            result = os.path.isdir(path)
+        else:
+            result = name in self.listing(path)
+        self.probes[probe] = result
+        return result
+
+    def consult(self, probe):
+        """Records that a lookup depends on probe, and returns its answer."""
+        self.consulted.add(probe)
+        return self.evaluate(probe)
+
+    def contains(self, dirname, name):
+        """Returns True if name is in the listing of dirname."""
+        return self.consult(('in', dirname, name))
+
+    def refresh(self, dirnames):
+        """Lists each directory in dirnames again, and returns a set of
+        the probes about names in them whose answer changed.
+        Top-level lookups that depended on those probes are forgotten."""
+        dirnames = set(_oabs(d) for d in dirnames)
+        for dirname in list(self._listings):
+            if _oabs(dirname or os.curdir) in dirnames:
+                del self._listings[dirname]
+        changed = set()
+        for probe, answer in self.probes.items():
+            kind, path, name = probe
+            directory = path if kind == 'in' else os.path.dirname(path)
+            if _oabs(directory or os.curdir) not in dirnames:
+                continue
+            del self.probes[probe]
+            if self.evaluate(probe) != answer:
+                changed.add(probe)
+        if changed:
+            for name, (result, consulted) in self._toplevel.items():
+                if not changed.isdisjoint(consulted):
+                    del self._toplevel[name]
+        return changed
+
+    def scan(self, dirnames=None):
+        """Lists each directory in dirnames (and self.path if dirnames
+        is None) up front."""
+        if dirnames is None:
+            dirnames = self.path
+        for dirname in dirnames:
+            self.listing(dirname)
+
+    def listing(self, dirname):
+        """Returns a frozenset of the names in dirname,
+        empty if dirname is not a directory.
+        Lookups should go through `contains`, so the names they depend on
+        are recorded."""
+        try:
+            return self._listings[dirname]
+        except KeyError:
+            pass
+        try:
+            names = frozenset(os.listdir(dirname or os.curdir))
+        except OSError:
+            names = frozenset()
+        self.listdirs += 1
+        self._listings[dirname] = names
+        return names
+
+    def isdir(self, path):
+        return self.consult(('isdir', path, None))
+
+    def isfile(self, path):
+        dirname, basename = os.path.split(path)
+        return self.contains(dirname, basename) and not self.isdir(path)
+
+    def find_package(self, path):
+        """Returns the filename for the __init__ file if path is
+        the directory of a package,
+        None if path is not a directory or there is no init file.
+        """
+        if not self.isdir(path):
+            return None
+        for suffix in self.suffixes:
+            initname = '__init__' + suffix
+            if self.contains(path, initname):
+                return _ojoin(path, initname)
+        return None
+
+    def _find_in_dir(self, name, dirname):
+        if self.contains(dirname, name):
+            path = _ojoin(dirname, name)
+            #Same as the import machinery, only source and bytecode
+            #init files make a directory a package.
+            if self.isdir(path):
+                if (self.contains(path, '__init__.py') or
+                        self.contains(path, '__init__.pyc')):
+                    return path
+        for suffix in self.suffixes:
+            if self.contains(dirname, name + suffix):
+                return _ojoin(dirname, name + suffix)
+        return None
+
+    def _find_toplevel(self, name):
+        if imp.is_builtin(name) or imp.is_frozen(name):
+            return name
+        for dirname in self.path:
+            result = self._find_in_dir(name, dirname)
+            if result:
+                return result
+        return None
+
+    def find_module(self, name, paths=None):
+        """Returns the path imp.find_module(name, paths)[1] would.
+        Raise ImportError if the module cannot be found.
+        """
+        if paths is None:
+            try:
+                result, consulted = self._toplevel[name]
+            except KeyError:
+                outer = self.consulted
+                self.consulted = set()
+                result = self._find_toplevel(name)
+                consulted = frozenset(self.consulted)
+                self._toplevel[name] = result, consulted
+                self.consulted = outer
+            self.consulted.update(consulted)
+        else:
+            result = None
+            for dirname in paths:
+                result = self._find_in_dir(name, dirname)
+                if result:
+                    break
+        if result is None:
+            raise ImportError('No module named %s' % name)
+        return result
+
+
 class _ModuleFinder(object):
-    def __init__(self, modulename, importing_module_filename):
+    def __init__(self, modulename, importing_module_filename, index=None):
         self.modulename = modulename
-        self.imp_mod_dir = os.path.dirname(_oabs(importing_module_filename))
+        self.imp_mod_dir = None
+        if importing_module_filename:
+            self.imp_mod_dir = os.path.dirname(_oabs(importing_module_filename))
         self.splitmodulename = modulename.split('.')
+        self.index = index or ModuleIndex()
 
     def __repr__(self):
         return 'ModuleFinder(modulename: %s, imp_mod_dir: %s)' % (
@@ -27,8 +206,10 @@ class _ModuleFinder(object):
         """If self.module is in sys.modules, return the value of its
         __file__ attr if it has it.
         Otherwise, return None.
+        Modules imported only to start worker processes are ignored.
         """
-        if self.modulename in sys.modules:
+        if (self.modulename in sys.modules and
+                self.modulename not in utils.POOL_MODULES):
             filename = getattr(sys.modules[self.modulename], '__file__', None)
             if filename:
                 return filename
@@ -38,6 +219,7 @@ class _ModuleFinder(object):
         """If modulename has only one component,
         find a module for it and return its path if its path is equal to its
         name, such as is the case for sys, time, etc.
+        If it is a package, return the path to its directory.
 
         If modulename has more than one component, or module cannot be found,
         return None.
@@ -45,23 +227,17 @@ class _ModuleFinder(object):
         if len(self.splitmodulename) != 1:
             return None
         try:
-            path = imp.find_module(self.splitmodulename[0])[1]
-            return path
+            path = self.index.find_module(self.splitmodulename[0])
         except ImportError:
             return None
+        return path
 
     def find_package(self, path):
         """Returns the filename for the __init__ file if path is
         the directory of a package,
         None if path is not a directory or there is no init file.
         """
-        if not os.path.isdir(path):
-            return None
-        for suffix in map(lambda suf: suf[0], imp.get_suffixes()):
-            fullpath = os.path.join(path, '__init__' + suffix)
-            if os.path.isfile(fullpath):
-                return fullpath
-        return None
+        return self.index.find_package(path)
 
     def get_module_filename(self):
         """See module-level get_module_filename."""
@@ -82,7 +258,7 @@ class _ModuleFinder(object):
             for i in range(len(self.splitmodulename)):
                 try:
                     paths = [lastpath] if lastpath else None
-                    lastpath = imp.find_module(self.splitmodulename[i], paths)[1]
+                    lastpath = self.index.find_module(self.splitmodulename[i], paths)
                     #If this is our last component, and it is a package, use it
                     if i == len(self.splitmodulename) - 1:
                         package = self.find_package(lastpath)
@@ -92,20 +268,21 @@ class _ModuleFinder(object):
                     pass
 
             #If we ended up with a path to a file, use it.
-            if lastpath and os.path.isfile(lastpath):
+            if lastpath and self.index.isfile(lastpath):
                 return lastpath
 
         #Trying to import a package from a file in the package will if imp_mod_dir is set to the package dir
         #So we can jump up a dir and check if it fails, since lastpath is going to be as deep as possible.
         #noinspection PyUnboundLocalVariable
-        upadir = os.path.abspath(os.path.join(lastpath, '..'))
-        try:
-            path = imp.find_module(self.splitmodulename[-1], [upadir])[1]
-            pkg = self.find_package(path)
-            if pkg:
-                return pkg
-        except ImportError:
-            pass
+        if lastpath:
+            upadir = os.path.abspath(os.path.join(lastpath, '..'))
+            try:
+                path = self.index.find_module(self.splitmodulename[-1], [upadir])
+                pkg = self.find_package(path)
+                if pkg:
+                    return pkg
+            except ImportError:
+                pass
 
         #At this point, we may have a module we can't do anything with.  It could be a stdlib module or something that
         #isn't available to us, so just return nothing for now...
@@ -113,7 +290,7 @@ class _ModuleFinder(object):
         #raise NotImplementedError
 
 
-def get_module_filename(modulename, importing_module_filename=None, stripext=True):
+def get_module_filename(modulename, importing_module_filename=None, stripext=True, index=None):
     """Return the filename of the module at modulename.  Tries to emulate the python import logic, without running
     any files.
 
@@ -121,8 +298,9 @@ def get_module_filename(modulename, importing_module_filename=None, stripext=Tru
         the module of modulename.
     stripext: If true, strip the extension from the returned filename.  If False, the filename may or may not have an
         extension.
+    index: ModuleIndex to look up modules in.  If None, use a new one.
     """
-    result = _ModuleFinder(modulename, importing_module_filename).get_module_filename()
+    result = _ModuleFinder(modulename, importing_module_filename, index).get_module_filename()
     if result and stripext:
         result = os.path.splitext(result)[0]
     return result
@@ -131,30 +309,161 @@ def get_module_filename(modulename, importing_module_filename=None, stripext=Tru
 class ModuleFinderCache(object):
     """Provides caching behavior for the get_module_filename function.  Useful for a single run of a metric generation.
     We do not want to cache the values at a module/static level because the paths involved in the lookup can change.
+    To reuse results between runs, pass a filename to `load` and `save` them to.
+    Each result records the probes (see ModuleIndex) it depended on,
+    and results are only loaded if every probe still has the same answer,
+    so adding or removing files a lookup never asked about,
+    such as the report directory, does not invalidate it.
 
-    modulename_to_importing_filename_to_result is a dict of dicts:
-    { modulename: {importing_module_filename: result} }
+    Lookups only depend on the directory of the importing module,
+    so all modules in a directory share the same results.
+    modulename_to_importing_dir_to_result is a dict of dicts:
+    { modulename: {importing_module_dir: result} }
+
+    hits and misses are the number of lookups that were and were not cached.
+    loaded and stale are the number of results that were and were not loaded
+    by the last call to `load`.
+
+    :param index: ModuleIndex to look up uncached modules in.
+      If None, use a new one.
     """
-    def __init__(self):
-        self.modulename_to_importing_filename_to_result = {}
+    def __init__(self, index=None):
+        self.modulename_to_importing_dir_to_result = {}
+        self.index = index or ModuleIndex()
+        self.hits = 0
+        self.misses = 0
+        self.loaded = 0
+        self.stale = 0
+        #{(modulename, importing_module_dir): frozenset of probes}
+        self._dependencies = {}
+        self._interned = {}
+
+    def _header(self):
+        """Returns what every result depends on besides its probes,
+        so a store saved under a different header is never loaded."""
+        return (sys.version, os.getcwd(), tuple(self.index.path),
+                tuple(self.index.suffixes))
+
+    def load(self, filename):
+        """Loads results from filename, if it exists, that were saved
+        by `save` under the same python and search path,
+        and none of whose probes have a different answer since.
+        Returns the number of results loaded.
+        """
+        self.loaded = self.stale = 0
+        try:
+            with open(filename, 'rb') as f:
+                header, probes, entries = cPickle.load(f)
+        except (IOError, EOFError, ValueError, cPickle.UnpicklingError):
+            return 0
+        if header != self._header():
+            return 0
+        changed = set()
+        for probe, answer in probes.iteritems():
+            if self.index.evaluate(probe) != answer:
+                changed.add(probe)
+        for modulename, importing_module_dir, result, dependencies in entries:
+            if changed and not changed.isdisjoint(dependencies):
+                self.stale += 1
+                continue
+            self.modulename_to_importing_dir_to_result.setdefault(
+                modulename, {})[importing_module_dir] = result
+            self._dependencies[modulename, importing_module_dir] = dependencies
+            self.loaded += 1
+        return self.loaded
+
+    def save(self, filename):
+        """Saves all results to filename, so a later run can `load` them.
+        The file is written to a temporary file and renamed so a reader
+        never sees a partial store."""
+        probes = {}
+        for dependencies in set(self._dependencies.itervalues()):
+            for probe in dependencies:
+                probes[probe] = self.index.evaluate(probe)
+        entries = []
+        for (modulename, importing_module_dir), dependencies in \
+                self._dependencies.iteritems():
+            result = self.modulename_to_importing_dir_to_result[modulename][
+                importing_module_dir]
+            entries.append(
+                (modulename, importing_module_dir, result, dependencies))
+        dirname = os.path.dirname(os.path.abspath(filename))
+        if not os.path.isdir(dirname):
+            os.makedirs(dirname)
+        fd, temppath = tempfile.mkstemp('.tmp', dir=dirname)
+        with os.fdopen(fd, 'wb') as f:
+            cPickle.dump((self._header(), probes, entries), f,
+                         cPickle.HIGHEST_PROTOCOL)
+        try:
+            os.rename(temppath, filename)
+        except OSError:
+            #rename does not replace on Windows.
+            os.remove(filename)
+            os.rename(temppath, filename)
+
+    def refresh(self, dirnames):
+        """Forgets the results that depended on the listing of any
+        directory in dirnames, if the names they looked up there
+        were added or removed, so they are looked up again.
+        Returns a dict of {(modulename, importing_module_dir): result}
+        of the results that were forgotten."""
+        changed = self.index.refresh(dirnames)
+        dropped = {}
+        if not changed:
+            return dropped
+        for key, dependencies in self._dependencies.items():
+            if changed.isdisjoint(dependencies):
+                continue
+            modulename, importing_module_dir = key
+            dropped[key] = self.modulename_to_importing_dir_to_result[
+                modulename].pop(importing_module_dir)
+            del self._dependencies[key]
+        return dropped
+
+    def _intern_dependencies(self, dependencies):
+        """Returns an equal frozenset of probes that may be shared
+        with other results, since most lookups depend on the same ones."""
+        dependencies = frozenset(dependencies)
+        return self._interned.setdefault(dependencies, dependencies)
+
+    def report(self):
+        """Returns a one-line summary of cache hits and misses."""
+        return ('Module finder cache: %s hits, %s misses, '
+                '%s loaded, %s stale' % (
+                    self.hits, self.misses, self.loaded, self.stale))
+
+    def hitrate(self):
+        """Returns the fraction of lookups that were cached."""
+        total = self.hits + self.misses
+        return float(self.hits) / total if total else 0.0
 
-    def cached(self, modulename, importing_module_filename):
-        """Returns a tuple of (was in cache, value if it was in cache) for modulename/importing_module_filename.
+    def cached(self, modulename, importing_module_dir):
+        """Returns a tuple of (was in cache, value if it was in cache) for modulename/importing_module_dir.
         If not cached, creates the collections in the cache.
 
         Note that extensionless values should never be stored in the cache!
         """
-        importing_to_result = self.modulename_to_importing_filename_to_result.setdefault(modulename, {})
-        if importing_module_filename in importing_to_result:
-            return True, importing_to_result[importing_module_filename]
+        importing_to_result = self.modulename_to_importing_dir_to_result.setdefault(modulename, {})
+        if importing_module_dir in importing_to_result:
+            return True, importing_to_result[importing_module_dir]
         return False, None
 
     def get_module_filename(self, modulename, importing_module_filename=None, stripext=True):
-        importing_module_filename = os.path.splitext(importing_module_filename)[0]
-        incache, result = self.cached(modulename, importing_module_filename)
-        if not incache:
-            result = get_module_filename(modulename, importing_module_filename, stripext=False)
-            self.modulename_to_importing_filename_to_result[modulename][importing_module_filename] = result
+        importing_module_dir = None
+        if importing_module_filename:
+            importing_module_dir = os.path.dirname(_oabs(importing_module_filename))
+        incache, result = self.cached(modulename, importing_module_dir)
+        if incache:
+            self.hits += 1
+        else:
+            self.misses += 1
+            self.index.consulted = set()
+            result = get_module_filename(modulename, importing_module_filename, stripext=False, index=self.index)
+            if result and os.path.dirname(result):
+                #Results found in sys.modules did not consult the index.
+                self.index.contains(*os.path.split(result))
+            self.modulename_to_importing_dir_to_result[modulename][importing_module_dir] = result
+            self._dependencies[modulename, importing_module_dir] = self._intern_dependencies(self.index.consulted)
         if result and stripext:
             result = os.path.splitext(result)[0]
         return result
\ No newline at end of file
@@ -0,0 +1,42 @@
+#!/usr/bin/env python
+"""Helpers shared by the tests of pynocle and its subpackages."""
+
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+
+class TempModulesTestCase(unittest.TestCase):
+    """Creates a temporary directory at self.tempdir for each test,
+    and puts self.rootdir on sys.path for the duration of the test,
+    so modules written there with `writeModule` can be imported.
+
+    ROOT is the directory of self.rootdir relative to self.tempdir,
+    so the rest of self.tempdir can be used for output.
+    If None, self.rootdir is self.tempdir.
+    """
+    ROOT = None
+
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tempdir)
+        self.rootdir = self.tempdir
+        if self.ROOT:
+            self.rootdir = os.path.join(self.tempdir, self.ROOT)
+            os.makedirs(self.rootdir)
+        sys.path.append(self.rootdir)
+        self.addCleanup(sys.path.remove, self.rootdir)
+
+    def writeModule(self, name, source):
+        """Writes source to the module at name (a path relative to
+        self.rootdir, without the .py extension), creating its directory
+        if needed, and returns its filename."""
+        filename = os.path.join(self.rootdir, name + '.py')
+        dirname = os.path.dirname(filename)
+        if not os.path.isdir(dirname):
+            os.makedirs(dirname)
+        with open(filename, 'w') as f:
+            f.write(source)
+        return filename
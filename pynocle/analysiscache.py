@@ -0,0 +1,156 @@
+#!/usr/bin/env python
+"""
+On-disk cache of per-file analysis results (SlocInfos, FlatStats,
+imported module names, ClassInfos), so that files that have not changed
+since the last run do not need to be parsed again.
+
+Entries are keyed by a hash of the file contents, the kind of result,
+and the pynocle version, so a changed file or a new version of pynocle
+will never load a stale result.
+"""
+
+import cPickle
+import hashlib
+import os
+import tempfile
+
+import pynocle
+import pynocle.tracing as tracing
+import pynocle.utils as utils
+
+
+class AnalysisCache(object):
+    """Stores pickled per-file results in cachedir.
+
+    :param cachedir: Directory to store entries in.  Created if it does not
+      exist.  Can be shared between runs and projects.
+    :param version: Version string included in every key.
+      If None, use pynocle.__version__.
+
+    Attrs:
+
+    - hits: Number of results loaded from the cache.
+    - misses: Number of results that had to be computed.
+    """
+    def __init__(self, cachedir, version=None):
+        self.cachedir = os.path.abspath(cachedir)
+        self.version = version or pynocle.__version__
+        self.hits = 0
+        self.misses = 0
+
+    def __repr__(self):
+        return 'AnalysisCache(%s)' % self.cachedir
+
+    __str__ = __repr__
+
+    def report(self):
+        """Returns a one-line summary of cache hits and misses."""
+        return 'Analysis cache: %s hits, %s misses (%s)' % (
+            self.hits, self.misses, self.cachedir)
+
+    def key(self, kind, source, variant=''):
+        """Returns the key for the `kind` result of a file with contents
+        `source`.
+
+        :param variant: Anything else the result depends on besides the
+          file contents, such as the comment syntax it was counted with.
+        """
+        h = hashlib.sha1(self.version)
+        h.update('\0' + kind + '\0')
+        if variant:
+            h.update(variant + '\0')
+        h.update(source)
+        return h.hexdigest()
+
+    def _entry_path(self, key):
+        return os.path.join(self.cachedir, key[:2], key + '.pickle')
+
+    def load(self, key):
+        """Returns a tuple of (was in cache, value if it was in cache)."""
+        try:
+            with open(self._entry_path(key), 'rb') as f:
+                return True, cPickle.load(f)
+        except (IOError, EOFError, cPickle.UnpicklingError):
+            return False, None
+
+    def save(self, key, value):
+        """Stores value for key.  Entries are written to a temporary file
+        and renamed so a reader never sees a partial entry."""
+        path = self._entry_path(key)
+        dirname = os.path.dirname(path)
+        if not os.path.isdir(dirname):
+            try:
+                os.makedirs(dirname)
+            except OSError:
+                if not os.path.isdir(dirname):
+                    raise
+        fd, temppath = tempfile.mkstemp('.tmp', dir=dirname)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                cPickle.dump(value, f, cPickle.HIGHEST_PROTOCOL)
+            os.rename(temppath, path)
+        except OSError:
+            #Another process already wrote the same entry
+            #(rename does not replace on Windows).
+            os.remove(temppath)
+
+    def map(self, kind, filenames, func, store=None, jobs=None,
+            tracer=tracing.NULL_TRACER, variant=''):
+        """Returns a list of func(filename, store) for each filename,
+        loading the results of unchanged files from the cache
+        and storing the results of changed files.
+
+        :param kind: The kind of result, such as the stage name of the
+          metric.  Also used to release files from store.
+        :param func: Module-level callable that takes a filename and an
+          optional sourceunits.SourceUnitStore and returns a picklable
+          result.  It must release the file from the store itself.
+        :param store: If provided, a sourceunits.SourceUnitStore to read
+          files through.  Not used if results are computed in worker
+          processes.
+        :param jobs: Number of worker processes to compute results in.
+          See utils.resolve_jobs.
+        :param tracer: tracing.Tracer to record a span for each file in.
+        :param variant: Passed to `key`.  If callable, it is called with
+          each filename, for results that include the file's name
+          and so cannot be shared by files with the same contents.
+        """
+        filenames = list(filenames)
+        parallel = utils.resolve_jobs(jobs) > 1
+        if parallel:
+            store = None
+        results = [None] * len(filenames)
+        missing = []
+        for i, filename in enumerate(filenames):
+            with tracer.span(kind, filename=filename):
+                if store is None:
+                    with open(filename, 'rb') as f:
+                        source = f.read()
+                else:
+                    source = store.get(filename).source
+                if callable(variant):
+                    key = self.key(kind, source, variant(filename))
+                else:
+                    key = self.key(kind, source, variant)
+                found, value = self.load(key)
+                if found:
+                    self.hits += 1
+                    results[i] = value
+                    if store is not None:
+                        store.release(filename, kind)
+                elif parallel:
+                    missing.append((i, key))
+                else:
+                    self.misses += 1
+                    results[i] = func(filename, store)
+                    self.save(key, results[i])
+        if missing:
+            with tracer.span(kind + ' pool', files=len(missing), jobs=jobs):
+                values = utils.parallel_map(
+                    func, [filenames[i] for i, key in missing], jobs)
+            for (i, key), value in zip(missing, values):
+                self.misses += 1
+                results[i] = value
+                self.save(key, value)
+        tracer.counter('AnalysisCache', hits=self.hits, misses=self.misses)
+        return results
@@ -0,0 +1,13 @@
+#!/usr/bin/env python
+"""
+Benchmarks for pynocle.
+
+Generates synthetic projects of configurable size and shape
+(see `projectgen.ProjectParams`), times every `Monocle.generate_*` stage
+and the low-level engines against them, and writes the timings as JSON.
+
+Run `python -m pynocle.benchmark --help` for commandline usage.
+"""
+
+from projectgen import ProjectParams, generate_project
+from runner import benchmark_project, run_benchmarks
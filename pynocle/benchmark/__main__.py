@@ -0,0 +1,50 @@
+#!/usr/bin/env python
+"""Commandline entry point: python -m pynocle.benchmark"""
+
+import optparse
+
+import pynocle.benchmark as benchmark
+
+
+def _ints(s):
+    return [int(x) for x in s.split(',')]
+
+
+def main(argv=None):
+    parser = optparse.OptionParser(
+        usage='%prog [options]',
+        description='Times pynocle against generated projects of each '
+                    'size in --files, to produce a scaling curve.')
+    defaults = benchmark.ProjectParams()
+    parser.add_option('--files', default='100,1000',
+                      help='Comma-separated module counts. [%default]')
+    parser.add_option('--depth', type='int', default=defaults.depth,
+                      help='Maximum package nesting depth. [%default]')
+    parser.add_option('--fanout', type='int', default=defaults.fanout,
+                      help='Imports per module. [%default]')
+    parser.add_option('--classes', type='int', default=defaults.numclasses,
+                      help='Classes per module. [%default]')
+    parser.add_option('--functions', type='int',
+                      default=defaults.numfunctions,
+                      help='Functions per module and methods per class. '
+                           '[%default]')
+    parser.add_option('--complexity', type='int',
+                      default=defaults.complexity,
+                      help='Cyclomatic complexity of each function. '
+                           '[%default]')
+    parser.add_option('--seed', type='int', default=defaults.seed)
+    parser.add_option('--jobs', type='int', default=None,
+                      help='Worker processes for Monocle (0 for one per CPU).')
+    parser.add_option('-o', '--output', default='pynocle_benchmark.json',
+                      help='JSON file to write. [%default]')
+    opts, args = parser.parse_args(argv)
+    paramslist = [benchmark.ProjectParams(
+        numfiles=numfiles, depth=opts.depth, fanout=opts.fanout,
+        numclasses=opts.classes, numfunctions=opts.functions,
+        complexity=opts.complexity, seed=opts.seed)
+        for numfiles in _ints(opts.files)]
+    benchmark.run_benchmarks(paramslist, opts.output, jobs=opts.jobs)
+
+
+if __name__ == '__main__':
+    main()
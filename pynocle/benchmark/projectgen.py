@@ -0,0 +1,132 @@
+#!/usr/bin/env python
+"""
+Generates synthetic python projects for benchmarking pynocle.
+
+Projects are deterministic for a given set of parameters and seed,
+so timings from different pynocle versions can be compared.
+"""
+
+import os
+import random
+
+#Name of the top-level package of generated projects.
+TOP_PACKAGE = 'synth'
+
+
+class ProjectParams(object):
+    """Parameters of a synthetic project.
+
+    :param numfiles: Number of modules (not counting package __init__ files).
+    :param depth: Maximum nesting depth of packages under the top package.
+    :param fanout: Number of other modules each module imports.
+    :param numclasses: Number of classes in each module.
+    :param numfunctions: Number of functions in each module,
+      and methods in each class.
+    :param complexity: Cyclomatic complexity of each function and method.
+    :param seed: Seed for the random layout and imports.
+    """
+    def __init__(self, numfiles=100, depth=3, fanout=5, numclasses=2,
+                 numfunctions=3, complexity=4, seed=0):
+        self.numfiles = numfiles
+        self.depth = depth
+        self.fanout = fanout
+        self.numclasses = numclasses
+        self.numfunctions = numfunctions
+        self.complexity = complexity
+        self.seed = seed
+
+    def __repr__(self):
+        return 'ProjectParams(%s)' % ', '.join(
+            '%s=%r' % kvp for kvp in sorted(self.__dict__.items()))
+
+    __str__ = __repr__
+
+    def as_dict(self):
+        return dict(self.__dict__)
+
+
+def _function_lines(name, complexity, indent, isMethod=False):
+    """Returns the lines of a function with the given cyclomatic complexity.
+    Every decision after the first is an `if` so complexity is exact."""
+    args = 'self, a, b' if isMethod else 'a, b'
+    lines = ['%sdef %s(%s):' % (indent, name, args),
+             '%s    """Synthetic function with a CC of %s."""' % (
+                indent, complexity),
+             '%s    total = 0' % indent]
+    for i in range(complexity - 1):
+        lines.append('%s    if a > %s:' % (indent, i))
+        lines.append('%s        total += b * %s' % (indent, i))
+    lines.append('%s    return total' % indent)
+    lines.append('')
+    return lines
+
+
+def _module_source(imports, params):
+    lines = ['#!/usr/bin/env python', '"""Synthetic module."""', '']
+    for modname in imports:
+        lines.append('import %s' % modname)
+    lines.append('')
+    lines.append('')
+    for c in range(params.numclasses):
+        lines.append('class Class%s(object):' % c)
+        lines.append('    # A comment line.')
+        lines.append('')
+        for f in range(params.numfunctions):
+            lines.extend(_function_lines(
+                'method%s' % f, params.complexity, '    ', isMethod=True))
+        lines.append('')
+    for f in range(params.numfunctions):
+        lines.extend(_function_lines('func%s' % f, params.complexity, ''))
+        lines.append('')
+    return '\n'.join(lines)
+
+
+def _create_packages(rnd, params):
+    """Returns a list of package names (as tuples of components).
+    The top package is always first."""
+    packages = [(TOP_PACKAGE,)]
+    #About one package for every 10 modules, but at least one per level.
+    numpackages = max(params.depth + 1, params.numfiles // 10)
+    while len(packages) < numpackages:
+        if params.depth and len(packages) <= params.depth:
+            #Guarantee the maximum depth is reached.
+            parent = packages[-1]
+        else:
+            candidates = [p for p in packages if len(p) <= params.depth]
+            parent = rnd.choice(candidates)
+        packages.append(parent + ('pkg%s' % len(packages),))
+    return packages
+
+
+def generate_project(rootdir, params=None):
+    """Writes a synthetic project under rootdir and returns a list of all
+    filenames written (modules and package __init__ files).
+
+    rootdir should be on sys.path for imports between
+    modules to be resolved when the project is analyzed.
+
+    :param params: ProjectParams.  If None, use the defaults.
+    """
+    params = params or ProjectParams()
+    rnd = random.Random(params.seed)
+    packages = _create_packages(rnd, params)
+    modules = [rnd.choice(packages) + ('mod%s' % i,)
+               for i in range(params.numfiles)]
+    filenames = []
+    for package in packages:
+        pkgdir = os.path.join(rootdir, *package)
+        os.makedirs(pkgdir)
+        filename = os.path.join(pkgdir, '__init__.py')
+        with open(filename, 'w') as f:
+            f.write('"""Synthetic package %s."""\n' % '.'.join(package))
+        filenames.append(filename)
+    for module in modules:
+        others = [m for m in rnd.sample(modules, min(params.fanout + 1,
+                                                     len(modules)))
+                  if m != module][:params.fanout]
+        imports = ['.'.join(m) for m in others]
+        filename = os.path.join(rootdir, *module) + '.py'
+        with open(filename, 'w') as f:
+            f.write(_module_source(imports, params))
+        filenames.append(filename)
+    return filenames
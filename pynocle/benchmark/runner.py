@@ -0,0 +1,199 @@
+#!/usr/bin/env python
+"""
+Times each stage of Monocle and the low-level engines it uses
+against generated projects, and writes the results as JSON.
+"""
+
+import collections
+import compiler
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import timeit
+
+import pynocle
+import pynocle.cyclcompl.statbuilder as statbuilder
+import pynocle.depgraph as depgraph
+import pynocle.depgraph.pagerank as pagerank
+import pynocle.sloc.slocing as slocing
+import projectgen
+
+#Modules timed by time_imports.
+IMPORT_MODULES = ('pynocle', 'pynocle.cyclcompl', 'pynocle.depgraph',
+                  'pynocle.sloc', 'pynocle.funcinfo', 'pynocle.inheritance')
+#Modules that importing any of IMPORT_MODULES must not import,
+#because they are slow to import and only needed by some features.
+LAZY_MODULES = ('numpy', 'compiler', 'subprocess', 'docutils', 'coverage')
+#Seconds that importing any of IMPORT_MODULES should take.
+#Imports over it are marked in the results, not raised,
+#since timings depend on how busy the machine is.
+IMPORT_BUDGET_SECONDS = 0.2
+
+_IMPORT_SCRIPT = """
+import json, sys, timeit
+start = timeit.default_timer()
+import %s
+seconds = timeit.default_timer() - start
+json.dump({'seconds': seconds,
+           'loaded': [m for m in %r if m in sys.modules]}, sys.stdout)
+"""
+
+
+class _Timings(object):
+    """Ordered collection of named timings, in seconds.
+    Failed timings are stored as None, with the error in self.errors."""
+    def __init__(self):
+        self.seconds = collections.OrderedDict()
+        self.errors = collections.OrderedDict()
+
+    def time(self, name, func):
+        """Times func() and returns its result,
+        or None if it raised an Exception."""
+        start = timeit.default_timer()
+        try:
+            result = func()
+        except Exception as exc:
+            self.seconds[name] = None
+            self.errors[name] = repr(exc)
+            return None
+        self.seconds[name] = timeit.default_timer() - start
+        return result
+
+
+def time_import(modulename, lazymodules=LAZY_MODULES):
+    """Imports modulename in a new interpreter and returns a dict of
+    how many 'seconds' it took and which of lazymodules were 'loaded'
+    by it.  A new interpreter is used so nothing is imported already."""
+    env = dict(os.environ)
+    rootdir = os.path.dirname(os.path.dirname(pynocle.__file__))
+    env['PYTHONPATH'] = os.pathsep.join(
+        filter(None, [rootdir, env.get('PYTHONPATH')]))
+    script = _IMPORT_SCRIPT % (modulename, tuple(lazymodules))
+    p = subprocess.Popen([sys.executable, '-c', script], env=env,
+                         stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    out, err = p.communicate()
+    if p.returncode:
+        raise ImportError('Could not import %s:\n%s' % (modulename, err))
+    return json.loads(out)
+
+
+def time_imports(modulenames=IMPORT_MODULES):
+    """Returns an OrderedDict of each of modulenames to the result of
+    time_import for it, with 'over_budget' set if it took longer than
+    IMPORT_BUDGET_SECONDS."""
+    result = collections.OrderedDict()
+    for modulename in modulenames:
+        timing = time_import(modulename)
+        timing['over_budget'] = timing['seconds'] > IMPORT_BUDGET_SECONDS
+        result[modulename] = timing
+    return result
+
+
+def _time_stages(timings, projectdir, outputdir, jobs):
+    """Times each Monocle.generate_* stage."""
+    m = pynocle.Monocle('benchmark', outputdir, rootdir=projectdir, jobs=jobs)
+    t = timings.time
+    t('ensure_clean_output', m.ensure_clean_output)
+    t('generate_sloc', m.generate_sloc)
+    t('generate_cyclomatic_complexity', m.generate_cyclomatic_complexity)
+    depgrp = t('create_dependency_group',
+               lambda: pynocle._create_dependency_group(m.filenames, jobs=jobs))
+    if depgrp is not None:
+        t('generate_coupling_report',
+          lambda: m.generate_coupling_report(depgrp))
+        t('generate_couplingrank_report',
+          lambda: m.generate_couplingrank_report(depgrp))
+        t('generate_dependency_graph',
+          lambda: m.generate_dependency_graph(depgrp))
+    t('generate_html_jump', m.generate_html_jump)
+    return m.filenames
+
+
+def _time_engines(timings, filenames):
+    """Times the engines on their own, with file reading and parsing
+    timed separately."""
+    t = timings.time
+    def readall():
+        result = []
+        for fn in filenames:
+            with open(fn) as f:
+                result.append(f.readlines())
+        return result
+    alllines = t('read_lines', readall)
+    t('count_lines', lambda: map(slocing.count_lines, alllines))
+    t('count_file', lambda: map(slocing.count_file, filenames))
+    def parseall():
+        result = []
+        for fn in filenames:
+            ast = compiler.parseFile(fn)
+            ast.name = os.path.basename(fn) #CCVisitor needs a module name.
+            result.append(ast)
+        return result
+    asts = t('parse', parseall)
+    t('CCVisitor', lambda: [statbuilder.CCVisitor(a) for a in asts])
+    depb = t('DepBuilder', lambda: depgraph.DepBuilder(filenames))
+    depgrp = t('DependencyGroup',
+               lambda: depgraph.DependencyGroup(depb.dependencies))
+    conv = t('DependenciesToLinkMatrix',
+             lambda: pagerank.DependenciesToLinkMatrix(depgrp.dependencies))
+    matrix = t('create_csr_matrix', lambda: conv.create_csr_matrix())
+    t('page_rank', lambda: pagerank.page_rank(matrix))
+    return alllines, depgrp
+
+
+def benchmark_project(params, workdir=None, jobs=None):
+    """Generates a project for params, times pynocle against it,
+    and returns an OrderedDict of results.
+
+    :param params: projectgen.ProjectParams.
+    :param workdir: Directory to generate the project and reports in.
+      If None, use a temporary directory that is deleted afterwards.
+    :param jobs: Passed to Monocle.
+    """
+    tempdir = None
+    if workdir is None:
+        workdir = tempdir = tempfile.mkdtemp(prefix='pynoclebench')
+    projectdir = os.path.join(workdir, 'project')
+    outputdir = os.path.join(workdir, 'output')
+    sys.path.insert(0, projectdir)
+    try:
+        projectgen.generate_project(projectdir, params)
+        stagetimings = _Timings()
+        filenames = _time_stages(stagetimings, projectdir, outputdir, jobs)
+        enginetimings = _Timings()
+        alllines, depgrp = _time_engines(enginetimings, filenames)
+    finally:
+        sys.path.remove(projectdir)
+        if tempdir:
+            shutil.rmtree(tempdir)
+    result = collections.OrderedDict()
+    result['params'] = params.as_dict()
+    result['jobs'] = jobs
+    result['files'] = len(filenames)
+    result['lines'] = sum(map(len, alllines or []))
+    result['dependencies'] = len(depgrp.dependencies) if depgrp else None
+    result['stages'] = stagetimings.seconds
+    result['engines'] = enginetimings.seconds
+    result['errors'] = dict(stagetimings.errors, **enginetimings.errors)
+    return result
+
+
+def run_benchmarks(paramslist, jsonfilename=None, jobs=None):
+    """Runs benchmark_project for each ProjectParams in paramslist
+    and returns the results as a dict.
+    If jsonfilename is provided, also write the results there as JSON.
+    """
+    results = collections.OrderedDict()
+    results['pynocle_version'] = pynocle.__version__
+    results['python'] = sys.version.split()[0]
+    results['platform'] = platform.platform()
+    results['imports'] = time_imports()
+    results['runs'] = [benchmark_project(p, jobs=jobs) for p in paramslist]
+    if jsonfilename:
+        with open(jsonfilename, 'w') as f:
+            json.dump(results, f, indent=2)
+    return results
@@ -0,0 +1,46 @@
+#!/usr/bin/env python
+
+import shutil
+import tempfile
+import unittest
+
+import pynocle.benchmark.projectgen as projectgen
+import pynocle.cyclcompl as cyclcompl
+
+
+class TestGenerateProject(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    def testShape(self):
+        """Test that the generated project has the requested shape."""
+        params = projectgen.ProjectParams(
+            numfiles=20, depth=2, fanout=3, numclasses=1, numfunctions=2,
+            complexity=5)
+        filenames = projectgen.generate_project(self.tempdir, params)
+        modules = [f for f in filenames if not f.endswith('__init__.py')]
+        self.assertEqual(len(modules), 20)
+        results, failures = cyclcompl.measure_cyclcompl(modules)
+        self.assertEqual(failures, [])
+        for filename, stats in results:
+            kinds = [row[0] for row in stats.flatStats]
+            self.assertEqual(kinds.count('Class'), 1)
+            self.assertEqual(kinds.count('Method'), 2)
+            self.assertEqual(kinds.count('Function'), 2)
+            for kind, name, cc in stats.flatStats:
+                if kind in ('Method', 'Function'):
+                    self.assertEqual(cc, 5)
+            with open(filename) as f:
+                imports = [l for l in f if l.startswith('import ')]
+            self.assertEqual(len(imports), 3)
+
+    def testDeterministic(self):
+        """Test that the same params generate the same project."""
+        params = projectgen.ProjectParams(numfiles=10)
+        a = projectgen.generate_project(self.tempdir + '/a', params)
+        b = projectgen.generate_project(self.tempdir + '/b', params)
+        for fa, fb in zip(a, b):
+            self.assertEqual(open(fa).read(), open(fb).read())
@@ -0,0 +1,14 @@
+#!/usr/bin/env python
+
+import unittest
+
+import pynocle.benchmark.runner as runner
+
+
+class TestImportBudget(unittest.TestCase):
+    def testImportsAreLazy(self):
+        """Test that importing pynocle and each subpackage does not
+        import any of the slow modules.  How long the imports take is
+        reported by run_benchmarks, since it depends on the machine."""
+        for modulename, result in runner.time_imports().items():
+            self.assertEqual(result['loaded'], [], modulename)
@@ -5,22 +5,23 @@ import sys
 import _doc
 import pynocle.tableprint as tableprint
 import pynocle.utils as utils
+import statbuilder
 
 #Anything under 7 is considered fine.
 DEFAULT_THRESHOLD = 6
 
+#Columns of the rows from iter_rows, for tableprint.IStreamingTable.
+COLUMNS = [('filename', 'string'),
+           ('type', 'string'),
+           ('name', 'string'),
+           ('cc', 'number')]
 
-def _above_threshold(flatstat, threshold):
-    """Returns true of the CC of flatstat is
-    equal to or above self.threshold."""
-    return flatstat[2] >= threshold #ind 2 is cc amount
 
-
-def _get_header_rst(leadingpath, threshold):
-    s = _doc.about()
-    s += '\nShowing files under %s with a CC greater than or equal to %s.' % (
-        leadingpath.replace('\\', '/'), threshold)
-    return s
+def _get_header_html(leadingpath, threshold):
+    return utils.doc_html(
+        _doc.about(),
+        'Showing files under %s with a CC greater than or equal to %s.' % (
+            leadingpath.replace('\\', '/'), threshold))
 
 
 def _validate_threshold(threshold):
@@ -35,6 +36,23 @@ def _validate_threshold(threshold):
     return threshold
 
 
+def iter_rows(files_stats_failures, leading_path, threshold=1):
+    """Yields a row with a value for each of COLUMNS for each class,
+    function, and file with a CC of threshold or more, in file order.
+
+    :param files_stats_failures: The output of measure_cyclcompl
+      (CCTable or [filename, stats], [failures]).
+    """
+    table = files_stats_failures[0]
+    if not isinstance(table, statbuilder.CCTable):
+        table = statbuilder.CCTable(table)
+    prettified = {}
+    for filename, type, name, cc in table.rows(threshold):
+        if filename not in prettified:
+            prettified[filename] = utils.prettify_path(filename, leading_path)
+        yield [prettified[filename], type, name, cc]
+
+
 class CCGoogleChartFormatter(utils.IReportFormatter):
     """Base class for formatting Cyclomatic Complexity reports.
 
@@ -49,7 +67,7 @@ class CCGoogleChartFormatter(utils.IReportFormatter):
         self._outstream = out
         self.leading_path = leading_path
 
-        self.chart = tableprint.GoogleChartTable(
+        self.chart = tableprint.PagedHtmlTable(
             'Cyclomatic Complexity',
             [('Filename', 'string'),
                 ('Type', 'string'),
@@ -60,18 +78,12 @@ class CCGoogleChartFormatter(utils.IReportFormatter):
         self.outstream().write(self.chart.first_part())
 
     def format_report_footer(self):
-        rst = _get_header_rst(self.leading_path, self.threshold)
-        html = utils.rst_to_html(rst)
+        html = _get_header_html(self.leading_path, self.threshold)
         self.outstream().write(self.chart.last_part(abovetable=html))
 
     def format_data(self, files_stats_failures):
         """Formats the output of measure_cyclcompl
-        ([filename, stats], [failures])."""
-        rows = []
-        def abovethreshold(flatstat):
-            return _above_threshold(flatstat, self.threshold)
-        for filename, stats in files_stats_failures[0]:
-            filename = utils.prettify_path(filename, self.leading_path)
-            for type, name, cc in filter(abovethreshold, stats.flatStats):
-                rows.append([filename, type, name, cc])
-        self.outstream().write(self.chart.second_part(rows))
+        (CCTable or [filename, stats], [failures])."""
+        rows = iter_rows(files_stats_failures, self.leading_path,
+                         self.threshold)
+        self.chart.write_second_part(self.outstream(), rows)
@@ -4,11 +4,19 @@ Contains functionality for calculating the Cyclomatic Complexity of python code.
 find a reliable home base for it), but significantly refactored for clarity and documentation.
 """
 
-import compiler
-from compiler.visitor import ASTVisitor
+import array
+import itertools
 
+import pynocle.sourceunits as sourceunits
+import pynocle.tracing as tracing
 import pynocle.utils as utils
 
+compiler = utils.LazyModule('compiler')
+
+#Stage name used when releasing files from a sourceunits.SourceUnitStore.
+SOURCE_STAGE = 'cyclcompl'
+
+
 class Stats(object):
     """The base class for other types of statistics.
 
@@ -75,72 +83,234 @@ class FlatStats(object):
             self.summaryStats['Total'][1] = self.summaryStats['Total'][1] + row[2]
 
 
-class CCVisitor(ASTVisitor):
-    """Encapsulates the cyclomatic complexity counting."""
+#Kinds of rows in FlatStats.flatStats, in the order of their ids in CCTable.
+KINDS = ('File', 'Class', 'Method', 'Function')
+_KIND_IDS = dict((kind, i) for i, kind in enumerate(KINDS))
+
+
+class _FileStatsView(object):
+    """Lightweight view of one file's rows in a CCTable,
+    with the same flatStats and summaryStats as a FlatStats."""
+    __slots__ = ('table', 'index')
+
+    def __init__(self, table, index):
+        self.table = table
+        self.index = index
+
+    def __repr__(self):
+        return '_FileStatsView(%s)' % self.table.filenames[self.index]
+
+    __str__ = __repr__
+
+    @property
+    def flatStats(self):
+        t = self.table
+        return [(KINDS[t.kinds[i]], t.names[i], t.complexities[i])
+                for i in xrange(t.offsets[self.index],
+                                t.offsets[self.index + 1])]
+
+    @property
+    def summaryStats(self):
+        fs = FlatStats()
+        fs.flatStats = self.flatStats
+        fs.computeSummary()
+        return fs.summaryStats
+
+
+class CCTable(object):
+    """Column store of cyclomatic complexity results.
+    The kind, name, and complexity of every row of every file's FlatStats
+    are stored in one column each, instead of as a list per row.
+    Iterating yields (filename, view) tuples, where each view has the
+    flatStats and summaryStats of the file, same as the list of
+    (filename, FlatStats) tuples it replaces.
+
+    :param results: Collection of (filename, FlatStats) tuples
+      to populate with.
+    """
+    def __init__(self, results=()):
+        self.filenames = []
+        #Rows of file i are offsets[i] up to offsets[i + 1].
+        self.offsets = array.array('i', [0])
+        self.kinds = array.array('b')
+        self.names = []
+        self.complexities = array.array('i')
+        for filename, flatstats in results:
+            self.append(filename, flatstats)
+
+    def append(self, filename, flatstats):
+        """Adds the rows of flatstats (a FlatStats) for filename."""
+        self.filenames.append(filename)
+        for kind, name, cc in flatstats.flatStats:
+            self.kinds.append(_KIND_IDS[kind])
+            self.names.append(name)
+            self.complexities.append(cc)
+        self.offsets.append(len(self.names))
+
+    def extend(self, other):
+        """Appends every file of the CCTable other,
+        a whole column at a time."""
+        base = len(self.names)
+        self.filenames.extend(other.filenames)
+        self.offsets.extend(array.array(
+            'i', [base + offset for offset in other.offsets[1:]]))
+        self.kinds.extend(other.kinds)
+        self.names.extend(other.names)
+        self.complexities.extend(other.complexities)
+
+    @classmethod
+    def merge(cls, tables):
+        """Returns a new CCTable of the files of each of tables, in order,
+        such as the partial results of analyzing separate sets of files."""
+        result = cls()
+        for table in tables:
+            result.extend(table)
+        return result
+
+    def __len__(self):
+        return len(self.filenames)
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+        return self.filenames[index], _FileStatsView(self, index)
+
+    def __iter__(self):
+        for i in xrange(len(self)):
+            yield self[i]
+
+    def rows(self, threshold=1):
+        """Yields (filename, kind, name, cc) for every row with a cc of
+        threshold or more, in file order.
+        Rows are selected from the whole complexity column at once."""
+        import numpy
+        ccs = utils.array_to_numpy(self.complexities)
+        offsets = utils.array_to_numpy(self.offsets)
+        indices = numpy.nonzero(ccs >= threshold)[0]
+        fileids = numpy.searchsorted(offsets, indices, side='right') - 1
+        for i, fileid in itertools.izip(indices.tolist(), fileids.tolist()):
+            yield (self.filenames[fileid], KINDS[self.kinds[i]],
+                   self.names[i], self.complexities[i])
+
+    def summary(self):
+        """Returns a dict of {kind: [count, total complexity]} for every
+        kind and 'Total', the same as FlatStats.summaryStats
+        but for all files."""
+        import numpy
+        kinds = utils.array_to_numpy(self.kinds).astype(int)
+        ccs = utils.array_to_numpy(self.complexities)
+        counts = numpy.bincount(kinds, minlength=len(KINDS))
+        totals = numpy.bincount(kinds, weights=ccs, minlength=len(KINDS))
+        result = {}
+        for i, kind in enumerate(KINDS):
+            result[kind] = [int(counts[i]), int(totals[i])]
+        result['Total'] = [len(self.names), sum(self.complexities)]
+        return result
+
+
+#Names of node types that add one decision point to the complexity of the
+#function, class, or module they are in.
+_DECISION_POINTS = (
+    'For', 'GenExprFor', 'GenExprIf', 'ListCompFor', 'ListCompIf', 'While',
+    'With', 'And', 'Or')
+
+
+class CCVisitor(object):
+    """Encapsulates the cyclomatic complexity counting.
+
+    The AST is walked with an explicit stack, so deeply nested code
+    does not hit the recursion limit.
+    Each function (or lambda) and class gets its own Stats,
+    in the order they appear in the source.
+    """
     def __init__(self, ast):
-        ASTVisitor.__init__(self)
         if isinstance(ast, basestring):
             ast = compiler.parse(ast)
 
         self.stats = Stats(ast.name)
-        for child in ast.getChildNodes():
-            compiler.walk(child, self, walker=self)
-
-    def dispatchChildren(self, node):
-        for child in node.getChildNodes():
-            self.dispatch(child)
-
-    def visitFunction(self, node):
-        if not hasattr(node, 'name'): # lambdas
-            node.name = '<lambda>'
-        vis = CCVisitor(node)
-        self.stats.functions.append(vis.stats)
-
-    visitLambda = visitFunction
-
-    def visitClass(self, node):
-        vis = CCVisitor(node)
-        self.stats.classes.append(vis.stats)
-
-    def visitIf(self, node):
-        self.stats.complexity += len(node.tests)
-        self.dispatchChildren(node)
-
-    def __processDecisionPoint(self, node):
-        self.stats.complexity += 1
-        self.dispatchChildren(node)
-
-    visitFor = __processDecisionPoint
-    visitGenExprFor = __processDecisionPoint
-    visitGenExprIf = __processDecisionPoint
-    visitListCompFor = __processDecisionPoint
-    visitListCompIf = __processDecisionPoint
-    visitWhile = __processDecisionPoint
-    visitWith = __processDecisionPoint
-    visitAnd = __processDecisionPoint
-    visitOr = __processDecisionPoint
-
-
-def measure_file_complexity(filename):
-    """Returns a FlatStats object for the contents of the file at filename."""
+        decisionpoints = utils.ast_types(_DECISION_POINTS)
+        #Stack of (node, Stats of the scope node is in), popped in order.
+        stack = [(child, self.stats) for child in ast.getChildNodes()]
+        stack.reverse()
+        while stack:
+            node, stats = stack.pop()
+            if isinstance(node, (compiler.ast.Function, compiler.ast.Lambda)):
+                if not hasattr(node, 'name'): # lambdas
+                    node.name = '<lambda>'
+                scope = Stats(node.name)
+                stats.functions.append(scope)
+            elif isinstance(node, compiler.ast.Class):
+                scope = Stats(node.name)
+                stats.classes.append(scope)
+            else:
+                scope = stats
+                if isinstance(node, compiler.ast.If):
+                    stats.complexity += len(node.tests)
+                elif isinstance(node, decisionpoints):
+                    stats.complexity += 1
+            children = node.getChildNodes()
+            stack.extend((children[i], scope)
+                         for i in range(len(children) - 1, -1, -1))
+
+
+def measure_file_complexity(filename, store=None):
+    """Returns a FlatStats object for the contents of the file at filename.
+
+    store: If provided, a sourceunits.SourceUnitStore to get the AST from.
+      The file is released from the store afterwards.
+    """
     modulename = utils.splitpath_root_file_ext(filename)[1]
-    ast = compiler.parseFile(filename)
+    ast = sourceunits.parse(filename, SOURCE_STAGE, store)
     ast.name = modulename
     visitor = CCVisitor(ast)
     return FlatStats(visitor.stats)
 
 
-def measure_cyclcompl(files):
+def _measure_file_or_none(filename, store=None):
+    """Returns measure_file_complexity for filename,
+    or None if it cannot be parsed."""
+    try:
+        return measure_file_complexity(filename, store)
+    except SyntaxError:
+        return None
+
+
+def measure_cyclcompl(files, store=None, jobs=None, cache=None,
+                      tracer=tracing.NULL_TRACER):
     """Returns 2 items:
-    A collection of (filename, FlatStat instance for file) tuples,
-    and a collection of files that failed to parse.
+    A CCTable, which is a collection of (filename, FlatStats view for file)
+    tuples, and a collection of files that failed to parse.
+
+    store: If provided, a sourceunits.SourceUnitStore to read files from.
+        Not used if files are measured in worker processes.
+    jobs: Number of worker processes to measure files in.
+        See utils.resolve_jobs.
+    cache: If provided, an analysiscache.AnalysisCache to load the FlatStats
+        of unchanged files from.
+    tracer: tracing.Tracer to record a span for each file in.
     """
-    result = []
+    files = list(files)
+    if cache is not None:
+        #FlatStats include the module name.
+        allstats = cache.map(
+            SOURCE_STAGE, files, _measure_file_or_none, store, jobs, tracer,
+            lambda f: utils.splitpath_root_file_ext(f)[1])
+    elif utils.resolve_jobs(jobs) > 1:
+        with tracer.span('cyclcompl pool', jobs=jobs):
+            allstats = utils.parallel_map(_measure_file_or_none, files, jobs)
+    else:
+        def measure(f):
+            with tracer.span(SOURCE_STAGE, filename=f):
+                return _measure_file_or_none(f, store)
+        #Lazily, so only one file's FlatStats exists at a time.
+        allstats = itertools.imap(measure, files)
+    result = CCTable()
     failures = []
-    for f in files:
-        try:
-            stats = measure_file_complexity(f)
-            result.append((f, stats))
-        except SyntaxError:
+    for f, stats in itertools.izip(files, allstats):
+        if stats is None:
             failures.append(f)
+        else:
+            result.append(f, stats)
     return result, failures
\ No newline at end of file
@@ -0,0 +1,55 @@
+#!/usr/bin/env python
+
+import unittest
+
+import pynocle.cyclcompl.statbuilder as statbuilder
+
+
+def _flatstats(rows):
+    fs = statbuilder.FlatStats()
+    fs.flatStats = rows
+    fs.computeSummary()
+    return fs
+
+
+class TestCCTable(unittest.TestCase):
+    def setUp(self):
+        self.a = _flatstats([('File', 'a', 3), ('Class', 'A', 2),
+                             ('Method', 'A.f', 8)])
+        self.b = _flatstats([('File', 'b', 1), ('Function', 'g', 6)])
+        self.table = statbuilder.CCTable([('a.py', self.a), ('b.py', self.b)])
+
+    def testViews(self):
+        """Test that iterating yields views with the same stats
+        as the FlatStats they were made from."""
+        views = list(self.table)
+        self.assertEqual([f for f, v in views], ['a.py', 'b.py'])
+        for (filename, view), fs in zip(views, [self.a, self.b]):
+            self.assertEqual(view.flatStats, fs.flatStats)
+            self.assertEqual(view.summaryStats, fs.summaryStats)
+
+    def testRowsAboveThreshold(self):
+        self.assertEqual(list(self.table.rows(6)),
+                         [('a.py', 'Method', 'A.f', 8),
+                          ('b.py', 'Function', 'g', 6)])
+        self.assertEqual(len(list(self.table.rows())), 5)
+
+    def testMerge(self):
+        """Test that merged tables have the rows of each file."""
+        other = statbuilder.CCTable([('c.py', self.b)])
+        merged = statbuilder.CCTable.merge([self.table, other])
+        self.assertEqual(merged.filenames, ['a.py', 'b.py', 'c.py'])
+        self.assertEqual(merged[2][1].flatStats, self.b.flatStats)
+        self.assertEqual(merged[0][1].flatStats, self.a.flatStats)
+        self.assertEqual(merged.summary()['Function'], [2, 12])
+
+    def testSummary(self):
+        summary = self.table.summary()
+        self.assertEqual(summary['Method'], [1, 8])
+        self.assertEqual(summary['File'], [2, 4])
+        self.assertEqual(summary['Total'], [5, 20])
+
+    def testEmpty(self):
+        table = statbuilder.CCTable()
+        self.assertEqual(list(table.rows()), [])
+        self.assertEqual(table.summary()['Total'], [0, 0])
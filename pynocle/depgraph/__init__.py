@@ -1,6 +1,10 @@
 #!/usr/bin/env python
 
-from _doc import about_coupling, about_rank
+from _doc import about_coupling, about_cycles, about_rank
+from cycles import ImportCycle, find_cycles
 from depbuilder import DepBuilder, DependencyGroup
-from formatting import RankGoogleChartFormatter, CouplingGoogleChartFormatter
+from incremental import IncrementalDependencyGraph
+from formatting import (RankGoogleChartFormatter, CouplingGoogleChartFormatter,
+                        CyclesGoogleChartFormatter)
+from reduction import GraphReduction
 from rendering import IRenderer, DefaultRenderer, DefaultStyler
@@ -47,3 +47,23 @@ For more info about coupling, see `the Wikipedia article on coupling
 For more information about PageRank, see `the Wikipedia article on PageRank
 <http://en.wikipedia.org/wiki/Page_rank>`_.
 """
+
+
+def about_cycles():
+    return """
+Import Cycles
+-------------
+
+An import cycle is a group of modules that all import each other,
+directly or through other modules in the group.  Modules in a cycle
+cannot be understood, tested, or reused apart from each other,
+and the order they are imported in can change what they see at import time.
+
+Each cycle is listed with its modules, and a small set of imports which,
+if removed (or moved into functions, or broken up with a new module),
+would break the cycle.  Every import in that set is needed to break it,
+though other sets may exist.
+
+For more info, see `the Wikipedia article on circular dependencies
+<http://en.wikipedia.org/wiki/Circular_dependency>`_.
+"""
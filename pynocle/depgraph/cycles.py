@@ -0,0 +1,234 @@
+#!/usr/bin/env python
+"""
+Finds import cycles in a DependencyGroup.
+
+Cycles are the strongly connected components of the dependency graph
+with more than one module (or a module that imports itself).
+Components are found with Tarjan's algorithm in O(V + E),
+using an explicit stack so graphs of any depth can be analyzed.
+
+For each cycle, a small set of imports to remove to break it is suggested.
+Finding the smallest such set (a minimum feedback arc set) is NP-hard,
+so the set is found with the greedy ordering heuristic of Eades, Lin, and
+Smyth, and then made minimal: removing any fewer of its imports would
+leave a cycle.
+"""
+
+import heapq
+
+
+def successor_lists(depgroup):
+    """Returns a list of the ids each node id in depgroup depends on."""
+    successors = [[] for _ in xrange(len(depgroup.id_to_node))]
+    for startid, endid in depgroup.iter_edge_ids():
+        successors[startid].append(endid)
+    return successors
+
+
+def component_ids(numnodes, successors):
+    """Returns a list of the strongly connected component of each node,
+    and the number of components.
+    Components are numbered in reverse topological order,
+    so a component's number is greater than that of any component
+    it depends on.
+
+    :param successors: List of the node ids each node id depends on.
+    """
+    index = [-1] * numnodes
+    lowlink = [0] * numnodes
+    onstack = [False] * numnodes
+    component = [-1] * numnodes
+    stack = []
+    counter = 0
+    numcomponents = 0
+    for root in xrange(numnodes):
+        if index[root] != -1:
+            continue
+        index[root] = lowlink[root] = counter
+        counter += 1
+        stack.append(root)
+        onstack[root] = True
+        work = [(root, iter(successors[root]))]
+        while work:
+            node, children = work[-1]
+            for child in children:
+                if index[child] == -1:
+                    index[child] = lowlink[child] = counter
+                    counter += 1
+                    stack.append(child)
+                    onstack[child] = True
+                    work.append((child, iter(successors[child])))
+                    break
+                elif onstack[child]:
+                    lowlink[node] = min(lowlink[node], index[child])
+            else:
+                work.pop()
+                if work:
+                    parent = work[-1][0]
+                    lowlink[parent] = min(lowlink[parent], lowlink[node])
+                if lowlink[node] == index[node]:
+                    while True:
+                        member = stack.pop()
+                        onstack[member] = False
+                        component[member] = numcomponents
+                        if member == node:
+                            break
+                    numcomponents += 1
+    return component, numcomponents
+
+
+def _eades_order(numnodes, edges):
+    """Returns the nodes 0 to numnodes - 1 in an order where few of edges
+    go backwards (Eades, Lin, and Smyth):
+    sinks go last, sources go first, and otherwise the node with the most
+    more outgoing than incoming edges goes first."""
+    succ = [[] for _ in xrange(numnodes)]
+    pred = [[] for _ in xrange(numnodes)]
+    for a, b in edges:
+        succ[a].append(b)
+        pred[b].append(a)
+    outdeg = [len(s) for s in succ]
+    indeg = [len(p) for p in pred]
+    removed = [False] * numnodes
+    first = []
+    last = []
+    sinks = [n for n in xrange(numnodes) if not outdeg[n]]
+    sources = [n for n in xrange(numnodes) if not indeg[n] and outdeg[n]]
+    #Heap of (-(outdeg - indeg), node), with stale entries skipped.
+    heap = [(indeg[n] - outdeg[n], n) for n in xrange(numnodes)]
+    heapq.heapify(heap)
+
+    def remove(node):
+        removed[node] = True
+        for p in pred[node]:
+            if not removed[p]:
+                outdeg[p] -= 1
+                if not outdeg[p]:
+                    sinks.append(p)
+                else:
+                    heapq.heappush(heap, (indeg[p] - outdeg[p], p))
+        for s in succ[node]:
+            if not removed[s]:
+                indeg[s] -= 1
+                if not indeg[s]:
+                    sources.append(s)
+                else:
+                    heapq.heappush(heap, (indeg[s] - outdeg[s], s))
+
+    remaining = numnodes
+    while remaining:
+        if sinks:
+            node = sinks.pop()
+            if removed[node]:
+                continue
+            last.append(node)
+        elif sources:
+            node = sources.pop()
+            if removed[node]:
+                continue
+            first.append(node)
+        else:
+            delta, node = heapq.heappop(heap)
+            if removed[node] or delta != indeg[node] - outdeg[node]:
+                continue
+            first.append(node)
+        remove(node)
+        remaining -= 1
+    last.reverse()
+    return first + last
+
+
+def _reaches(succ, start, goal):
+    """Returns True if goal can be reached from start in succ."""
+    seen = set([start])
+    stack = [start]
+    while stack:
+        node = stack.pop()
+        if node == goal:
+            return True
+        for s in succ[node]:
+            if s not in seen:
+                seen.add(s)
+                stack.append(s)
+    return False
+
+
+def breaking_edges(numnodes, edges):
+    """Returns a minimal list of edges (from edges, which are tuples of
+    node ids between 0 and numnodes - 1) to remove to leave no cycles.
+    Minimal means that every returned edge would close a cycle
+    if it were kept."""
+    order = _eades_order(numnodes, edges)
+    position = [0] * numnodes
+    for i, node in enumerate(order):
+        position[node] = i
+    succ = [[] for _ in xrange(numnodes)]
+    backwards = []
+    for a, b in edges:
+        if position[a] < position[b]:
+            succ[a].append(b)
+        else:
+            backwards.append((a, b))
+    result = []
+    for a, b in backwards:
+        if _reaches(succ, b, a):
+            result.append((a, b))
+        else:
+            succ[a].append(b)
+    return result
+
+
+class ImportCycle(object):
+    """A group of modules that all import each other,
+    directly or not.
+
+    Attrs:
+
+    - members: List of the modules in the cycle.
+    - dependencies: List of (startpt, endpt) tuples of the imports
+      between members.
+    - breaking: List of (startpt, endpt) tuples of the imports that,
+      if removed, would break the cycle.  See `breaking_edges`.
+    """
+    def __init__(self, members, dependencies, breaking):
+        self.members = members
+        self.dependencies = dependencies
+        self.breaking = breaking
+
+    def __repr__(self):
+        return 'ImportCycle(%s modules, %s imports to break)' % (
+            len(self.members), len(self.breaking))
+
+    __str__ = __repr__
+
+
+def find_cycles(depgroup):
+    """Returns a list of ImportCycle for each import cycle in depgroup,
+    largest first (and then in the order their first member
+    was first seen)."""
+    numnodes = len(depgroup.id_to_node)
+    component, numcomponents = component_ids(
+        numnodes, successor_lists(depgroup))
+    members = [[] for _ in xrange(numcomponents)]
+    for nodeid in xrange(numnodes):
+        members[component[nodeid]].append(nodeid)
+    edges = [[] for _ in xrange(numcomponents)]
+    for a, b in depgroup.iter_edge_ids():
+        if component[a] == component[b]:
+            edges[component[a]].append((a, b))
+    nodes = depgroup.id_to_node
+    result = []
+    for compid in xrange(numcomponents):
+        if not edges[compid]:
+            continue
+        ids = members[compid]
+        local = dict((nodeid, i) for i, nodeid in enumerate(ids))
+        localedges = [(local[a], local[b]) for a, b in edges[compid]]
+        breaking = [(nodes[ids[a]], nodes[ids[b]])
+                    for a, b in breaking_edges(len(ids), localedges)]
+        result.append(ImportCycle(
+            [nodes[i] for i in ids],
+            [(nodes[a], nodes[b]) for a, b in edges[compid]],
+            breaking))
+    result.sort(key=lambda c: -len(c.members))
+    return result
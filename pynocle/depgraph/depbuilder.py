@@ -1,15 +1,19 @@
 #!/usr/bin/env python
 
-import compiler
-import compiler.ast
+import array
+import collections
 import fnmatch
 import itertools
 import os
 import sys
 
 import pynocle._modulefinder as modulefinder
+import pynocle.sourceunits as sourceunits
+import pynocle.tracing as tracing
 import pynocle.utils as utils
 
+compiler = utils.LazyModule('compiler')
+
 
 _python_stdlib_filter = os.path.dirname(sys.executable) + '*'
 _pycharm_filter = '*JetBrains\PyCharm *'
@@ -17,6 +21,9 @@ EXCLUDE_PATHS = _python_stdlib_filter, _pycharm_filter
 
 EXCLUDE_MODULES = ('sys', 'time','imp')
 
+#Stage name used when releasing files from a sourceunits.SourceUnitStore.
+SOURCE_STAGE = 'depgraph'
+
 
 class Dependency(object):
     """Data object that represents a single dependency with a
@@ -45,62 +52,295 @@ class Dependency(object):
     __repr__ = __str__
 
 
+def _source_filename(filename):
+    """Returns the filename of the python source for the module at filename,
+    or None if there is no source we can parse (pyd, missing file).
+    """
+    #We can only read py files right now
+    if filename.endswith('.pyd'):
+        return None
+    if filename.endswith('.pyc') or filename.endswith('.pyo'):
+        filename = filename[:-1]
+    elif not os.path.splitext(filename)[1]: #Has no ext whatsoever
+        filename += '.py'
+    if not os.path.exists(filename):
+        return None
+    return filename
+
+
+def _extract_modulename(node):
+    """If node is a From/Import node, return the module's name,
+    otherwise return None."""
+    if isinstance(node, compiler.ast.Import):
+        return node.names[0][0]
+    if isinstance(node, compiler.ast.From):
+        return node.modname
+    return None
+
+
+def _imported_modulenames(astnode):
+    """Returns a list of the names of all modules imported in astnode."""
+    allnodes = utils.flatten_statements(astnode)
+    return filter(None, itertools.imap(_extract_modulename, allnodes))
+
+
+def _parse_imported_modulenames(filename, store=None):
+    """Returns a list of the module names imported by the source at filename,
+    or None if it cannot be parsed.
+    Module-level so it can be run in worker processes."""
+    try:
+        return _imported_modulenames(
+            sourceunits.parse(filename, SOURCE_STAGE, store))
+    except SyntaxError:
+        return None
+
+
+def _count_ids(ids, numids):
+    """Returns an array where the value at each index is the number of times
+    that index occurs in ids."""
+    counts = array.array('i', [0]) * numids
+    for i in ids:
+        counts[i] += 1
+    return counts
+
+
+class _NodeCountView(collections.Mapping):
+    """Read-only mapping of {dependency node: count} on top of
+    the per-id counts of a DependencyGroup."""
+    def __init__(self, node_to_id, id_to_node, counts):
+        self._node_to_id = node_to_id
+        self._id_to_node = id_to_node
+        self._counts = counts
+
+    def __getitem__(self, node):
+        return self._counts[self._node_to_id[node]]
+
+    def __iter__(self):
+        return iter(self._id_to_node)
+
+    def __len__(self):
+        return len(self._id_to_node)
+
+    def __contains__(self, node):
+        return node in self._node_to_id
+
+    def keys(self):
+        return list(self._id_to_node)
+
+    def values(self):
+        return list(self._counts)
+
+    def items(self):
+        return zip(self._id_to_node, self._counts)
+
+
+class _DependencyView(collections.Sequence):
+    """Read-only sequence of Dependency instances on top of
+    the edge arrays of a DependencyGroup."""
+    def __init__(self, depgroup):
+        self._depgroup = depgroup
+
+    def __len__(self):
+        return len(self._depgroup.startids)
+
+    def __getitem__(self, index):
+        g = self._depgroup
+        if isinstance(index, slice):
+            return [self[i] for i in xrange(*index.indices(len(self)))]
+        return Dependency(g.id_to_node[g.startids[index]],
+                          g.id_to_node[g.endids[index]])
+
+    def __iter__(self):
+        nodes = self._depgroup.id_to_node
+        for startid, endid in self._depgroup.iter_edge_ids():
+            yield Dependency(nodes[startid], nodes[endid])
+
+
 class DependencyGroup(object):
+    """A group of dependencies between modules,
+    and the afferent (Ca) and efferent (Ce) coupling of each module.
+
+    Each unique dependency node (module path) is interned to an integer id,
+    in the order it is first seen in dependencies,
+    and edges are stored as two parallel arrays of ids.
+
+    :param dependencies: Collection of Dependency instances or two-item
+      (startpt, endpt) tuples.
+    :param failed: Collection of modules that could not be parsed.
+
+    Attrs:
+
+    - id_to_node: List of the dependency node for each id.
+    - node_to_id: Dict of {dependency node: id}.
+    - startids, endids: Arrays of the start and end id of each edge.
+    - ca_counts, ce_counts: Arrays of the Ca and Ce for each id.
+    - depnode_to_ca, depnode_to_ce: Read-only mappings of
+      {dependency node: Ca/Ce} with an entry for every node.
+    - dependencies: Read-only sequence of Dependency instances.
+    """
     def __init__(self, dependencies, failed=()):
         self.failed = failed
-        self.dependencies = dependencies
-        self.allstartpts, self.allendpts = zip(*dependencies)
-        self.depnode_to_ca = self._calc_coupling(self.allendpts)
-        self.depnode_to_ce = self._calc_coupling(self.allstartpts)
-        #allstartpts and allendpts will be of equal size, but not equal contents- we want to make sure our coupling
-        #dicts have the same keys so we have all metrics for all modules!
-        for d in self.depnode_to_ca, self.depnode_to_ce:
-            for key in self.allstartpts + self.allendpts:
-                d.setdefault(key, 0)
-
-    def _calc_coupling(self, depnodes):
-        """Return a dict where keys are all unique items in depnodes and values are the number of times
-        those items occur.
+        self.id_to_node = []
+        self.node_to_id = {}
+        self.startids = array.array('i')
+        self.endids = array.array('i')
+        for startpt, endpt in dependencies:
+            self.startids.append(self.intern(startpt))
+            self.endids.append(self.intern(endpt))
+        self._count()
+
+    def __getstate__(self):
+        #Only the interned edges, the views are rebuilt from them.
+        return self.failed, self.id_to_node, self.startids, self.endids
+
+    def __setstate__(self, state):
+        self.failed, self.id_to_node, self.startids, self.endids = state
+        self.node_to_id = dict(
+            (node, i) for i, node in enumerate(self.id_to_node))
+        self._count()
+
+    def _count(self):
+        self.ca_counts = _count_ids(self.endids, len(self.id_to_node))
+        self.ce_counts = _count_ids(self.startids, len(self.id_to_node))
+        self.depnode_to_ca = _NodeCountView(
+            self.node_to_id, self.id_to_node, self.ca_counts)
+        self.depnode_to_ce = _NodeCountView(
+            self.node_to_id, self.id_to_node, self.ce_counts)
+        self.dependencies = _DependencyView(self)
+
+    @classmethod
+    def merge(cls, groups):
+        """Returns a DependencyGroup of the dependencies of each of groups,
+        such as those built by DepBuilders started from separate sets of
+        files.
+
+        A DepBuilder follows imports out of the files it started from,
+        so the same module can be a start point in more than one group,
+        always with the same dependencies.
+        The dependencies of each module are only taken from the first
+        group it is a start point in, so none are counted twice.
         """
-        #This method can be optimized if it ever becomes a bottleneck
-        result = {}
-        depnodecopy = list(depnodes)
-        unique = set(depnodes)
-        for item in unique:
-            count = 0
-            for i in range(len(depnodecopy) - 1, 0, -1): #we're modifying depnodecopy inside loop
-                if depnodecopy[i] == item: #Increment and remove the item so we don't have to reiterate it
-                    depnodecopy.pop(i)
-                    count += 1
-            result[item] = count
-        return result
+        claimed = set()
+        dependencies = []
+        failed = []
+        failedset = set()
+        for group in groups:
+            nodes = group.id_to_node
+            owned = set()
+            for startid, endid in group.iter_edge_ids():
+                startpt = nodes[startid]
+                if startpt not in claimed:
+                    owned.add(startpt)
+                    dependencies.append((startpt, nodes[endid]))
+            claimed.update(owned)
+            for f in group.failed:
+                if f not in failedset:
+                    failedset.add(f)
+                    failed.append(f)
+        return cls(dependencies, failed)
+
+    def intern(self, depnode):
+        """Returns the id for depnode, assigning the next id if it is new."""
+        nodeid = self.node_to_id.get(depnode)
+        if nodeid is None:
+            nodeid = len(self.id_to_node)
+            self.node_to_id[depnode] = nodeid
+            self.id_to_node.append(depnode)
+        return nodeid
+
+    def iter_edge_ids(self):
+        """Yields a (start id, end id) tuple for each dependency."""
+        return itertools.izip(self.startids, self.endids)
+
+    @property
+    def allstartpts(self):
+        return tuple(self.id_to_node[i] for i in self.startids)
+
+    @property
+    def allendpts(self):
+        return tuple(self.id_to_node[i] for i in self.endids)
 
 
 class DepBuilder:
     """Builds dependencies between modules,
     starting from all modules in filenames.
+    Modules are found one frontier at a time (filenames, then every module
+    they import that has not been seen yet, and so on),
+    so stack depth does not grow with the length of import chains.
     Dependencies are available as a list of `Dependency`
     instances as `self.dependencies`.
     Modules that could not be parsed are available as `self.failed`.
+    Every module found is a key of `self.imports`, whose value is the
+    list of `imports_of` it, or None if it could not be parsed.
+    The names of the modules each parsed file imports are in
+    `self.modulenames`, keyed by absolute filename.
 
     :param exclude_paths: Collection of fnmatch patterns.
       Any path that matches any pattern will not be considered for dependencies.
     :param exclude_modules: Any modules that match one of the strings
       in this collection will not be considered for dependencies.
       This is necessary because some modules do not have filenames.
+    :param store: If provided, a sourceunits.SourceUnitStore to read and
+      parse files through.
+    :param jobs: Number of worker processes to parse each frontier in.
+      See utils.resolve_jobs.  Imports are always resolved in this process.
+    :param cache: If provided, an analysiscache.AnalysisCache to load the
+      imported module names of unchanged files from.
+    :param tracer: tracing.Tracer to record a span for each parsed file,
+      and counters for module lookups, in.
+    :param modulefinder_cache: _modulefinder.ModuleFinderCache to resolve
+      imported module names with, such as one loaded from a previous run.
+      If None, use a new one.
+    :param follow: Callable that takes an extensionless filename and
+      returns whether to parse the module there and find its dependencies.
+      Modules that are not followed are still dependency endpoints,
+      and are listed by filename in `self.unfollowed`.
+      If None, follow every module.
     """
     def __init__(self,
                  filenames,
                  exclude_paths=EXCLUDE_PATHS,
-                 exclude_modules=EXCLUDE_MODULES):
-        self._processed = set()
+                 exclude_modules=EXCLUDE_MODULES,
+                 store=None,
+                 jobs=None,
+                 cache=None,
+                 tracer=tracing.NULL_TRACER,
+                 modulefinder_cache=None,
+                 follow=None):
+        self.store = store
+        self.cache = cache
+        self.tracer = tracer
+        self.follow = follow
         self.dependencies = []
         self.failed = []
+        self.unfollowed = []
+        self.modulenames = {}
         self.exclude_paths = exclude_paths
         self.exclude_modules = set(exclude_modules)
-        self.modulefinder_cache = modulefinder.ModuleFinderCache()
-        for fn in filenames:
-            self._process_file(fn)
+        self.modulefinder_cache = (modulefinder_cache or
+                                   modulefinder.ModuleFinderCache())
+        self.filenames = filenames = list(filenames)
+        if not self.modulefinder_cache.loaded:
+            with self.tracer.span('ModuleIndex.scan'):
+                #List sys.path and the project's directories once up front,
+                #so module lookups never need to touch the disk.
+                index = self.modulefinder_cache.index
+                index.scan()
+                index.scan(set(os.path.dirname(os.path.abspath(fn))
+                               for fn in filenames))
+        self.imports = self._discover(filenames, jobs)
+        self._add_dependencies(filenames, self.imports)
+
+    def _trace_counters(self):
+        if not self.tracer.enabled:
+            return
+        mfc = self.modulefinder_cache
+        self.tracer.counter('ModuleFinderCache', hits=mfc.hits,
+                            misses=mfc.misses)
+        self.tracer.counter('ModuleFinderCache hit rate',
+                            hitrate=mfc.hitrate())
+        self.tracer.counter('ModuleIndex', listdirs=mfc.index.listdirs)
+        self.tracer.counter('Exclusion memo', size=len(self.exclude_modules))
 
     def _is_excluded(self, path):
         """Check whether the given path is an excluded module.
@@ -126,61 +366,139 @@ class DepBuilder:
         """Return an extensionless path for filename."""
         return os.path.splitext(filename)[0]
 
-    def _extract_modulename(self, node):
-        """If node is a From/Import node, return the module's name,
-        otherwise return None."""
-        if isinstance(node, compiler.ast.Import):
-            return node.names[0][0]
-        if isinstance(node, compiler.ast.From):
-            return node.modname
-        return None
-
-    def _get_all_imported_modulenames(self, filename):
-        """Compiles an AST for filename and returns the module names
-        for all modules imported by.
+    def _parse_frontier(self, filenames, jobs):
+        """Returns a list of the module names imported by each of
+        filenames, parsing all of them in one batch
+        (in worker processes if jobs > 1).
 
-        If no file for filename exists, or it is an unparseable file (pyd, pyc),
-        return an empty list.
-
-        If the file cannot be parsed,
-        append to self.failed and return an empty list.
+        Files with no source we can parse (pyd, missing files) import nothing.
+        Files that cannot be parsed have None instead of a list.
         """
-        #We can only read py files right now
-        if filename.endswith('.pyd'):
-            return []
-        if filename.endswith('.pyc') or filename.endswith('.pyo'):
-            filename = filename[:-1]
-        elif not os.path.splitext(filename)[1]: #Has no ext whatsoever
-            filename += '.py'
-        if not os.path.exists(filename):
-            return []
-        try:
-            astnode = compiler.parseFile(filename)
-        except SyntaxError:
-            self.failed.append(self._extless(filename))
-            return []
-        allnodes = utils.flatten(astnode, lambda node: node.getChildNodes())
-        names = itertools.imap(self._extract_modulename, allnodes)
-        names = itertools.ifilter(None, names)
-        return names
-
-    def _process_file(self, filename):
-        """Process the file at filename.
-        Adds it to processed,
-        and finds dependencies for all import nodes."""
-        filename = os.path.abspath(filename)
-        extless_filename = self._extless(filename)
-        if (extless_filename in self._processed or
-            self._is_excluded(extless_filename)):
-            return
-        self._processed.add(extless_filename)
-        importednames = self._get_all_imported_modulenames(filename)
+        srcfiles = map(_source_filename, filenames)
+        toparse = sorted(set(srcfiles) - set([None]))
+        parallel = utils.resolve_jobs(jobs) > 1
+        #Worker processes read their own files.
+        store = None if parallel else self.store
+        if self.cache is not None:
+            allnames = self.cache.map(SOURCE_STAGE, toparse,
+                                      _parse_imported_modulenames, store,
+                                      jobs=jobs, tracer=self.tracer)
+        elif parallel:
+            with self.tracer.span('depgraph pool', files=len(toparse),
+                                  jobs=jobs):
+                allnames = utils.parallel_map(
+                    _parse_imported_modulenames, toparse, jobs)
+        else:
+            allnames = []
+            for filename in toparse:
+                with self.tracer.span(SOURCE_STAGE, filename=filename):
+                    allnames.append(
+                        _parse_imported_modulenames(filename, store))
+        names_by_srcfile = dict(zip(toparse, allnames))
+        return [names_by_srcfile[f] if f else [] for f in srcfiles]
+
+    def _resolve(self, filename, importednames):
+        """Returns a list of tuples of
+        (filename, extensionless filename, is a dependency)
+        for each module in importednames that filename imports.
+        Modules that are not dependencies are still searched for imports,
+        the same as the original recursive traversal did."""
+        result = []
         for impmodname in importednames:
             imported_modulefilename = self.modulefinder_cache.get_module_filename(impmodname, filename)
             #We can get back 'sys' as a filename so check if it's excluded before we get the abspath
             if imported_modulefilename and not self._is_excluded(imported_modulefilename):
                 imported_modulefilename = os.path.abspath(imported_modulefilename)
                 extless_imported_modulefilename = self._extless(imported_modulefilename)
-                if not self._is_excluded(extless_imported_modulefilename):
-                    self.dependencies.append(Dependency(extless_filename, extless_imported_modulefilename))
-                self._process_file(imported_modulefilename)
+                isdep = not self._is_excluded(extless_imported_modulefilename)
+                result.append((imported_modulefilename,
+                               extless_imported_modulefilename, isdep))
+        return result
+
+    def imports_of(self, filename):
+        """Returns a list of (filename, extensionless filename,
+        is a dependency) tuples for each module the module at filename
+        imports now, or None if it cannot be parsed,
+        and updates its names in self.modulenames.
+        Modules are found with this builder's module finder cache,
+        so modules that have been added since may not be found
+        unless the cache was refreshed."""
+        filename = os.path.abspath(filename)
+        srcfile = _source_filename(filename)
+        if srcfile is None:
+            return []
+        names = _parse_imported_modulenames(srcfile)
+        if names is None:
+            self.modulenames.pop(filename, None)
+            return None
+        self.modulenames[filename] = names
+        return self._resolve(filename, names)
+
+    def _discover(self, filenames, jobs):
+        """Finds every module reachable from filenames, one frontier
+        (all newly found modules) at a time, so each frontier is parsed
+        in one batch.
+        Returns a dict of {extensionless filename: list from _resolve,
+        or None if the file could not be parsed}.
+        """
+        imports = {}
+        frontier = filenames
+        depth = 0
+        while frontier:
+            batch = []
+            for filename in frontier:
+                filename = os.path.abspath(filename)
+                extless = self._extless(filename)
+                if extless in imports or self._is_excluded(extless):
+                    continue
+                if self.follow is not None and not self.follow(extless):
+                    imports[extless] = []
+                    self.unfollowed.append(filename)
+                    continue
+                imports[extless] = None
+                batch.append(filename)
+            if not batch:
+                break
+            with self.tracer.span('depgraph frontier', depth=depth,
+                                  files=len(batch)):
+                allnames = self._parse_frontier(batch, jobs)
+                frontier = []
+                for filename, names in zip(batch, allnames):
+                    if names is None:
+                        continue
+                    self.modulenames[filename] = names
+                    resolved = self._resolve(filename, names)
+                    imports[self._extless(filename)] = resolved
+                    frontier.extend(r[0] for r in resolved)
+            self._trace_counters()
+            depth += 1
+        return imports
+
+    def _add_dependencies(self, filenames, imports):
+        """Appends to self.dependencies and self.failed in the same
+        depth-first order the modules were originally visited in,
+        using an explicit stack so deep import chains cannot exhaust
+        python's stack."""
+        processed = set()
+        for filename in filenames:
+            extless = self._extless(os.path.abspath(filename))
+            if extless in processed or extless not in imports:
+                continue
+            processed.add(extless)
+            stack = [(extless, iter(imports[extless] or ()))]
+            if imports[extless] is None:
+                self.failed.append(extless)
+            while stack:
+                startpt, children = stack[-1]
+                for _, endpt, isdep in children:
+                    if isdep:
+                        self.dependencies.append(Dependency(startpt, endpt))
+                    if endpt in processed or endpt not in imports:
+                        continue
+                    processed.add(endpt)
+                    if imports[endpt] is None:
+                        self.failed.append(endpt)
+                    stack.append((endpt, iter(imports[endpt] or ())))
+                    break
+                else:
+                    stack.pop()
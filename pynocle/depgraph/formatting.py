@@ -1,8 +1,10 @@
 #!/usr/bin/env python
 
+import itertools
 import sys
 
 import _doc
+import cycles
 import pagerank
 import pynocle.tableprint as tableprint
 import pynocle.utils as utils
@@ -18,25 +20,36 @@ def _calc_instability(ca, ce):
     return instab
 
 
-def _coupling_infostr(leadingpath):
-    s = _doc.about_coupling()
-    s += '\nShowing the coupling between files under %s.' % (
-        leadingpath.replace('\\', '/'))
-    return s
+def _coupling_infohtml(leadingpath):
+    return utils.doc_html(
+        _doc.about_coupling(),
+        'Showing the coupling between files under %s.' % (
+            leadingpath.replace('\\', '/')))
+
+
+#Columns of the rows from iter_coupling_rows,
+#for tableprint.IStreamingTable.
+COUPLING_COLUMNS = [('filename', 'string'),
+                    ('ca', 'number'),
+                    ('ce', 'number'),
+                    ('instability', 'number')]
+
+
+def iter_coupling_rows(dependencygroup, leadingpath):
+    """Yields the row for each module in dependencygroup, sorted by
+    filename, with a value for each of COUPLING_COLUMNS.
+    Each row is made when it is needed."""
+    for f in sorted(dependencygroup.depnode_to_ca.keys()):
+        ca = dependencygroup.depnode_to_ca[f]
+        ce = dependencygroup.depnode_to_ce[f]
+        yield [utils.prettify_path(f, leadingpath),
+               ca, ce, _calc_instability(ca, ce)]
 
 
 def get_rows(dependencygroup, leadingpath):
     """Return the rows for dependencygroup.
     Caller may have to format the values as strings."""
-    rows = []
-    sortedfilenames = sorted(dependencygroup.depnode_to_ca.keys())
-    for i in range(len(sortedfilenames)):
-        f = sortedfilenames[i]
-        ca = dependencygroup.depnode_to_ca[f]
-        ce = dependencygroup.depnode_to_ce[f]
-        rows.append([utils.prettify_path(f, leadingpath),
-                     ca, ce, _calc_instability(ca, ce)])
-    return rows
+    return list(iter_coupling_rows(dependencygroup, leadingpath))
 
 
 class CouplingGoogleChartFormatter(utils.IReportFormatter):
@@ -47,13 +60,13 @@ class CouplingGoogleChartFormatter(utils.IReportFormatter):
             ('Afferent Coupling (Ca)', 'number'),
             ('Efferent Coupling (Ce)', 'number'),
             ('Instability (I)', 'number')]
-        self.chart = tableprint.GoogleChartTable('Coupling', cols)
+        self.chart = tableprint.PagedHtmlTable('Coupling', cols)
 
     def format_report_header(self):
         self.outstream().write(self.chart.first_part())
 
     def format_report_footer(self):
-        info = utils.rst_to_html(_coupling_infostr(self.leading_path))
+        info = _coupling_infohtml(self.leading_path)
         self.outstream().write(self.chart.last_part(info))
 
     def _js_instab(self, val):
@@ -62,8 +75,9 @@ class CouplingGoogleChartFormatter(utils.IReportFormatter):
     def format_data(self, dependencygroup):
         def stringify(row):
             return row[:3] + [self._js_instab(row[3])]
-        rows = map(stringify, get_rows(dependencygroup, self.leading_path))
-        self.outstream().write(self.chart.second_part(rows))
+        rows = itertools.imap(
+            stringify, iter_coupling_rows(dependencygroup, self.leading_path))
+        self.chart.write_second_part(self.outstream(), rows)
 
 
 def _fmt_rank(val):
@@ -71,25 +85,46 @@ def _fmt_rank(val):
     return '%.5f' % (100 * val)
 
 
-def _rank_infostr(leadingpath):
-    s = _doc.about_rank()
-    s += '\nShowing PageRank coupling for %s.' % leadingpath.replace('\\', '/')
-    return s
+def _rank_infohtml(leadingpath):
+    return utils.doc_html(
+        _doc.about_rank(),
+        'Showing PageRank coupling for %s.' % leadingpath.replace('\\', '/'))
 
 
-def create_rows(dependencygroup, leadingpath):
-    """Returns a list of rows for a dependencygroup."""
+#Columns of the rows from iter_rank_rows, for tableprint.IStreamingTable.
+#outgoing is the space-separated pageids of the modules a module imports.
+RANK_COLUMNS = [('filename', 'string'),
+                ('rank', 'number'),
+                ('pageid', 'number'),
+                ('outgoing', 'string')]
+
+
+def _iter_rank_infos(dependencygroup, leadingpath):
+    """Yields a (filename, rank, id, outgoing ids) tuple for each module
+    in dependencygroup, from the highest rank to the lowest.
+    Only the ranking is computed up front."""
     converter = pagerank.DependenciesToLinkMatrix(dependencygroup.dependencies)
     matrix = converter.create_matrix()
     ranking = pagerank.page_rank(matrix)
-    ids = [idx for idx in range(len(matrix))]
-    filenames = [utils.prettify_path(converter.id_to_node_map[nid], leadingpath)
-                 for nid in ids]
+    #Same order as a stable sort by ranking, reversed.
+    ids = sorted(range(len(matrix)), key=ranking.__getitem__)
+    ids.reverse()
+    for nid in ids:
+        yield (utils.prettify_path(converter.id_to_node_map[nid], leadingpath),
+               ranking[nid], nid, matrix[nid])
+
+
+def create_rows(dependencygroup, leadingpath):
+    """Returns a list of rows for a dependencygroup."""
+    return list(_iter_rank_infos(dependencygroup, leadingpath))
+
 
-    rowinfos = zip(filenames, ranking, ids, matrix)
-    rowinfos.sort(key=lambda item: item[1]) #sort by ranking
-    rowinfos.reverse()
-    return rowinfos
+def iter_rank_rows(dependencygroup, leadingpath):
+    """Yields the row for each module in dependencygroup, from the
+    highest rank to the lowest, with a value for each of RANK_COLUMNS."""
+    for filename, rank, nid, outgoing in _iter_rank_infos(
+            dependencygroup, leadingpath):
+        yield [filename, float(rank), nid, ' '.join(map(str, outgoing))]
 
 
 class RankGoogleChartFormatter(utils.IReportFormatter):
@@ -100,13 +135,13 @@ class RankGoogleChartFormatter(utils.IReportFormatter):
             ('PageRank', 'number'),
             ('PageID', 'number'),
             ('Outgoing Links', 'string')]
-        self.chart = tableprint.GoogleChartTable('Coupling PageRank', cols)
+        self.chart = tableprint.PagedHtmlTable('Coupling PageRank', cols)
 
     def format_report_header(self):
         self.outstream().write(self.chart.first_part())
 
     def format_report_footer(self):
-        s = utils.rst_to_html(_rank_infostr(self.leading_path))
+        s = _rank_infohtml(self.leading_path)
         self.outstream().write(self.chart.last_part(s))
 
     def _js_perc(self, val):
@@ -116,5 +151,48 @@ class RankGoogleChartFormatter(utils.IReportFormatter):
     def format_data(self, dependencygroup):
         def stringify(row):
             return [row[0], self._js_perc(row[1]), row[2], str(row[3])]
-        rows = map(stringify, create_rows(dependencygroup, self.leading_path))
-        self.outstream().write(self.chart.second_part(rows))
+        rows = itertools.imap(
+            stringify, _iter_rank_infos(dependencygroup, self.leading_path))
+        self.chart.write_second_part(self.outstream(), rows)
+
+
+def _cycles_infohtml(leadingpath):
+    return utils.doc_html(
+        _doc.about_cycles(),
+        'Showing import cycles of modules under %s, '
+        'and the modules they import.' % leadingpath.replace('\\', '/'))
+
+
+def create_cycle_rows(dependencygroup, leadingpath):
+    """Returns a list of rows of (number, size, members, imports to break)
+    for each import cycle in dependencygroup, largest first."""
+    prettify = lambda p: utils.prettify_path(p, leadingpath)
+    rows = []
+    for i, cycle in enumerate(cycles.find_cycles(dependencygroup)):
+        members = ', '.join(sorted(map(prettify, cycle.members)))
+        breaking = ', '.join(
+            '%s -> %s' % (prettify(a), prettify(b)) for a, b in cycle.breaking)
+        rows.append([i + 1, len(cycle.members), members, breaking])
+    return rows
+
+
+class CyclesGoogleChartFormatter(utils.IReportFormatter):
+    def __init__(self, out=sys.stdout, leading_path=None):
+        self._outstream = out
+        self.leading_path = leading_path
+        cols = [('Cycle', 'number'),
+            ('Modules', 'number'),
+            ('Members', 'string'),
+            ('Imports to Break', 'string')]
+        self.chart = tableprint.PagedHtmlTable('Import Cycles', cols)
+
+    def format_report_header(self):
+        self.outstream().write(self.chart.first_part())
+
+    def format_report_footer(self):
+        s = _cycles_infohtml(self.leading_path)
+        self.outstream().write(self.chart.last_part(s))
+
+    def format_data(self, dependencygroup):
+        rows = create_cycle_rows(dependencygroup, self.leading_path)
+        self.chart.write_second_part(self.outstream(), rows)
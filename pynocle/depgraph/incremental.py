@@ -0,0 +1,334 @@
+#!/usr/bin/env python
+"""
+A dependency graph that can be updated in place as files change,
+instead of being built again from nothing by DepBuilder.
+
+Replacing the imports of one module updates Ca and Ce in time
+proportional to the number of imports that changed,
+and PageRank is converged again starting from the previous ranking,
+which takes far fewer iterations than starting from uniform
+when only a few modules changed.
+"""
+
+import array
+import os
+
+import depbuilder
+import pagerank
+import pynocle.utils as utils
+
+numpy = utils.LazyModule(
+    'numpy', 'Could not import numpy, cannot generate page ranking.')
+
+
+class IncrementalDependencyGraph(object):
+    """Dependency graph with the same node and Ca/Ce attributes as a
+    DependencyGroup, where the dependencies of a module can be replaced.
+
+    Node ids are interned the same as a DependencyGroup, and never reused,
+    so a module that loses all its dependencies keeps its id
+    (with a Ca and Ce of 0) and is left out of rankings and `to_group`.
+
+    `update_file` keeps track of which modules import which
+    (including imports that are not dependencies, which are still followed),
+    so when a module is no longer imported by anything reachable from
+    the files the DepBuilder started from, its dependencies are removed too.
+    Files can be added to and removed from those with `add_file` and
+    `remove_file`.
+
+    :param dependencies: Collection of Dependency instances or two-item
+      (startpt, endpt) tuples to start with.
+    :param failed: Collection of modules that could not be parsed.
+
+    Attrs:
+
+    - id_to_node, node_to_id: Same as DependencyGroup.
+    - ca_counts, ce_counts: Same as DependencyGroup.
+    - depnode_to_ca, depnode_to_ce: Same as DependencyGroup.
+    - failed: Set of modules that could not be parsed.
+    - ranks: numpy array of the PageRank of each id as of the last
+      call to `page_rank`, or None if it was never called.
+    """
+    def __init__(self, dependencies=(), failed=()):
+        self.id_to_node = []
+        self.node_to_id = {}
+        self._outgoing = []
+        self.ca_counts = array.array('i')
+        self.ce_counts = array.array('i')
+        self.depnode_to_ca = depbuilder._NodeCountView(
+            self.node_to_id, self.id_to_node, self.ca_counts)
+        self.depnode_to_ce = depbuilder._NodeCountView(
+            self.node_to_id, self.id_to_node, self.ce_counts)
+        self.failed = set(failed)
+        self.ranks = None
+        #Set from the DepBuilder by the first update_file.
+        self.roots = None
+        self._imports = None
+        self._importers = None
+        grouped = {}
+        order = []
+        for startpt, endpt in dependencies:
+            if startpt not in grouped:
+                grouped[startpt] = []
+                order.append(startpt)
+            grouped[startpt].append(endpt)
+        for startpt in order:
+            self.replace_outgoing(startpt, grouped[startpt])
+
+    @classmethod
+    def from_group(cls, depgroup):
+        """Returns an IncrementalDependencyGraph of a DependencyGroup."""
+        return cls(depgroup.dependencies, depgroup.failed)
+
+    def intern(self, depnode):
+        """Returns the id for depnode, assigning the next id if it is new."""
+        nodeid = self.node_to_id.get(depnode)
+        if nodeid is None:
+            nodeid = len(self.id_to_node)
+            self.node_to_id[depnode] = nodeid
+            self.id_to_node.append(depnode)
+            self._outgoing.append([])
+            self.ca_counts.append(0)
+            self.ce_counts.append(0)
+        return nodeid
+
+    def outgoing(self, depnode):
+        """Returns a list of the nodes depnode depends on."""
+        nodeid = self.node_to_id.get(depnode)
+        if nodeid is None:
+            return []
+        return [self.id_to_node[i] for i in self._outgoing[nodeid]]
+
+    def replace_outgoing(self, depnode, endpts):
+        """Replaces the dependencies of depnode with ones on each of endpts,
+        in order (duplicates are ignored),
+        and returns the number of dependencies added and removed.
+        Takes time proportional to the old and new dependencies of depnode,
+        not the size of the graph."""
+        startid = self.intern(depnode)
+        newids = []
+        seen = set()
+        for endpt in endpts:
+            endid = self.intern(endpt)
+            if endid not in seen:
+                seen.add(endid)
+                newids.append(endid)
+        oldids = self._outgoing[startid]
+        oldset = set(oldids)
+        changed = 0
+        for endid in oldids:
+            if endid not in seen:
+                self.ca_counts[endid] -= 1
+                changed += 1
+        for endid in newids:
+            if endid not in oldset:
+                self.ca_counts[endid] += 1
+                changed += 1
+        self._outgoing[startid] = newids
+        self.ce_counts[startid] = len(newids)
+        return changed
+
+    def _track(self, builder):
+        """Copies which modules import which from builder,
+        the first time it is called."""
+        if self._imports is not None:
+            return
+        self.roots = set(builder._extless(os.path.abspath(f))
+                         for f in builder.filenames)
+        self._imports = {}
+        self._importers = {}
+        for startpt, imported in builder.imports.iteritems():
+            self._set_imports(startpt, imported or ())
+
+    def _set_imports(self, startpt, imported):
+        """Replaces the modules startpt imports with imported
+        (list of (filename, extensionless filename, is a dependency)),
+        and returns a list of the extensionless filenames it no longer
+        imports."""
+        old = set(endpt for _, endpt in self._imports.get(startpt, ()))
+        new = []
+        seen = set()
+        for path, endpt, _ in imported:
+            if endpt not in seen:
+                seen.add(endpt)
+                new.append((path, endpt))
+                if endpt not in old:
+                    self._importers[endpt] = self._importers.get(endpt, 0) + 1
+        dropped = [endpt for endpt in old if endpt not in seen]
+        for endpt in dropped:
+            self._importers[endpt] -= 1
+        self._imports[startpt] = new
+        return dropped
+
+    def _collect(self, candidates):
+        """Removes the modules in candidates, and the modules only they
+        import, that are no longer imported by anything reachable from
+        self.roots, and returns the number of dependencies removed.
+        Modules that only import each other are found by counting
+        the imports of each from within the modules reachable from
+        candidates, so only those are visited."""
+        reachable = set()
+        stack = list(candidates)
+        while stack:
+            node = stack.pop()
+            if node in reachable or node not in self._imports:
+                continue
+            reachable.add(node)
+            stack.extend(endpt for _, endpt in self._imports[node])
+        internal = dict.fromkeys(reachable, 0)
+        for node in reachable:
+            for _, endpt in self._imports[node]:
+                if endpt in internal:
+                    internal[endpt] += 1
+        #Modules imported from outside reachable, and what they import,
+        #are still imported.
+        stack = [node for node in reachable if node in self.roots or
+                 self._importers.get(node, 0) > internal[node]]
+        live = set(stack)
+        while stack:
+            for _, endpt in self._imports[stack.pop()]:
+                if endpt in reachable and endpt not in live:
+                    live.add(endpt)
+                    stack.append(endpt)
+        changed = 0
+        for node in reachable - live:
+            self._set_imports(node, ())
+            del self._imports[node]
+            self.failed.discard(node)
+            if node in self.node_to_id:
+                changed += self.replace_outgoing(node, [])
+        return changed
+
+    def update_file(self, filename, builder):
+        """Replaces the dependencies of the module at filename with what
+        it imports now, adds the dependencies of any modules it
+        imports that are not in the graph yet, and removes those of
+        modules that are no longer imported,
+        the same as DepBuilder would have found them.
+        Returns the number of dependencies added and removed.
+
+        :param builder: The DepBuilder the graph was built from,
+          whose module finder cache, exclusions, and imports are used.
+        """
+        self._track(builder)
+        changed = 0
+        worklist = [os.path.abspath(filename)]
+        visited = set()
+        dropped = set()
+        while worklist:
+            filename = worklist.pop()
+            startpt = builder._extless(filename)
+            if startpt in visited or builder._is_excluded(startpt):
+                continue
+            visited.add(startpt)
+            if builder.follow is not None and not builder.follow(startpt):
+                imported = []
+            else:
+                imported = builder.imports_of(filename)
+            if imported is None:
+                self.failed.add(startpt)
+                imported = []
+            else:
+                self.failed.discard(startpt)
+            for path, endpt, isdep in imported:
+                if endpt not in self._imports:
+                    worklist.append(path)
+            dropped.update(self._set_imports(startpt, imported))
+            changed += self.replace_outgoing(
+                startpt, [endpt for _, endpt, isdep in imported if isdep])
+        return changed + self._collect(dropped)
+
+    def add_file(self, filename, builder):
+        """Adds the module at filename to the files the graph is built
+        from, and returns `update_file` of it."""
+        self._track(builder)
+        self.roots.add(builder._extless(os.path.abspath(filename)))
+        return self.update_file(filename, builder)
+
+    def remove_file(self, filename, builder):
+        """Removes the module at filename from the files the graph is
+        built from, and removes its dependencies, and those of the modules
+        only it imported.
+        It stays in the graph as long as another module imports it.
+        Returns the number of dependencies removed."""
+        self._track(builder)
+        startpt = builder._extless(os.path.abspath(filename))
+        self.roots.discard(startpt)
+        self.failed.discard(startpt)
+        if startpt not in self._imports:
+            return 0
+        dropped = self._set_imports(startpt, ())
+        changed = self.replace_outgoing(startpt, [])
+        return changed + self._collect(dropped + [startpt])
+
+    def tracked(self, depnode, builder):
+        """Returns True if the imports of depnode are kept track of,
+        which they are for every module reachable from the files
+        the graph is built from."""
+        self._track(builder)
+        return depnode in self._imports
+
+    def iter_edge_ids(self):
+        """Yields a (start id, end id) tuple for each dependency."""
+        for startid, endids in enumerate(self._outgoing):
+            for endid in endids:
+                yield startid, endid
+
+    @property
+    def dependencies(self):
+        """List of Dependency instances for every dependency."""
+        nodes = self.id_to_node
+        return [depbuilder.Dependency(nodes[a], nodes[b])
+                for a, b in self.iter_edge_ids()]
+
+    def to_group(self):
+        """Returns a DependencyGroup of the current dependencies,
+        for reports and rendering."""
+        nodes = self.id_to_node
+        return depbuilder.DependencyGroup(
+            ((nodes[a], nodes[b]) for a, b in self.iter_edge_ids()),
+            sorted(self.failed))
+
+    def page_rank(self, **kwargs):
+        """Ranks every module with a dependency, starting from the ranks
+        of the previous call, and returns self.ranks.
+        Modules that are new since then start with an equal share.
+
+        :param kwargs: Passed to pagerank.page_rank.
+        """
+        numnodes = len(self.id_to_node)
+        counts = (utils.array_to_numpy(self.ca_counts) +
+                  utils.array_to_numpy(self.ce_counts))
+        live = numpy.flatnonzero(counts > 0)
+        #Index of each id in live, for ids that are in it.
+        dense = numpy.zeros(numnodes, numpy.int64)
+        dense[live] = numpy.arange(len(live))
+        numedges = sum(self.ce_counts)
+        sources = numpy.fromiter(
+            (a for a, b in self.iter_edge_ids()), numpy.int64, numedges)
+        targets = numpy.fromiter(
+            (b for a, b in self.iter_edge_ids()), numpy.int64, numedges)
+        matrix = pagerank.CSRLinkMatrix(
+            dense[sources], dense[targets], max(len(live), 1))
+        start = None
+        if self.ranks is not None and len(live):
+            previous = numpy.zeros(numnodes)
+            previous[:len(self.ranks)] = self.ranks
+            start = previous[live]
+            isnew = start == 0
+            start[isnew] = 1.0 / len(live)
+            start /= start.sum()
+        ranks = numpy.zeros(numnodes)
+        if len(live):
+            ranks[live] = pagerank.page_rank(matrix, start=start, **kwargs)
+        self.ranks = ranks
+        return ranks
+
+    def node_to_rank(self):
+        """Returns a dict of {dependency node: rank} for every module with
+        a dependency, as of the last call to `page_rank`."""
+        if self.ranks is None:
+            return {}
+        return dict((self.id_to_node[i], float(self.ranks[i]))
+                    for i in xrange(len(self.ranks))
+                    if self.ca_counts[i] or self.ce_counts[i])
@@ -19,98 +19,119 @@ So:
   ]
 would return page ranks of [ 0.36723503  0.0375      0.33665007  0.25861487]
 See the site linked above for more explanation of the rankings.
+
+Internally, link matrices are converted to a CSRLinkMatrix so that each
+power iteration step is a single sparse matrix-vector product rather than
+a python loop over every page.
 """
 
+import collections
+import itertools
+
 import pynocle.utils as utils
 
-try:
-    import numpy
-except ImportError:
-    numpy = utils.MissingDependencyError(
-        'Could not import numpy, cannot generate page ranking.')
+numpy = utils.LazyModule(
+    'numpy', 'Could not import numpy, cannot generate page ranking.')
 
-def _transposeLinkMatrix(outGoingLinks=None):
-    """
-    Transpose the link matrix. 
-    The link matrix contains the pages each page points to.
-    However, what we want is to know which pages point to a given page. 
-    However, we will still want to know how many links each page contains 
-    (so store that in a separate array),
-    as well as which pages contain no links at all (leaf nodes).
-
-    :param outGoingLinks: outGoingLinks[ii] contains the indices of 
-      pages pointed to by page ii
-    :return: a tuple of (incomingLinks, numOutGoingLinks, leafNodes)
+class CSRLinkMatrix(object):
+    """The transpose of a link matrix in compressed sparse row form,
+    so that row ii holds the indices of the pages linking to page ii.
+    Multiplying it by a vector is a single vectorized operation,
+    no matter how many pages there are.
+
+    :param sources: Array of the page each link goes out from.
+    :param targets: Array of the page each link points to.
+    :param nPages: The number of pages.
+
+    Attrs:
+
+    - indptr: Row ii's links are indices[indptr[ii]:indptr[ii + 1]].
+    - indices: The pages linking to each row, grouped by row.
+    - rows: The row of each item in indices.
+    - numLinks: numLinks[ii] is the number of links going out from ii.
+    - leafNodes: The indices of pages without links.
     """
-    outGoingLinks = outGoingLinks or [[]]
-
-    nPages = len(outGoingLinks)
-    # incomingLinks[ii] will contain the indices jj of 
-    # the pages linking to page ii
-    incomingLinks = [[] for ii in range(nPages)]
-    # the number of links in each page
-    numLinks = numpy.zeros(nPages, numpy.int32)
-    # the indices of the leaf nodes
-    leafNodes = []
-
-    for ii in range(nPages):
-        if not len(outGoingLinks[ii]):
-            leafNodes.append(ii)
-        else:
-            numLinks[ii] = len(outGoingLinks[ii])
-            # transpose the link matrix
-            for jj in outGoingLinks[ii]:
-                incomingLinks[jj].append(ii)
-
-    incomingLinks = [numpy.array(ii) for ii in incomingLinks]
-    numLinks = numpy.array(numLinks)
-    leafNodes = numpy.array(leafNodes)
-
-    return incomingLinks, numLinks, leafNodes
+    def __init__(self, sources, targets, nPages):
+        sources = numpy.asarray(sources, numpy.int64)
+        targets = numpy.asarray(targets, numpy.int64)
+        # A stable sort keeps the incoming links of each page in the
+        # order of the link matrix.
+        order = numpy.argsort(targets, kind='mergesort')
+        self.nPages = nPages
+        self.indices = sources[order]
+        self.rows = targets[order]
+        self.indptr = numpy.zeros(nPages + 1, numpy.int64)
+        numpy.cumsum(numpy.bincount(targets, minlength=nPages),
+                     out=self.indptr[1:])
+        self.numLinks = numpy.bincount(sources, minlength=nPages)
+        self.leafNodes = numpy.flatnonzero(self.numLinks == 0)
+
+    def __len__(self):
+        return self.nPages
+
+    @classmethod
+    def fromLinkMatrix(cls, outGoingLinks):
+        """Creates a CSRLinkMatrix from a link matrix,
+        where outGoingLinks[ii] contains the indices of
+        pages pointed to by page ii."""
+        nPages = len(outGoingLinks)
+        lengths = numpy.fromiter(
+            (len(row) for row in outGoingLinks), numpy.int64, nPages)
+        sources = numpy.repeat(numpy.arange(nPages), lengths)
+        targets = numpy.fromiter(
+            itertools.chain.from_iterable(outGoingLinks),
+            numpy.int64, int(lengths.sum()))
+        return cls(sources, targets, nPages)
+
+    def dot(self, vector):
+        """Returns the product of this matrix and vector."""
+        return numpy.bincount(
+            self.rows, vector.take(self.indices), minlength=self.nPages)
+
 
 def _pageRankGenerator(
         At=None,
-        numLinks=None,
-        ln=None,
         alpha=0.85,
         convergence=0.01,
-        checkSteps=10):
+        checkSteps=10,
+        start=None):
     """
     Compute an approximate page rank vector of N pages to 
     within some convergence factor.
     
-    :param At: a sparse square matrix with N rows.
-      At[ii] contains the indices of pages jj linking to ii.
-    :param numLinks: iNumLinks[ii] is the number of links going out from ii.
-    :param ln: contains the indices of pages without links
+    :param At: A CSRLinkMatrix (the transposed link matrix) with N rows.
     :param alpha: a value between 0 and 1.
       Determines the relative importance of "stochastic" links.
     :param convergence: a relative convergence criterion.
       Smaller means better, but more expensive.
     :param checkSteps: check for convergence after so many steps
+    :param start: Initial page rank vector.  If None, start from uniform.
     """
     if At is None:
-        At = [numpy.array((), numpy.int32)]
-    if numLinks is None:
-        numLinks = numpy.array((), numpy.int32)
-    if ln is None:
-        ln = numpy.array((), numpy.int32)
+        At = CSRLinkMatrix((), (), 1)
 
     # the number of "pages"
     N = len(At)
 
     # the number of "pages without links"
-    M = ln.shape[0]
+    M = At.leafNodes.shape[0]
+
+    # 1 / the number of links of each page; 0 for pages without links
+    # (they are never multiplied since they link to nothing).
+    invLinks = 1. / numpy.maximum(At.numLinks, 1)
 
     # initialize: single-precision should be good enough
-    iNew = numpy.ones((N,), numpy.float32) / N
-    iOld = numpy.ones((N,), numpy.float32) / N
+    if start is None:
+        iNew = numpy.ones((N,), numpy.float32) / N
+    else:
+        iNew = numpy.array(start, numpy.float32)
+    iOld = numpy.empty((N,), numpy.float32)
 
     done = False
     while not done:
 
         # normalize every now and then for numerical stability
-        iNew /= sum(iNew)
+        iNew /= iNew.sum(dtype=numpy.float64)
 
         for step in range(checkSteps):
 
@@ -119,26 +140,18 @@ def _pageRankGenerator(
 
             # an element in the 1 x I vector.
             # all elements are identical.
-            oneIv = (1 - alpha) * sum(iOld) / N
+            oneIv = (1 - alpha) * iOld.sum(dtype=numpy.float64) / N
 
             # an element of the A x I vector.
             # all elements are identical.
             oneAv = 0.0
             if M > 0:
-                oneAv = alpha * sum(iOld.take(ln, axis = 0)) / N
+                oneAv = alpha * iOld.take(At.leafNodes).sum(
+                    dtype=numpy.float64) / N
 
             # the elements of the H x I multiplication
-            ii = 0
-            while ii < N:
-                page = At[ii]
-                h = 0
-                if page.shape[0]:
-                    h = alpha * numpy.dot(
-                        iOld.take(page, axis = 0),
-                        1. / numLinks.take(page, axis = 0)
-                    )
-                iNew[ii] = h + oneAv + oneIv
-                ii += 1
+            h = alpha * At.dot(iOld * invLinks)
+            iNew[:] = h + oneAv + oneIv
 
         diff = iNew - iOld
         done = (numpy.sqrt(numpy.dot(diff, diff)) / N < convergence)
@@ -150,40 +163,27 @@ def page_rank(
         linkMatrix=None,
         alpha=0.85,
         convergence=0.01,
-        checkSteps=10):
-    """Convenience wrap for the link matrix transpose and the generator."""
-    if type(numpy) == utils.MissingDependencyError:
-        raise numpy
-    linkMatrix = linkMatrix or [[]]
-    incomingLinks, numLinks, leafNodes = _transposeLinkMatrix(linkMatrix)
+        checkSteps=10,
+        start=None):
+    """Convenience wrap for the link matrix transpose and the generator.
+
+    :param linkMatrix: A link matrix (see module docs) or a CSRLinkMatrix.
+    :param start: Initial page rank vector, such as the result of a previous
+      ranking of the same pages.  If None, start from uniform.
+    """
+    if not isinstance(linkMatrix, CSRLinkMatrix):
+        linkMatrix = CSRLinkMatrix.fromLinkMatrix(linkMatrix or [[]])
 
     final = 0
-    for gr in _pageRankGenerator(incomingLinks, numLinks, leafNodes,
+    for gr in _pageRankGenerator(linkMatrix,
         alpha = alpha,
         convergence = convergence,
-        checkSteps = checkSteps):
+        checkSteps = checkSteps,
+        start = start):
         final = gr
 
     return final
 
-class _SortedDict(object):
-    """Simple functionality for treating two parallel lists as a dictionary."""
-    def __init__(self):
-        self._keys = []
-        self._values = []
-    def items(self):
-        return zip(self._keys, self._values)
-    def keys(self):
-        return self._keys
-    def setdefault(self, key, default):
-        try:
-            idx = self._keys.index(key)
-            return self._values[idx]
-        except ValueError:
-            self._keys.append(key)
-            self._values.append(default)
-            return default
-
 
 class DependenciesToLinkMatrix(object):
     """Converts a collection of Dependency objects to a link matrix
@@ -195,8 +195,9 @@ class DependenciesToLinkMatrix(object):
 
     Attrs:
 
-    - node_to_outgoing_map: Sorted mapping of
-        {dependencynode: set(dependencynodes)}.
+    - node_to_outgoing_map: Mapping of
+        {dependencynode: set(dependencynodes)},
+        ordered by when each node was first seen.
     - node_to_id_map: Mapping of dependencynode to an ID
         (their row index in the result matrix).
     - id_to_node_map: node_to_id_map with keys as values and values as keys.
@@ -207,7 +208,7 @@ class DependenciesToLinkMatrix(object):
         self.id_to_node_map = utils.swap_keys_and_values(self.node_to_id_map)
 
     def _create_node_to_outgoing(self, dependencies):
-        nodemap = _SortedDict()
+        nodemap = collections.OrderedDict()
         for start, end in dependencies:
             outgoing = nodemap.setdefault(start, set())
             nodemap.setdefault(end, set())
@@ -222,6 +223,17 @@ class DependenciesToLinkMatrix(object):
             lastid += 1
         return str_to_id
 
+    def create_csr_matrix(self):
+        """Convert the dependencies into a CSRLinkMatrix that can
+        be used in pageRank, without building a link matrix."""
+        sources, targets = [], []
+        for k, v in self.node_to_outgoing_map.items():
+            rowid = self.node_to_id_map[k]
+            outrowids = sorted(self.node_to_id_map[outlnk] for outlnk in v)
+            sources.extend([rowid] * len(outrowids))
+            targets.extend(outrowids)
+        return CSRLinkMatrix(sources, targets, len(self.node_to_id_map))
+
     def create_matrix(self):
         """Convert the dependencies into a link matrix that can
         be used in pageRank."""
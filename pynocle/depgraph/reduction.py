@@ -0,0 +1,229 @@
+#!/usr/bin/env python
+"""
+Reductions of a DependencyGroup that run before it is rendered,
+so that dot can lay out the graphs of very large codebases in a bounded
+time, and the image stays readable.
+
+Each reduction returns a new DependencyGroup (or the same one, if there
+was nothing to reduce), with Ca and Ce counted for the reduced graph,
+so it can be rendered and styled like any other.
+`GraphReduction` applies several of them in order.
+"""
+
+import os
+import sys
+
+import cycles
+import depbuilder
+import pagerank
+import pynocle.tracing as tracing
+import pynocle.utils as utils
+
+#Graphs with more nodes than this are pruned to this many nodes
+#when no GraphReduction is given, see GraphReduction.default.
+MAX_RENDER_NODES = 1500
+
+
+def _rebuild(depgroup, edges, failed=None):
+    """Returns a DependencyGroup of edges (start, end node tuples),
+    without self-dependencies or duplicates, in the order of edges."""
+    seen = set()
+    unique = []
+    for edge in edges:
+        if edge[0] != edge[1] and edge not in seen:
+            seen.add(edge)
+            unique.append(edge)
+    if failed is None:
+        failed = depgroup.failed
+    return depbuilder.DependencyGroup(unique, failed)
+
+
+def _edges(depgroup):
+    """Yields (start node, end node) tuples for each edge in depgroup."""
+    nodes = depgroup.id_to_node
+    for startid, endid in depgroup.iter_edge_ids():
+        yield nodes[startid], nodes[endid]
+
+
+def collapse_packages(depgroup, depth, leading_path=None):
+    """Returns a DependencyGroup where every module is replaced by its
+    package `depth` levels below leading_path (or below the sys.path entry
+    it was found in, for modules outside leading_path).
+    Modules and packages at depth or less are kept as they are.
+    Dependencies between modules in the same package are dropped.
+
+    :param depth: Number of package levels to keep, at least 1.
+    :param leading_path: If None, the cwd.
+    """
+    if depth < 1:
+        raise ValueError('depth must be at least 1, got %s' % depth)
+    bases = set(utils.normsep(os.path.abspath(p))
+                for p in [leading_path or os.getcwd()] + sys.path if p)
+    #Longest first, so modules collapse under the closest base.
+    bases = sorted(bases, key=len, reverse=True)
+    collapsed = {}
+    def collapse(node):
+        result = collapsed.get(node)
+        if result is not None:
+            return result
+        result = node
+        normed = utils.normsep(node)
+        for base in bases:
+            if normed.startswith(base + os.sep):
+                parts = normed[len(base) + 1:].split(os.sep)
+                ispackage = parts[-1] == '__init__'
+                if ispackage:
+                    parts.pop()
+                #Packages are always their directory, so a collapsed
+                #package is the same node as the package itself.
+                if len(parts) > depth or (ispackage and parts):
+                    result = os.path.join(base, *parts[:depth])
+                break
+        collapsed[node] = result
+        return result
+    edges = [(collapse(a), collapse(b)) for a, b in _edges(depgroup)]
+    failed = []
+    for f in depgroup.failed:
+        package = collapse(f)
+        if package not in failed:
+            failed.append(package)
+    return _rebuild(depgroup, edges, failed)
+
+
+def node_ranks(depgroup):
+    """Returns a numpy array of the PageRank of each node id
+    in depgroup."""
+    matrix = pagerank.CSRLinkMatrix(
+        depgroup.startids, depgroup.endids, len(depgroup.id_to_node))
+    return pagerank.page_rank(matrix)
+
+
+def prune(depgroup, max_nodes=None, min_rank=None, min_coupling=None):
+    """Returns a DependencyGroup without the nodes that are least
+    important, and the dependencies to and from them.
+
+    :param max_nodes: If provided, keep only this many nodes,
+      the ones with the highest PageRank.
+    :param min_rank: If provided, drop nodes with a lower PageRank
+      (which is between 0 and 1, and sums to 1 over all nodes).
+    :param min_coupling: If provided, drop nodes with a lower Ca + Ce.
+    """
+    numnodes = len(depgroup.id_to_node)
+    keep = range(numnodes)
+    if min_coupling is not None:
+        keep = [i for i in keep
+                if depgroup.ca_counts[i] + depgroup.ce_counts[i]
+                >= min_coupling]
+    needranks = (min_rank is not None or
+                 (max_nodes is not None and len(keep) > max_nodes))
+    if needranks:
+        ranks = node_ranks(depgroup)
+        if min_rank is not None:
+            keep = [i for i in keep if ranks[i] >= min_rank]
+        if max_nodes is not None and len(keep) > max_nodes:
+            #Stable, so ties keep the nodes seen first.
+            keep = sorted(keep, key=lambda i: -ranks[i])[:max_nodes]
+    if len(keep) == numnodes:
+        return depgroup
+    keep = set(keep)
+    edges = [(depgroup.id_to_node[a], depgroup.id_to_node[b])
+             for a, b in depgroup.iter_edge_ids() if a in keep and b in keep]
+    return _rebuild(depgroup, edges)
+
+
+def transitive_reduction(depgroup):
+    """Returns a DependencyGroup without the dependencies that are implied
+    by others: a dependency from a to c is dropped if a also depends on
+    something that depends on c, directly or not.
+    Dependencies between modules in the same import cycle are all kept,
+    since none of them is implied by the rest in a way that reads well.
+    """
+    numnodes = len(depgroup.id_to_node)
+    component, numcomponents = cycles.component_ids(
+        numnodes, cycles.successor_lists(depgroup))
+    compsuccessors = [set() for _ in xrange(numcomponents)]
+    for a, b in depgroup.iter_edge_ids():
+        if component[a] != component[b]:
+            compsuccessors[component[a]].add(component[b])
+    #Bitsets of the components each component reaches, and those reached
+    #through its successors (indirectly).  Components depend only on ones
+    #with lower numbers, so those are always done first.
+    reaches = [0] * numcomponents
+    indirect = [0] * numcomponents
+    for c in xrange(numcomponents):
+        through = 0
+        for s in compsuccessors[c]:
+            through |= reaches[s]
+        indirect[c] = through
+        direct = 0
+        for s in compsuccessors[c]:
+            direct |= 1 << s
+        reaches[c] = through | direct
+    edges = []
+    removed = 0
+    for a, b in depgroup.iter_edge_ids():
+        ca, cb = component[a], component[b]
+        if ca != cb and indirect[ca] >> cb & 1:
+            removed += 1
+            continue
+        edges.append((depgroup.id_to_node[a], depgroup.id_to_node[b]))
+    if not removed:
+        return depgroup
+    return _rebuild(depgroup, edges)
+
+
+class GraphReduction(object):
+    """Reductions to apply to a DependencyGroup before rendering it.
+    They are applied in the order of the parameters:
+    packages are collapsed, then nodes are pruned,
+    then the transitive reduction is taken.
+
+    :param package_depth: If provided, see `collapse_packages`.
+    :param leading_path: Passed to `collapse_packages`.
+    :param max_nodes: See `prune`.
+    :param min_rank: See `prune`.
+    :param min_coupling: See `prune`.
+    :param transitive: If True, see `transitive_reduction`.
+    """
+    def __init__(self, package_depth=None, leading_path=None, max_nodes=None,
+                 min_rank=None, min_coupling=None, transitive=False):
+        self.package_depth = package_depth
+        self.leading_path = leading_path
+        self.max_nodes = max_nodes
+        self.min_rank = min_rank
+        self.min_coupling = min_coupling
+        self.transitive = transitive
+
+    def __repr__(self):
+        return 'GraphReduction(%s)' % ', '.join(
+            '%s=%r' % kvp for kvp in sorted(self.__dict__.items()))
+
+    __str__ = __repr__
+
+    @classmethod
+    def default(cls):
+        """Returns a GraphReduction that leaves graphs of up to
+        MAX_RENDER_NODES nodes alone, and prunes larger ones to that many,
+        so dot finishes in a bounded time."""
+        return cls(max_nodes=MAX_RENDER_NODES)
+
+    def apply(self, depgroup, tracer=tracing.NULL_TRACER, leading_path=None):
+        """Returns depgroup reduced, or depgroup itself if no reduction
+        changed it.
+
+        :param leading_path: Used if self.leading_path is None.
+        """
+        if self.package_depth is not None:
+            with tracer.span('collapse_packages'):
+                depgroup = collapse_packages(
+                    depgroup, self.package_depth,
+                    self.leading_path or leading_path)
+        if (self.max_nodes is not None or self.min_rank is not None or
+                self.min_coupling is not None):
+            with tracer.span('prune'):
+                depgroup = prune(depgroup, self.max_nodes, self.min_rank,
+                                 self.min_coupling)
+        if self.transitive:
+            with tracer.span('transitive_reduction'):
+                depgroup = transitive_reduction(depgroup)
+        return depgroup
@@ -2,13 +2,17 @@
 
 import abc
 import colorsys
+import errno
 import hashlib
 import os
-import subprocess
+import shutil
 import tempfile
 
+import pynocle.tracing as tracing
 import pynocle.utils as utils
 
+subprocess = utils.LazyModule('subprocess')
+
 
 def lerp(minval, maxval, term):
     return (maxval - minval) * term + minval
@@ -38,17 +42,39 @@ def nth_percentile(values, n=0.95):
 class IRenderer(object):
     __metaclass__ = abc.ABCMeta
 
+    #tracing.Tracer that render records spans in.
+    tracer = tracing.NULL_TRACER
+
     def dotexe(self):
         """Returns the path to the dot (or other graphviz) exe to invoke."""
         return 'dot'
 
-    @abc.abstractmethod
+    def writedot(self, out):
+        """Writes the dot text of the graph to the file-like object out.
+        Subclasses should override this to write the text as it is
+        generated.  By default, the text is saved with savedot to a temp
+        file and copied to out, for subclasses that only override savedot.
+        """
+        if type(self).savedot.im_func is IRenderer.savedot.im_func:
+            raise NotImplementedError(
+                '%s must override writedot or savedot.' % type(self).__name__)
+        dotpath = self.savetempdot()
+        try:
+            with open(dotpath) as f:
+                shutil.copyfileobj(f, out)
+        finally:
+            os.remove(dotpath)
+
     def savedot(self, filename):
         """Saves a dot file to filename."""
+        with open(filename, 'w') as f:
+            self.writedot(f)
 
     def savetempdot(self):
-        """Saves a dot file to a temp file and returns the filename."""
+        """Saves a dot file to a temp file and returns the filename.
+        The caller is responsible for deleting it."""
         fd, dotpath = tempfile.mkstemp('.dot')
+        os.close(fd)
         self.savedot(dotpath)
         return dotpath
 
@@ -70,44 +96,80 @@ class IRenderer(object):
         return result
     
     def render(self, outputfilename,
-               dotpath=None, overrideformat=None, wait=True, moreargs=()):
-        """Renders the dot file at dotpath to outputfilename.
+               dotpath=None, overrideformat=None, wait=True, moreargs=(),
+               dotfilename=None):
+        """Renders the graph to outputfilename.
+        Unless dotpath or dotfilename is provided, the dot text is
+        written straight into the exe's stdin as it is generated,
+        without going through a file.
 
         outputfilename: The name of the image file to be written.
         The format will be inferred by the extension.
 
-        :param dotpath: The path of the dotfile to use.
-          If not provided, call self.savedot with a temporary path.
+        :param dotpath: The path of an existing dotfile to render
+          instead of the graph.
         :param overrideformat: If provided, use this instead of inferring
           the format from outputfilename.
+        :param wait: If True, wait for the exe to finish rendering.
         :param moreargs: Additional args to invoke the exe with.
+        :param dotfilename: If provided, call self.savedot with this path
+          and render from it, so the dot file is kept.
         """
-        if not dotpath:
-            dotpath = self.savetempdot()
+        if dotfilename:
+            with self.tracer.span('savedot'):
+                self.savedot(dotfilename)
+            dotpath = dotfilename
         format = self.get_output_format(outputfilename, overrideformat)
-        clargs = [self.dotexe(), '-T' + format, dotpath, '-o', outputfilename]
+        clargs = [self.dotexe(), '-T' + format]
+        if dotpath:
+            clargs.append(dotpath)
+        clargs.extend(['-o', outputfilename])
         clargs.extend(moreargs)
+        with self.tracer.span('dot', args=' '.join(clargs), wait=wait,
+                              streamed=not dotpath):
+            p = self._start(clargs, stdin=None if dotpath else subprocess.PIPE)
+            if not dotpath:
+                self._stream(p.stdin)
+            if wait:
+                p.wait()
+
+    def _start(self, clargs, stdin):
+        """Starts the exe with clargs, with its output discarded."""
+        with open(os.devnull, 'w') as devnull:
+            try:
+                return subprocess.Popen(
+                    clargs, stdin=stdin, stdout=devnull, stderr=devnull)
+            except OSError as exc:
+                if exc.errno == errno.ENOENT:
+                    raise utils.MissingDependencyError(
+                        'Could not start %s: %s' % (self.dotexe(), repr(exc)))
+                raise
+
+    def _stream(self, stdin):
+        """Writes the dot text into stdin and closes it.
+        If the exe exits early (such as on a syntax error),
+        the rest of the text is dropped, the same as its errors."""
         try:
-            p = subprocess.Popen(
-                clargs, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-        except WindowsError as exc:
-            if exc.errno == 2:
-                raise utils.MissingDependencyError('Could not start %s: %s' % (
-                    self.dotexe(), repr(exc)))
-            raise
-        if wait:
-            p.communicate()
+            self.writedot(stdin)
+            stdin.close()
+        except IOError as exc:
+            if exc.errno not in (errno.EPIPE, errno.EINVAL):
+                raise
 
 
 class DefaultRenderer(IRenderer):
     def __init__(self, dependencygroup,
-                 exe='dot', leading_path=None, styler=None):
+                 exe='dot', leading_path=None, styler=None,
+                 tracer=tracing.NULL_TRACER):
+        self.tracer = tracer
         self.depgroup = dependencygroup
         self.deps = dependencygroup.dependencies
         self.failedfiles = dependencygroup.failed
         self.exe = exe
         #Make a copy of our defaults and change any overridden ones.
         self.styler = styler or DefaultStyler(leading_path=leading_path)
+        #StyleContext of the current render, set by writedot.
+        self.context = None
 
     def dotexe(self):
         return self.exe
@@ -124,9 +186,10 @@ class DefaultRenderer(IRenderer):
         """
         pkgs = {}
         modules = {}
+        nodetext = self.context.nodetext
         for startpath, endpath in self.deps:
-            startname = self.styler.nodetext(startpath)
-            endname = self.styler.nodetext(endpath)
+            startname = nodetext(startpath)
+            endname = nodetext(endpath)
             if self.styler.exclude(startpath) or self.styler.exclude(endpath):
                 continue
             edgeattrs = self.get_attr_str(
@@ -155,31 +218,37 @@ class DefaultRenderer(IRenderer):
                 out.write('        "%s";\n' % node)
             out.write('    }\n')
 
-    def savedot(self, filename):
-        with open(filename, 'w') as f:
-            f.write('digraph G {\n')
-            for kvp in self.styler.graphsettings().items():
-                f.write('    %s=%s;\n' % kvp)
-            
-            pkgs, modules = self._write_edges(f)
-            failed = dict((self.styler.nodetext(fname), fname)
-                          for fname in self.failedfiles)
-
-            for dictitems, style_func in (
-                (failed.items(), self.styler.failedstyle),
-                (pkgs.items(), self.styler.packagestyle),
-                (modules.items(), self.styler.modulestyle)
-                ):
-                for purename, fullname in dictitems:
-                    style = style_func(self.depgroup, fullname)
-                    stylestr = self.get_attr_str(**style)
-                    f.write('    "%s" %s\n' % (purename, stylestr))
-
-            allkeys = failed.keys() + pkgs.keys() + modules.keys()
-            clusters = self.styler.create_clusters(allkeys)
-            if clusters:
-                self._write_clusters(clusters, f)
-            f.write('}')
+    def writedot(self, out):
+        prepare = getattr(self.styler, 'prepare', None)
+        if prepare is not None:
+            self.context = prepare(self.depgroup)
+        else:
+            #Stylers that are not DefaultStylers only need to provide
+            #the styles; node text is still calculated once per path.
+            self.context = StyleContext(self.styler, self.depgroup)
+        out.write('digraph G {\n')
+        for kvp in self.styler.graphsettings().items():
+            out.write('    %s=%s;\n' % kvp)
+
+        pkgs, modules = self._write_edges(out)
+        failed = dict((self.context.nodetext(fname), fname)
+                      for fname in self.failedfiles)
+
+        for dictitems, style_func in (
+            (failed.items(), self.styler.failedstyle),
+            (pkgs.items(), self.styler.packagestyle),
+            (modules.items(), self.styler.modulestyle)
+            ):
+            for purename, fullname in dictitems:
+                style = style_func(self.depgroup, fullname)
+                stylestr = self.get_attr_str(**style)
+                out.write('    "%s" %s\n' % (purename, stylestr))
+
+        allkeys = failed.keys() + pkgs.keys() + modules.keys()
+        clusters = self.styler.create_clusters(allkeys)
+        if clusters:
+            self._write_clusters(clusters, out)
+        out.write('}')
 
 
 def name_to_color(name):
@@ -195,6 +264,52 @@ def name_to_color(name):
     return '#%02x%02x%02x' % (r*256,g*256,b*256)
 
 
+class StyleContext(object):
+    """Everything a styler needs that depends on the whole graph,
+    calculated once per render rather than once per node or edge:
+    the Ca and Ce percentiles that colors are scaled to,
+    the colors for each Ca and Ce, and the node text of each path.
+
+    :param styler: DefaultStyler to calculate colors and node text with.
+      Any other styler can be used for node text only.
+    :param depgroup: DependencyGroup being rendered.
+    """
+    def __init__(self, styler, depgroup):
+        self.styler = styler
+        self.depgroup = depgroup
+        self.maxca = self.maxce = 0
+        if depgroup.depnode_to_ca:
+            self.maxca = nth_percentile(depgroup.depnode_to_ca.values())
+            self.maxce = nth_percentile(depgroup.depnode_to_ce.values())
+        #Lookup tables of Ca to outline color and Ce to fill color.
+        #Filled on use, since there are few distinct values.
+        self._outline_cols = {}
+        self._fill_cols = {}
+        self._nodetexts = {}
+
+    def outline_col(self, ca):
+        result = self._outline_cols.get(ca)
+        if result is None:
+            result = self.styler._calc_outline_col(ca, self.maxca)
+            self._outline_cols[ca] = result
+        return result
+
+    def fill_col(self, ce):
+        result = self._fill_cols.get(ce)
+        if result is None:
+            result = self.styler._calc_fill_col(ce, self.maxce)
+            self._fill_cols[ce] = result
+        return result
+
+    def nodetext(self, path):
+        """Returns styler.nodetext(path), calculated once per path."""
+        result = self._nodetexts.get(path)
+        if result is None:
+            result = self.styler.nodetext(path)
+            self._nodetexts[path] = result
+        return result
+
+
 class DefaultStyler(object):
     """Graph styling for dot rendering.
 
@@ -206,6 +321,21 @@ class DefaultStyler(object):
         self.weight_normal = kwargs.get('weight_normal', 1)
         self.weight_heaviest = kwargs.get('weight_heaviest', 4)
         self.leading_path = kwargs.get('leading_path') or os.getcwd()
+        self.context = None
+
+    def prepare(self, depgroup):
+        """Creates the StyleContext for depgroup, which the styles use
+        until prepare is called again, and returns it.
+        Renderers call this once at the start of each render.
+        If it is not called, it is called the first time a style
+        is asked for with a different depgroup."""
+        self.context = StyleContext(self, depgroup)
+        return self.context
+
+    def _get_context(self, depgroup):
+        if self.context is None or self.context.depgroup is not depgroup:
+            self.prepare(depgroup)
+        return self.context
 
     def create_clusters(self, nodenames):
         """Return a dictionary of {package name, (modules)),
@@ -259,11 +389,8 @@ class DefaultStyler(object):
             ce = depgroup.depnode_to_ce[depnode]
         except KeyError:
             return None
-        outlcol = self._calc_outline_col(
-            ca, nth_percentile(depgroup.depnode_to_ca.values()))
-        fillcol = self._calc_fill_col(
-            ce, nth_percentile(depgroup.depnode_to_ce.values()))
-        return '"%s"' % outlcol, '"%s"' % fillcol
+        context = self._get_context(depgroup)
+        return '"%s"' % context.outline_col(ca), '"%s"' % context.fill_col(ce)
 
     def nodetext(self, s):
         """Prettifies s for rendering on the node.
@@ -279,10 +406,10 @@ class DefaultStyler(object):
         if not s2:
             # We've removed the whole path,
             # grab the last dir from the leadingpath that removed it
-            s2 = self.leading_path.replace(os.altsep, os.sep).split(os.sep)[-1]
+            s2 = utils.normsep(self.leading_path).split(os.sep)[-1]
         else:
             s2 = os.path.splitdrive(s2)[1]
-            s2 = s2.replace(os.sep, '.').replace(os.altsep, '.')
+            s2 = utils.normsep(s2).replace(os.sep, '.')
         return s2.strip('.')
 
     def weight(self, a, b):
@@ -0,0 +1,70 @@
+#!/usr/bin/env python
+
+import unittest
+
+import pynocle.depgraph.cycles as cycles
+import pynocle.depgraph.depbuilder as depbuilder
+
+
+def _is_acyclic(numnodes, edges):
+    successors = [[] for _ in range(numnodes)]
+    for a, b in edges:
+        successors[a].append(b)
+    numcomponents = cycles.component_ids(numnodes, successors)[1]
+    return numcomponents == numnodes and all(a != b for a, b in edges)
+
+
+class TestComponentIds(unittest.TestCase):
+    def testReverseTopologicalOrder(self):
+        """Test that components are numbered after the ones they
+        depend on."""
+        successors = [[1], [2], [1, 3], []]
+        component, numcomponents = cycles.component_ids(4, successors)
+        self.assertEqual(numcomponents, 3)
+        self.assertEqual(component[1], component[2])
+        self.assertTrue(component[0] > component[1] > component[3])
+
+    def testDeepChain(self):
+        """Test that a cycle longer than the recursion limit is found."""
+        n = 5000
+        successors = [[i + 1] for i in range(n - 1)] + [[0]]
+        self.assertEqual(cycles.component_ids(n, successors)[1], 1)
+
+
+class TestBreakingEdges(unittest.TestCase):
+    def assertMinimal(self, numnodes, edges):
+        breaking = cycles.breaking_edges(numnodes, edges)
+        rest = [e for e in edges if e not in breaking]
+        self.assertTrue(_is_acyclic(numnodes, rest))
+        for e in breaking:
+            self.assertFalse(_is_acyclic(numnodes, rest + [e]))
+        return breaking
+
+    def testTwoCycles(self):
+        edges = [(0, 1), (1, 0), (1, 2), (2, 3), (3, 1)]
+        self.assertEqual(len(self.assertMinimal(4, edges)), 2)
+
+    def testComplete(self):
+        edges = [(a, b) for a in range(6) for b in range(6) if a != b]
+        self.assertEqual(len(self.assertMinimal(6, edges)), 15)
+
+    def testSelfImport(self):
+        self.assertEqual(self.assertMinimal(1, [(0, 0)]), [(0, 0)])
+
+
+class TestFindCycles(unittest.TestCase):
+    def testFindCycles(self):
+        group = depbuilder.DependencyGroup([
+            ('a', 'b'), ('b', 'a'), ('b', 'c'), ('c', 'd'), ('d', 'e'),
+            ('e', 'f'), ('f', 'd'), ('x', 'a')])
+        found = cycles.find_cycles(group)
+        self.assertEqual([sorted(c.members) for c in found],
+                         [['d', 'e', 'f'], ['a', 'b']])
+        self.assertEqual(sorted(found[1].dependencies),
+                         [('a', 'b'), ('b', 'a')])
+        self.assertEqual(len(found[0].breaking), 1)
+        self.assertEqual(len(found[1].breaking), 1)
+
+    def testNoCycles(self):
+        group = depbuilder.DependencyGroup([('a', 'b'), ('b', 'c')])
+        self.assertEqual(cycles.find_cycles(group), [])
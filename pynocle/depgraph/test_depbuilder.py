@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+
+import os
+import pickle
+import sys
+import unittest
+
+import pynocle._testutils as testutils
+import pynocle.depgraph.depbuilder as depbuilder
+
+
+class TestDependencyGroup(unittest.TestCase):
+    def setUp(self):
+        self.deps = [
+            depbuilder.Dependency('foo', 'bar'),
+            depbuilder.Dependency('bar', 'foo'),
+            depbuilder.Dependency('foo', 'eggs'),
+            depbuilder.Dependency('spam', 'eggs'),
+            depbuilder.Dependency('foo', 'bacon')
+        ]
+        self.group = depbuilder.DependencyGroup(self.deps)
+
+    def testCoupling(self):
+        """Test that Ca and Ce are counted for every node,
+        including the first edge."""
+        self.assertEqual(dict(self.group.depnode_to_ca),
+                         {'foo': 1, 'bar': 1, 'eggs': 2, 'spam': 0, 'bacon': 1})
+        self.assertEqual(dict(self.group.depnode_to_ce),
+                         {'foo': 3, 'bar': 1, 'eggs': 0, 'spam': 1, 'bacon': 0})
+
+    def testIdsInFirstSeenOrder(self):
+        """Test that nodes are interned in the order they are first seen."""
+        self.assertEqual(self.group.id_to_node,
+                         ['foo', 'bar', 'eggs', 'spam', 'bacon'])
+        self.assertEqual(list(self.group.startids), [0, 1, 0, 3, 0])
+        self.assertEqual(list(self.group.endids), [1, 0, 2, 2, 4])
+
+    def testDependenciesView(self):
+        """Test that the dependencies view returns the original edges."""
+        self.assertEqual(list(self.group.dependencies), self.deps)
+        self.assertEqual(self.group.dependencies[-1], self.deps[-1])
+        self.assertEqual(len(self.group.dependencies), 5)
+
+    def testMerge(self):
+        """Test that the dependencies of a module in more than one group
+        are only counted once."""
+        other = depbuilder.DependencyGroup(
+            [('bar', 'foo'), ('ham', 'bar')], ['ham'])
+        merged = depbuilder.DependencyGroup.merge([self.group, other])
+        self.assertEqual(len(merged.dependencies), 6)
+        self.assertEqual(merged.depnode_to_ca['foo'], 1)
+        self.assertEqual(merged.depnode_to_ca['bar'], 2)
+        self.assertEqual(merged.failed, ['ham'])
+
+    def testPickle(self):
+        """Test that a pickled group has the same nodes and coupling."""
+        group = pickle.loads(pickle.dumps(self.group, 2))
+        self.assertEqual(group.id_to_node, self.group.id_to_node)
+        self.assertEqual(dict(group.depnode_to_ce),
+                         dict(self.group.depnode_to_ce))
+        self.assertEqual(list(group.dependencies), self.deps)
+
+    def testEmpty(self):
+        """Test that a group can be created with no dependencies."""
+        group = depbuilder.DependencyGroup([])
+        self.assertEqual(len(group.depnode_to_ca), 0)
+        self.assertEqual(group.allstartpts, ())
+
+
+class TestDepBuilder(testutils.TempModulesTestCase):
+    def testDeepImportChain(self):
+        """Test that an import chain deeper than the recursion limit
+        is followed to the end."""
+        depth = sys.getrecursionlimit() + 100
+        for i in range(depth):
+            self.writeModule('_chain%s' % i, 'import _chain%s\n' % (i + 1))
+        self.writeModule('_chain%s' % depth, '')
+        first = os.path.join(self.tempdir, '_chain0.py')
+        depb = depbuilder.DepBuilder([first])
+        self.assertEqual(len(depb.dependencies), depth)
+        self.assertEqual(depb.dependencies[-1].endpt,
+                         os.path.join(self.tempdir, '_chain%s' % depth))
+
+    def testDepthFirstOrder(self):
+        """Test that dependencies are in the order modules are imported,
+        following each import before the next."""
+        a = self.writeModule('_dfa', 'import _dfb\nimport _dfc\n')
+        self.writeModule('_dfb', 'import _dfc\n')
+        self.writeModule('_dfc', 'import _dfbad\n')
+        self.writeModule('_dfbad', 'def (\n')
+        depb = depbuilder.DepBuilder([a])
+        join = lambda name: os.path.join(self.tempdir, name)
+        self.assertEqual(depb.dependencies, [
+            depbuilder.Dependency(join('_dfa'), join('_dfb')),
+            depbuilder.Dependency(join('_dfb'), join('_dfc')),
+            depbuilder.Dependency(join('_dfc'), join('_dfbad')),
+            depbuilder.Dependency(join('_dfa'), join('_dfc'))])
+        self.assertEqual(depb.failed, [join('_dfbad')])
@@ -0,0 +1,95 @@
+#!/usr/bin/env python
+
+import os
+import unittest
+
+import pynocle._testutils as testutils
+import pynocle.depgraph.depbuilder as depbuilder
+import pynocle.depgraph.incremental as incremental
+
+
+class TestReplaceOutgoing(unittest.TestCase):
+    def setUp(self):
+        self.graph = incremental.IncrementalDependencyGraph(
+            [('a', 'b'), ('a', 'c'), ('b', 'c')])
+
+    def assertSameAsGroup(self, edges):
+        group = depbuilder.DependencyGroup(edges)
+        for node in group.id_to_node:
+            self.assertEqual(self.graph.depnode_to_ca[node],
+                             group.depnode_to_ca[node], node)
+            self.assertEqual(self.graph.depnode_to_ce[node],
+                             group.depnode_to_ce[node], node)
+
+    def testCounts(self):
+        """Test that Ca and Ce are the same as a new DependencyGroup."""
+        self.assertEqual(self.graph.replace_outgoing('a', ['c', 'd', 'd']), 2)
+        self.assertSameAsGroup([('a', 'c'), ('a', 'd'), ('b', 'c')])
+        self.assertEqual(self.graph.outgoing('a'), ['c', 'd'])
+
+    def testRemovedModuleNotRanked(self):
+        """Test that a module without dependencies is left out."""
+        self.graph.replace_outgoing('b', [])
+        self.graph.replace_outgoing('a', ['c'])
+        self.assertEqual(sorted(self.graph.node_to_rank()), [])
+        self.graph.page_rank()
+        self.assertEqual(sorted(self.graph.node_to_rank()), ['a', 'c'])
+        self.assertEqual(self.graph.to_group().id_to_node, ['a', 'c'])
+
+    def testWarmStartSameRanks(self):
+        """Test that ranks from the previous ranking converge to the same
+        ranks as starting over."""
+        self.graph.page_rank(convergence=1e-6)
+        self.graph.replace_outgoing('c', ['d'])
+        warm = self.graph.page_rank(convergence=1e-6)
+        cold = incremental.IncrementalDependencyGraph(
+            self.graph.dependencies).page_rank(convergence=1e-6)
+        for node, nodeid in self.graph.node_to_id.items():
+            self.assertAlmostEqual(warm[nodeid], cold[nodeid], 4)
+
+
+class TestUpdateFile(testutils.TempModulesTestCase):
+    def testSameAsRebuilding(self):
+        a = self.writeModule('_inca', 'import _incb\n')
+        self.writeModule('_incb', '')
+        self.writeModule('_incc', 'import _incd\n')
+        self.writeModule('_incd', 'import _incc\n')
+        builder = depbuilder.DepBuilder([a])
+        graph = incremental.IncrementalDependencyGraph(builder.dependencies)
+        self.writeModule('_inca', 'import _incc\n')
+        #_inca: -_incb +_incc, and the new _incc -> _incd -> _incc.
+        self.assertEqual(graph.update_file(a, builder), 4)
+        expected = depbuilder.DepBuilder([a]).dependencies
+        self.assertEqual(sorted(map(tuple, graph.dependencies)),
+                         sorted(map(tuple, expected)))
+        self.writeModule('_inca', 'def (\n')
+        graph.update_file(a, builder)
+        self.assertEqual(graph.failed, set([os.path.splitext(a)[0]]))
+
+    def testDroppedImportsRemoved(self):
+        """Test that the dependencies of modules that are no longer
+        imported, including ones that import each other, are removed."""
+        a = self.writeModule('_ia', 'import _ib\nimport _ic\n')
+        self.writeModule('_ib', 'import _id\n')
+        self.writeModule('_ic', 'import _id\n')
+        self.writeModule('_id', 'import _ie\n')
+        self.writeModule('_ie', 'import _id\n')
+        builder = depbuilder.DepBuilder([a])
+        graph = incremental.IncrementalDependencyGraph(builder.dependencies)
+        def assertSameAsRebuilding():
+            expected = depbuilder.DepBuilder([a]).dependencies
+            self.assertEqual(sorted(map(tuple, graph.dependencies)),
+                             sorted(map(tuple, expected)))
+        #_id is still imported by _ic.
+        self.writeModule('_ia', 'import _ic\n')
+        self.assertEqual(graph.update_file(a, builder), 2)
+        assertSameAsRebuilding()
+        #_ic, and the _id <-> _ie cycle only it imports, are gone.
+        self.writeModule('_ia', '')
+        self.assertEqual(graph.update_file(a, builder), 4)
+        assertSameAsRebuilding()
+        self.assertEqual(graph.dependencies, [])
+        #They come back when imported again.
+        self.writeModule('_ia', 'import _ib\n')
+        self.assertEqual(graph.update_file(a, builder), 4)
+        assertSameAsRebuilding()
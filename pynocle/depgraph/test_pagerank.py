@@ -35,6 +35,31 @@ class TestPageRank(unittest.TestCase):
         result = pagerank.page_rank(links)
         self.assertEqual(str(result), '[ 0.36723503  0.0375      0.33665007  0.25861487]')
 
+    def testCSRMatrix(self):
+        links = [
+          [0, 2, 2, 3],
+          [0],
+          [3, 2],
+          [0],
+        ]
+        csr = pagerank.CSRLinkMatrix.fromLinkMatrix(links)
+        self.assertEqual(list(csr.indptr), [0, 3, 3, 6, 8])
+        self.assertEqual(list(csr.indices), [0, 1, 3, 0, 0, 2, 0, 2])
+        self.assertEqual(list(csr.leafNodes), [])
+        result = pagerank.page_rank(csr)
+        self.assertEqual(str(result), '[ 0.36723503  0.0375      0.33665007  0.25861487]')
+    def testStartFromPrevious(self):
+        links = [
+                [1, 2],
+                [2],
+                [3],
+                [4],
+                [0]
+        ]
+        previous = pagerank.page_rank(links, convergence=0.0001)
+        result = pagerank.page_rank(links, convergence=0.0001, start=previous)
+        self.assertTrue(abs(result - previous).max() < 0.001)
+
 class TestDepsToMatrix(unittest.TestCase):
     def testConvert(self):
         deps = [
@@ -57,4 +82,16 @@ class TestDepsToMatrix(unittest.TestCase):
             []
         ]
         result = pagerank.DependenciesToLinkMatrix(deps).create_matrix()
-        self.assertEqual(result, ideal)
\ No newline at end of file
+        self.assertEqual(result, ideal)
+    def testConvertCSR(self):
+        deps = [
+            ['foo', 'bar'],
+            ['bar', 'foo'],
+            ['foo', 'eggs'],
+            ['spam', 'eggs'],
+            ['foo', 'bacon']
+        ]
+        result = pagerank.DependenciesToLinkMatrix(deps).create_csr_matrix()
+        self.assertEqual(list(result.indptr), [0, 1, 2, 4, 4, 5])
+        self.assertEqual(list(result.indices), [1, 0, 0, 3, 0])
+        self.assertEqual(list(result.leafNodes), [2, 4])
\ No newline at end of file
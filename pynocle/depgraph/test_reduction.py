@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+
+import os
+import unittest
+
+import pynocle.depgraph.depbuilder as depbuilder
+import pynocle.depgraph.reduction as reduction
+
+
+def _group(*edges):
+    return depbuilder.DependencyGroup(edges)
+
+
+def _edges(depgroup):
+    return [(d.startpt, d.endpt) for d in depgroup.dependencies]
+
+
+class TestCollapsePackages(unittest.TestCase):
+    def testCollapse(self):
+        """Test that modules below depth collapse into their package,
+        and dependencies inside a package are dropped."""
+        join = lambda *parts: os.path.join(os.sep + 'root', *parts)
+        group = _group((join('a', 'x'), join('a', 'y')),
+                       (join('a', 'x'), join('b', 'c', 'z')),
+                       (join('top'), join('b', '__init__')))
+        result = reduction.collapse_packages(group, 1, join())
+        self.assertEqual(_edges(result), [(join('a'), join('b')),
+                                          (join('top'), join('b'))])
+
+    def testInvalidDepth(self):
+        self.assertRaises(ValueError, reduction.collapse_packages,
+                          _group(('a', 'b')), 0)
+
+
+class TestPrune(unittest.TestCase):
+    def setUp(self):
+        self.group = _group(('a', 'hub'), ('b', 'hub'), ('c', 'hub'),
+                            ('hub', 'leaf'), ('leaf', 'hub'))
+
+    def testMaxNodes(self):
+        """Test that the nodes with the highest PageRank are kept."""
+        result = reduction.prune(self.group, max_nodes=2)
+        self.assertEqual(_edges(result), [('hub', 'leaf'), ('leaf', 'hub')])
+
+    def testMinCoupling(self):
+        result = reduction.prune(self.group, min_coupling=2)
+        self.assertEqual(_edges(result), [('hub', 'leaf'), ('leaf', 'hub')])
+
+    def testNothingPruned(self):
+        self.assertTrue(reduction.prune(self.group, max_nodes=5) is self.group)
+
+
+class TestTransitiveReduction(unittest.TestCase):
+    def testImpliedDropped(self):
+        group = _group(('a', 'b'), ('b', 'c'), ('a', 'c'), ('c', 'd'),
+                       ('a', 'd'))
+        self.assertEqual(_edges(reduction.transitive_reduction(group)),
+                         [('a', 'b'), ('b', 'c'), ('c', 'd')])
+
+    def testCyclesKept(self):
+        """Test that dependencies in a cycle are kept,
+        and ones into a cycle reached through it are dropped."""
+        group = _group(('a', 'b'), ('b', 'c'), ('c', 'a'), ('x', 'a'),
+                       ('x', 'y'), ('y', 'a'))
+        self.assertEqual(_edges(reduction.transitive_reduction(group)),
+                         [('a', 'b'), ('b', 'c'), ('c', 'a'), ('x', 'y'),
+                          ('y', 'a')])
+
+    def testDeepChain(self):
+        """Test that a chain deeper than the recursion limit works."""
+        edges = [(i, i + 1) for i in range(5000)]
+        group = _group(*(edges + [(0, 5000)]))
+        self.assertEqual(_edges(reduction.transitive_reduction(group)), edges)
+
+
+class TestGraphReduction(unittest.TestCase):
+    def testDefaultLeavesSmallGraphs(self):
+        group = _group(('a', 'b'), ('b', 'c'), ('a', 'c'))
+        reduced = reduction.GraphReduction.default().apply(group)
+        self.assertTrue(reduced is group)
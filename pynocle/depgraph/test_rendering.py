@@ -0,0 +1,121 @@
+#!/usr/bin/env python
+
+import os
+import shutil
+import stat
+import tempfile
+import unittest
+
+import pynocle.depgraph.depbuilder as depbuilder
+import pynocle.depgraph.rendering as rendering
+import pynocle.utils as utils
+
+#Stands in for dot: copies the dot text (from stdin or a file)
+#to the file after -o.
+FAKE_DOT = '''#!/bin/sh
+if [ "$2" = "-o" ]; then cat > "$3"; else cp "$2" "$4"; fi
+'''
+
+
+@unittest.skipIf(os.name != 'posix', 'fake dot is a shell script')
+class TestRender(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.exe = os.path.join(self.tempdir, 'fakedot')
+        with open(self.exe, 'w') as f:
+            f.write(FAKE_DOT)
+        os.chmod(self.exe, stat.S_IRWXU)
+        group = depbuilder.DependencyGroup([
+            depbuilder.Dependency('/a/spam.py', '/a/eggs.py'),
+            depbuilder.Dependency('/a/eggs.py', '/a/pkg/__init__.py')])
+        self.renderer = rendering.DefaultRenderer(
+            group, exe=self.exe, leading_path='/a')
+        self.expected = os.path.join(self.tempdir, 'expected.dot')
+        self.renderer.savedot(self.expected)
+        self.out = os.path.join(self.tempdir, 'out.png')
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    def read(self, filename):
+        with open(filename) as f:
+            return f.read()
+
+    def testStreamed(self):
+        """Test that the dot text is streamed into the exe."""
+        self.renderer.render(self.out)
+        self.assertEqual(self.read(self.out), self.read(self.expected))
+
+    def testDotFilename(self):
+        """Test that the dot file is kept when asked for."""
+        dotfilename = os.path.join(self.tempdir, 'kept.dot')
+        self.renderer.render(self.out, dotfilename=dotfilename)
+        self.assertEqual(self.read(dotfilename), self.read(self.expected))
+        self.assertEqual(self.read(self.out), self.read(self.expected))
+
+    def testStylerWithoutPrepare(self):
+        """Test that a styler only needs to provide the styles."""
+        class Styler(object):
+            def __init__(self):
+                self.default = rendering.DefaultStyler(leading_path='/a')
+            def __getattr__(self, name):
+                if name == 'prepare':
+                    raise AttributeError(name)
+                return getattr(self.default, name)
+        self.renderer.styler = Styler()
+        dotfilename = os.path.join(self.tempdir, 'styled.dot')
+        self.renderer.savedot(dotfilename)
+        self.assertEqual(self.read(dotfilename), self.read(self.expected))
+
+    def testSavedotOnly(self):
+        """Test that a renderer that only saves dot files is rendered
+        from the saved text."""
+        exe = self.exe
+        class Renderer(rendering.IRenderer):
+            def dotexe(self):
+                return exe
+            def savedot(self, filename):
+                with open(filename, 'w') as f:
+                    f.write('digraph G {\n}\n')
+        Renderer().render(self.out)
+        self.assertEqual(self.read(self.out), 'digraph G {\n}\n')
+
+    def testMissingExe(self):
+        self.renderer.exe = os.path.join(self.tempdir, 'nodot')
+        self.assertRaises(utils.MissingDependencyError,
+                          self.renderer.render, self.out)
+
+
+class TestStyleContext(unittest.TestCase):
+    def setUp(self):
+        self.group = depbuilder.DependencyGroup([
+            depbuilder.Dependency('a', 'b'), depbuilder.Dependency('a', 'c'),
+            depbuilder.Dependency('b', 'c')])
+        self.styler = rendering.DefaultStyler(leading_path='/')
+
+    def testPercentilesOncePerGroup(self):
+        """Test that percentiles are calculated once per group,
+        not once per node."""
+        calls = []
+        old = rendering.nth_percentile
+        def nth_percentile(values, n=0.95):
+            calls.append(values)
+            return old(values, n)
+        rendering.nth_percentile = nth_percentile
+        try:
+            for node in 'abc':
+                self.styler.modulestyle(self.group, node)
+            self.assertEqual(len(calls), 2)
+            other = depbuilder.DependencyGroup(list(self.group.dependencies))
+            self.styler.modulestyle(other, 'a')
+            self.assertEqual(len(calls), 4)
+        finally:
+            rendering.nth_percentile = old
+
+    def testSameColors(self):
+        """Test that colors are the same as calculating them directly."""
+        style = self.styler.modulestyle(self.group, 'c')
+        self.assertEqual(style['color'], '"%s"' % self.styler._calc_outline_col(
+            2, rendering.nth_percentile([0, 1, 2])))
+        self.assertEqual(style['fillcolor'], '"%s"' % self.styler._calc_fill_col(
+            0, rendering.nth_percentile([2, 1, 0])))
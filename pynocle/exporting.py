@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+"""
+Writes the rows of the SLOC, cyclomatic complexity, coupling,
+and PageRank reports in formats for other programs (such as dashboards)
+to read, instead of scraping the html reports.
+
+Rows are generated from the analysis results as they are written,
+a batch at a time, so a report's rows are never all in memory at once.
+"""
+
+import pynocle.cyclcompl.formatting as ccformatting
+import pynocle.depgraph.formatting as depformatting
+import pynocle.sloc.formatting as slocformatting
+import pynocle.tableprint as tableprint
+import pynocle.tracing as tracing
+import pynocle.utils as utils
+
+#Supported formats, which are also the extensions of the files written.
+FORMATS = ('jsonl', 'csv', 'sqlite')
+
+#{report name: (columns, function that takes the report's data and
+#the leading path to strip from filenames, and yields rows)}
+REPORTS = {
+    'sloc': (slocformatting.COLUMNS, slocformatting.iter_rows),
+    'cyclcompl': (ccformatting.COLUMNS, ccformatting.iter_rows),
+    'coupling': (depformatting.COUPLING_COLUMNS,
+                 depformatting.iter_coupling_rows),
+    'couplingrank': (depformatting.RANK_COLUMNS,
+                     depformatting.iter_rank_rows),
+}
+
+
+def _validate(report, format):
+    if report not in REPORTS:
+        raise ValueError('Unknown report %r, must be one of %s.' % (
+            report, ', '.join(sorted(REPORTS))))
+    if format not in FORMATS:
+        raise ValueError('Unknown format %r, must be one of %s.' % (
+            format, ', '.join(FORMATS)))
+
+
+def create_formatter(report, format, target, leading_path=None):
+    """Returns a tableprint.StreamingFormatter for the rows of report
+    (any of REPORTS) in format (any of FORMATS).
+
+    :param target: Stream to write jsonl and csv to, or the filename of
+      (or sqlite3.Connection to) the database to write a table named
+      report to.
+    :param leading_path: Path to strip off from filenames in the rows.
+    """
+    _validate(report, format)
+    columns, iter_rows = REPORTS[report]
+    if format == 'jsonl':
+        table = tableprint.JsonLinesTable(target, columns)
+    elif format == 'csv':
+        table = tableprint.CsvTable(target, columns)
+    else:
+        table = tableprint.SqliteTable(target, report, columns)
+    return tableprint.StreamingFormatter(
+        table, lambda data: iter_rows(data, leading_path))
+
+
+def export_report(report, format, filename, data, leading_path=None,
+                  tracer=tracing.NULL_TRACER):
+    """Writes the rows of report (any of REPORTS) for data
+    in format (any of FORMATS) to filename.
+    A SQLite database at filename keeps any other tables in it.
+
+    :param data: Same data the report's html formatter takes.
+    :param leading_path: Path to strip off from filenames in the rows.
+    :param tracer: tracing.Tracer to record a span for each part in.
+    """
+    _validate(report, format)
+    if format == 'sqlite':
+        fmt = create_formatter(report, format, filename, leading_path)
+        utils.format_report(fmt, data, tracer, filename)
+        return
+    def factory(f):
+        return create_formatter(report, format, f, leading_path)
+    utils.write_report(filename, data, factory, tracer)
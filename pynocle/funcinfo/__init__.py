@@ -1,10 +1,12 @@
 #!/usr/bin/env python
 
-import compiler
-import compiler.ast
+import pynocle.sourceunits as sourceunits
+import pynocle.utils as utils
 
+compiler = utils.LazyModule('compiler')
 
-import pynocle.utils as utils
+#Stage name used when releasing files from a sourceunits.SourceUnitStore.
+SOURCE_STAGE = 'funcinfo'
 
 
 class FuncInfo(object):
@@ -14,15 +16,21 @@ class FuncInfo(object):
 
 def all_func_nodes(astnode):
         isclass = lambda x: isinstance(x, compiler.ast.Class)
-        nodes = filter(isclass, utils.flatten(astnode, lambda x: x.getChildNodes()))
+        nodes = filter(isclass, utils.flatten_statements(astnode))
         return nodes
 
 
-def extract_funcinfos(*filenames):
+def extract_funcinfos(*filenames, **kwargs):
+    """Returns FuncInfos for all files in filenames.
+
+    :param store: Keyword-only.  If provided, a sourceunits.SourceUnitStore
+      to read and parse files through.
+    """
+    store = kwargs.get('store')
     result = []
     for f in filenames:
         try:
-            ast = compiler.parseFile(f)
+            ast = sourceunits.parse(f, SOURCE_STAGE, store)
         except SyntaxError:
             continue
         for node in all_func_nodes(ast):
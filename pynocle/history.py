@@ -0,0 +1,275 @@
+#!/usr/bin/env python
+"""
+Keeps the metrics of every run in a SQLite database,
+so changes to them can be queried across commits.
+
+Each run is a row in `runs`, tagged with the commit it was for.
+Per-file metrics (SLOC, cyclomatic complexity, coupling, and PageRank)
+go in `file_metrics`, and the complexity of every class and function
+in `func_metrics`, one row per (run, file, metric), all inserted in bulk
+in one transaction per run.
+Files and metric names are interned in `files` and `metrics`,
+and both metric tables are indexed on (file, run) and (metric, run),
+so the history of a file, or a metric over recent runs,
+is read from an index instead of the whole table.
+
+Usage::
+
+    with history.HistoryStore('history.sqlite') as store:
+        store.record_run(commit, slocgrp, ccdata, depgrp, rootdir)
+        for path, old, new, growth in store.top_growth('cc.total'):
+            ...
+"""
+
+import time
+
+import pynocle.cyclcompl.formatting as ccformatting
+import pynocle.depgraph.formatting as depformatting
+import pynocle.sloc.formatting as slocformatting
+
+#Metrics recorded for each file.  cc.total is the complexity of
+#everything in a file, cc.max that of its most complex class or function.
+FILE_METRICS = ('sloc.code', 'sloc.comment', 'sloc.blank', 'sloc.total',
+                'cc.total', 'cc.max', 'ca', 'ce', 'instability', 'rank')
+#Metrics recorded for each class and function.
+FUNC_METRICS = ('cc',)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    commit_id TEXT,
+    created REAL
+);
+CREATE TABLE IF NOT EXISTS files (
+    id INTEGER PRIMARY KEY,
+    path TEXT UNIQUE NOT NULL
+);
+CREATE TABLE IF NOT EXISTS metrics (
+    id INTEGER PRIMARY KEY,
+    name TEXT UNIQUE NOT NULL
+);
+CREATE TABLE IF NOT EXISTS file_metrics (
+    run INTEGER NOT NULL,
+    file INTEGER NOT NULL,
+    metric INTEGER NOT NULL,
+    value REAL
+);
+CREATE TABLE IF NOT EXISTS func_metrics (
+    run INTEGER NOT NULL,
+    file INTEGER NOT NULL,
+    kind TEXT,
+    name TEXT,
+    metric INTEGER NOT NULL,
+    value REAL
+);
+CREATE INDEX IF NOT EXISTS file_metrics_file_run ON file_metrics (file, run);
+CREATE INDEX IF NOT EXISTS file_metrics_metric_run
+    ON file_metrics (metric, run);
+CREATE INDEX IF NOT EXISTS func_metrics_file_run ON func_metrics (file, run);
+CREATE INDEX IF NOT EXISTS func_metrics_metric_run
+    ON func_metrics (metric, run);
+"""
+
+#Growth of a metric for every file that has it in the latest run,
+#from the first run in the window the file has it in.
+#The files of the latest run come from the (metric, run) index,
+#and the first run of each from the (file, run) index,
+#so the rows of the runs in between are never read
+#(the unary + keeps SQLite from using the (metric, run) index for the latter).
+_TOP_GROWTH = """
+SELECT files.path, first.value, last.value, last.value - first.value AS growth
+FROM file_metrics AS last
+JOIN file_metrics AS first
+    ON first.file = last.file AND first.metric = :metric
+    AND first.run = (SELECT MIN(run) FROM file_metrics
+                     WHERE file = last.file AND +metric = :metric
+                     AND run >= :startrun)
+JOIN files ON files.id = last.file
+WHERE last.metric = :metric AND last.run = :lastrun
+ORDER BY growth DESC, files.path
+LIMIT :limit
+"""
+
+
+def current_commit(rootdir):
+    """Returns the id of the git commit checked out at rootdir,
+    or None if it cannot be found."""
+    import subprocess
+    try:
+        p = subprocess.Popen(['git', 'rev-parse', 'HEAD'], cwd=rootdir,
+                             stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    except OSError:
+        return None
+    out = p.communicate()[0]
+    if p.returncode:
+        return None
+    return out.strip() or None
+
+
+def _file_metrics(slocgroup, ccdata, depgroup, leading_path):
+    """Yields (path, metric name, value) for each metric of each file."""
+    if slocgroup is not None:
+        for row in slocformatting.iter_rows(slocgroup, leading_path):
+            path = row[0]
+            yield path, 'sloc.code', row[1]
+            yield path, 'sloc.comment', row[3]
+            yield path, 'sloc.blank', row[5]
+            yield path, 'sloc.total', row[7]
+    if ccdata is not None:
+        totals = {}
+        maxes = {}
+        order = []
+        for path, kind, name, cc in ccformatting.iter_rows(
+                ccdata, leading_path):
+            if path not in totals:
+                order.append(path)
+                totals[path] = 0
+                maxes[path] = 0
+            totals[path] += cc
+            if kind != 'File':
+                maxes[path] = max(maxes[path], cc)
+        for path in order:
+            yield path, 'cc.total', totals[path]
+            yield path, 'cc.max', maxes[path]
+    if depgroup is not None:
+        for path, ca, ce, instab in depformatting.iter_coupling_rows(
+                depgroup, leading_path):
+            yield path, 'ca', ca
+            yield path, 'ce', ce
+            yield path, 'instability', instab
+        if len(depgroup.dependencies):
+            for path, rank, _, _ in depformatting.iter_rank_rows(
+                    depgroup, leading_path):
+                yield path, 'rank', rank
+
+
+class HistoryStore(object):
+    """SQLite database of the metrics of every run.
+
+    :param filename: Filename of the database, created if it does not exist.
+      Can be ':memory:' for a database that is not saved.
+    """
+    def __init__(self, filename):
+        import sqlite3
+        self.filename = filename
+        self.connection = sqlite3.connect(filename)
+        self.connection.executescript(_SCHEMA)
+        self._metric_ids = {}
+        with self.connection:
+            for name in FILE_METRICS + FUNC_METRICS:
+                self._metric_id(name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+        return False
+
+    def close(self):
+        self.connection.close()
+
+    def _metric_id(self, name):
+        metricid = self._metric_ids.get(name)
+        if metricid is None:
+            self.connection.execute(
+                'INSERT OR IGNORE INTO metrics (name) VALUES (?)', [name])
+            metricid = self.connection.execute(
+                'SELECT id FROM metrics WHERE name = ?', [name]).fetchone()[0]
+            self._metric_ids[name] = metricid
+        return metricid
+
+    def _file_ids(self, paths):
+        """Returns a dict of {path: id} for each of paths,
+        adding the ones that are new."""
+        paths = list(set(paths))
+        self.connection.executemany(
+            'INSERT OR IGNORE INTO files (path) VALUES (?)',
+            ((p,) for p in paths))
+        result = {}
+        #Stay under SQLite's limit on the number of parameters.
+        for i in xrange(0, len(paths), 500):
+            batch = paths[i:i + 500]
+            result.update((path, fileid) for fileid, path in
+                          self.connection.execute(
+                              'SELECT id, path FROM files WHERE path IN '
+                              '(%s)' % ', '.join('?' * len(batch)), batch))
+        return result
+
+    def record_run(self, commit=None, slocgroup=None, ccdata=None,
+                   depgroup=None, leading_path=None, created=None):
+        """Inserts the metrics of a run and returns its run id.
+        Any of the results can be None if they were not measured.
+
+        :param commit: Id of the commit the run was for.
+        :param slocgroup: sloc.SlocGroup of the run.
+        :param ccdata: Output of cyclcompl.measure_cyclcompl
+          (CCTable, failures).
+        :param depgroup: depgraph.DependencyGroup of the run.
+        :param leading_path: Path to strip off from filenames,
+          usually the rootdir, so a file has the same path in every run.
+          Paths are stored the way reports show them, without extensions.
+        :param created: Time of the run, in seconds since the epoch.
+          If None, use the current time.
+        """
+        if created is None:
+            created = time.time()
+        filerows = list(_file_metrics(slocgroup, ccdata, depgroup,
+                                      leading_path))
+        funcrows = []
+        if ccdata is not None:
+            funcrows = [row for row in
+                        ccformatting.iter_rows(ccdata, leading_path)
+                        if row[1] != 'File']
+        with self.connection:
+            cursor = self.connection.execute(
+                'INSERT INTO runs (commit_id, created) VALUES (?, ?)',
+                [commit, created])
+            runid = cursor.lastrowid
+            fileids = self._file_ids(
+                [r[0] for r in filerows] + [r[0] for r in funcrows])
+            metricid = self._metric_id
+            self.connection.executemany(
+                'INSERT INTO file_metrics VALUES (?, ?, ?, ?)',
+                ((runid, fileids[path], metricid(metric), value)
+                 for path, metric, value in filerows))
+            ccid = metricid('cc')
+            self.connection.executemany(
+                'INSERT INTO func_metrics VALUES (?, ?, ?, ?, ?, ?)',
+                ((runid, fileids[path], kind, name, ccid, cc)
+                 for path, kind, name, cc in funcrows))
+        return runid
+
+    def runs(self, limit=None):
+        """Returns a list of (run id, commit, created) for the latest
+        limit runs (or all of them if None), latest first."""
+        return self.connection.execute(
+            'SELECT id, commit_id, created FROM runs ORDER BY id DESC '
+            'LIMIT ?', [-1 if limit is None else limit]).fetchall()
+
+    def file_history(self, path, metric):
+        """Returns a list of (run id, commit, value) of metric
+        (any of FILE_METRICS) for the file at path, oldest first."""
+        return self.connection.execute(
+            'SELECT runs.id, runs.commit_id, file_metrics.value '
+            'FROM file_metrics '
+            'JOIN runs ON runs.id = file_metrics.run '
+            'WHERE file_metrics.file = (SELECT id FROM files WHERE path = ?) '
+            'AND file_metrics.metric = ? '
+            'ORDER BY runs.id', [path, self._metric_id(metric)]).fetchall()
+
+    def top_growth(self, metric='cc.total', runs=50, limit=20):
+        """Returns a list of up to limit (path, first value, last value,
+        growth) tuples for the files whose metric (any of FILE_METRICS)
+        grew most over the latest runs runs, most growth first.
+        Only files in the latest run are included, and each file's growth
+        is from the first of those runs it is in.
+        """
+        window = self.runs(runs)
+        if not window:
+            return []
+        return self.connection.execute(_TOP_GROWTH, {
+            'metric': self._metric_id(metric),
+            'startrun': window[-1][0],
+            'lastrun': window[0][0],
+            'limit': limit}).fetchall()
@@ -1,10 +1,13 @@
 #!/usr/bin/env python
 
-import compiler
-import compiler.ast
-
+import pynocle.sourceunits as sourceunits
 import pynocle.utils as utils
 
+compiler = utils.LazyModule('compiler')
+
+#Stage name used when releasing files from a sourceunits.SourceUnitStore.
+SOURCE_STAGE = 'inheritance'
+
 
 class ClassInfo(object):
     def __init__(self, filename, classname, bases):
@@ -32,33 +35,58 @@ class ClassGraph(object):
             byfile[ci.filename] = ci.bases
 
 
+def _all_class_nodes(astnode):
+    isclass = lambda x: isinstance(x, compiler.ast.Class)
+    nodes = filter(isclass, utils.flatten_statements(astnode))
+    return nodes
+
+
+def _get_classname_from_node(node):
+    if isinstance(node, (compiler.ast.Class, compiler.ast.Name)):
+        return node.name
+    if isinstance(node, compiler.ast.Getattr):
+        return '%s.%s' % (_get_classname_from_node(node.expr), node.attrname)
+
+
+def get_file_classinfos(filename, store=None):
+    """Returns a list of ClassInfos for all classes in filename.
+    Returns an empty list if filename cannot be parsed.
+
+    store: If provided, a sourceunits.SourceUnitStore to read and
+      parse filename through.
+    """
+    try:
+        ast = sourceunits.parse(filename, SOURCE_STAGE, store)
+    except SyntaxError:
+        return []
+    return [ClassInfo(filename, node.name,
+                      [_get_classname_from_node(namenode) for namenode in node.bases])
+            for node in _all_class_nodes(ast)]
+
+
 class InheritanceBuilder(object):
-    def __init__(self, files):
+    """Builds ClassInfos for all classes in files.
+
+    :param store: If provided, a sourceunits.SourceUnitStore to read and
+      parse files through.
+    :param cache: If provided, an analysiscache.AnalysisCache to load the
+      ClassInfos of unchanged files from.
+    """
+    def __init__(self, files, store=None, cache=None):
+        self.store = store
         self._classinfos = []
-        for f in files:
-            self.process_file(f)
-
-    def _all_class_nodes(self, astnode):
-        isclass = lambda x: isinstance(x, compiler.ast.Class)
-        nodes = filter(isclass, utils.flatten(astnode, lambda x: x.getChildNodes()))
-        return nodes
-
-    def _get_classname_from_node(self, node):
-        if isinstance(node, compiler.ast.Class):
-            return node.name
-        if isinstance(node, compiler.ast.Getattr):
-            return '%s.%s' % (node.expr.name, node.attrname)
-        
+        if cache is not None:
+            #ClassInfos include the filename.
+            for classinfos in cache.map(
+                    SOURCE_STAGE, files, get_file_classinfos, store,
+                    variant=lambda f: f):
+                self._classinfos.extend(classinfos)
+        else:
+            for f in files:
+                self.process_file(f)
+
     def process_file(self, filename):
-        try:
-            ast = compiler.parseFile(filename)
-        except SyntaxError:
-            return
-        for node in self._all_class_nodes(ast):
-            ci = ClassInfo(filename, node.name, [self._get_classname_from_node(node) for namenode in node.bases])
-            self._classinfos.append(ci)
+        self._classinfos.extend(get_file_classinfos(filename, self.store))
 
     def classinfos(self):
-        return self.classinfos
-
-        
\ No newline at end of file
+        return self._classinfos
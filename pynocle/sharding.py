@@ -0,0 +1,287 @@
+#!/usr/bin/env python
+"""
+Analyzes a large tree (such as a repository of many projects) in shards,
+each in its own worker process, and merges their partial results.
+
+Each shard counts SLOC, measures cyclomatic complexity, and builds the
+dependencies of its own files, into a SlocTable, CCTable,
+and DependencyGroup, which are small to send back from a worker
+and can be merged with those of other shards.
+
+Imports between shards are resolved the same as in a single process,
+through the search path, so dependencies between shards are kept.
+A shard's DepBuilder only follows imports within its own files.
+The modules they import that are in no shard (such as the standard
+library) are followed once, after all shards are done,
+instead of once per shard.
+The merged group has the same dependencies as one built from every file
+at once (though its modules may be interned in a different order).
+
+Usage::
+
+    m = pynocle.Monocle('monorepo', 'output', rootdir='monorepo')
+    shards = sharding.shards_by_root(m.rootdir, m.filenames,
+                                     m.sloc_filenames)
+    sharding.generate_all(m, shards, jobs=0)
+"""
+
+import itertools
+import os
+import sys
+
+import pynocle
+import pynocle._modulefinder as modulefinder
+import pynocle.cyclcompl as cyclcompl
+import pynocle.depgraph as depgraph
+import pynocle.sloc as sloc
+import pynocle.sourceunits as sourceunits
+import pynocle.tracing as tracing
+import pynocle.utils as utils
+
+
+class Shard(object):
+    """Files analyzed together in one worker process.
+
+    :param name: Name of the shard, such as the project it is for.
+    :param filenames: Python files to measure and build dependencies from.
+    :param sloc_filenames: Files to count SLOC of.
+      If None, use filenames.
+    """
+    def __init__(self, name, filenames, sloc_filenames=None):
+        self.name = name
+        self.filenames = list(filenames)
+        if sloc_filenames is None:
+            sloc_filenames = self.filenames
+        self.sloc_filenames = list(sloc_filenames)
+
+    def __repr__(self):
+        return 'Shard(%r, %s files)' % (self.name, len(self.filenames))
+
+    __str__ = __repr__
+
+
+def _group_by(filenames, keyfunc):
+    """Returns an ordered list of (key, filenames) for filenames grouped
+    by keyfunc(filename), in the order each key is first seen."""
+    order = []
+    groups = {}
+    for filename in filenames:
+        key = keyfunc(filename)
+        if key not in groups:
+            groups[key] = []
+            order.append(key)
+        groups[key].append(filename)
+    return [(key, groups[key]) for key in order]
+
+
+def shards_by_root(rootdir, filenames, sloc_filenames=None):
+    """Returns a list of Shards with one for each top-level directory
+    under rootdir that has files in filenames (or sloc_filenames),
+    and one named '.' for the files directly in rootdir.
+    Files keep their order within each shard.
+
+    :param rootdir: Directory whose children are the roots to shard by.
+    :param filenames: Python files under rootdir.
+    :param sloc_filenames: Files to count SLOC of.  If None, use filenames.
+    """
+    rootdir = os.path.abspath(rootdir)
+    def rootname(filename):
+        relpath = os.path.relpath(os.path.abspath(filename), rootdir)
+        parts = relpath.split(os.sep)
+        if len(parts) == 1:
+            return '.'
+        return parts[0]
+    if sloc_filenames is None:
+        sloc_filenames = filenames
+    pygroups = _group_by(filenames, rootname)
+    sloc_groups = _group_by(sloc_filenames, rootname)
+    pyfiles = dict(pygroups)
+    slocfiles = dict(sloc_groups)
+    names = [name for name, _ in pygroups]
+    names.extend(name for name, _ in sloc_groups if name not in pyfiles)
+    return [Shard(name, pyfiles.get(name, ()), slocfiles.get(name, ()))
+            for name in names]
+
+
+def shards_by_count(filenames, size, sloc_filenames=None):
+    """Returns a list of Shards of up to size files each, in order.
+
+    :param sloc_filenames: Files to count SLOC of, also split into
+      shards of up to size files.  If None, use filenames.
+    """
+    if size < 1:
+        raise ValueError('size must be at least 1, got %s' % size)
+    filenames = list(filenames)
+    if sloc_filenames is None:
+        sloc_filenames = filenames
+    sloc_filenames = list(sloc_filenames)
+    def chunks(items):
+        return [items[i:i + size] for i in xrange(0, len(items), size)]
+    return [Shard(str(i), pyfiles or (), slocfiles or ())
+            for i, (pyfiles, slocfiles) in enumerate(itertools.izip_longest(
+                chunks(filenames), chunks(sloc_filenames)))]
+
+
+class ShardResult(object):
+    """Partial (or merged) results of analyzing shards.
+
+    Attrs:
+
+    - names: Names of the shards the results are for.
+    - slocs: sloc.slocing.SlocTable of the SLOC files.
+    - cc: cyclcompl.statbuilder.CCTable of the python files.
+    - ccfailures: List of python files that could not be parsed.
+    - depgroup: depgraph.DependencyGroup of the python files.
+    - external: Filenames of modules imported by the python files
+      whose dependencies were not followed, since they are not in the shard.
+    """
+    def __init__(self, names, slocs, cc, ccfailures, depgroup, external=()):
+        self.names = names
+        self.slocs = slocs
+        self.cc = cc
+        self.ccfailures = ccfailures
+        self.depgroup = depgroup
+        self.external = list(external)
+
+    def __repr__(self):
+        return 'ShardResult(%s)' % ', '.join(self.names)
+
+    __str__ = __repr__
+
+    def modules(self):
+        """Returns a set of the extensionless filenames of the python files
+        (measured or failed)."""
+        return set(os.path.splitext(f)[0]
+                   for f in self.cc.filenames + self.ccfailures)
+
+    @classmethod
+    def merge(cls, results):
+        """Returns a ShardResult of all of results, in order.
+        Its external modules are those of any of results that are not
+        in any of them."""
+        results = list(results)
+        modules = set()
+        for r in results:
+            modules.update(r.modules())
+        external = []
+        seen = set()
+        for r in results:
+            for filename in r.external:
+                extless = os.path.splitext(filename)[0]
+                if extless not in modules and extless not in seen:
+                    seen.add(extless)
+                    external.append(filename)
+        return cls([n for r in results for n in r.names],
+                   sloc.slocing.SlocTable.merge([r.slocs for r in results]),
+                   cyclcompl.statbuilder.CCTable.merge(
+                       [r.cc for r in results]),
+                   [f for r in results for f in r.ccfailures],
+                   depgraph.DependencyGroup.merge(
+                       [r.depgroup for r in results]),
+                   external)
+
+    def slocgroup(self):
+        """Returns a SlocGroup of self.slocs, for reports."""
+        return sloc.SlocGroup.from_table(self.slocs)
+
+
+def _modulefinder_cache(path):
+    index = modulefinder.ModuleIndex(list(path or ()) + sys.path)
+    return modulefinder.ModuleFinderCache(index)
+
+
+def analyze_shard(shard, path=None, max_source_bytes=None):
+    """Analyzes the files of shard and returns a ShardResult.
+    Each file is read and parsed once for all metrics.
+    Only the dependencies of the shard's own files are found.
+
+    :param path: Directories to search for imported modules before
+      sys.path, such as the roots of the projects in a monorepo.
+    :param max_source_bytes: Passed to sourceunits.SourceUnitStore.
+    """
+    store = pynocle._create_source_store(
+        shard.filenames, shard.sloc_filenames,
+        max_source_bytes or sourceunits.DEFAULT_MAX_BYTES)
+    slocinfos = sloc.slocing.count_files(shard.sloc_filenames, store)
+    slocs = sloc.slocing.SlocTable(shard.sloc_filenames, slocinfos)
+    cc, ccfailures = cyclcompl.measure_cyclcompl(shard.filenames, store)
+    owned = set(os.path.splitext(os.path.abspath(f))[0]
+                for f in shard.filenames)
+    depb = depgraph.DepBuilder(
+        shard.filenames, store=store,
+        modulefinder_cache=_modulefinder_cache(path),
+        follow=owned.__contains__)
+    depgroup = depgraph.DependencyGroup(depb.dependencies, depb.failed)
+    return ShardResult([shard.name], slocs, cc, ccfailures, depgroup,
+                       depb.unfollowed)
+
+
+def analyze_external(result, path=None):
+    """Returns a ShardResult of the dependencies of result's external
+    modules, and of the modules they import that are not in result,
+    so that merging it with result adds every dependency a single
+    DepBuilder started from all files would have found.
+
+    :param result: Merged ShardResult of all shards.
+    :param path: See analyze_shard.
+    """
+    modules = result.modules()
+    depb = depgraph.DepBuilder(
+        result.external, modulefinder_cache=_modulefinder_cache(path),
+        follow=lambda extless: extless not in modules)
+    depgroup = depgraph.DependencyGroup(depb.dependencies, depb.failed)
+    return ShardResult([], sloc.slocing.SlocTable(),
+                       cyclcompl.statbuilder.CCTable(), [], depgroup)
+
+
+def _analyze_job(args):
+    """analyze_shard for a (shard, path, max_source_bytes) tuple,
+    for parallel_map."""
+    return analyze_shard(*args)
+
+
+def analyze_shards(shards, jobs=None, path=None, max_source_bytes=None,
+                   tracer=tracing.NULL_TRACER):
+    """Analyzes each of shards (in worker processes if jobs > 1)
+    and returns the merged ShardResult,
+    including the dependencies of external modules (so it has none).
+
+    :param jobs: Number of worker processes.  See utils.resolve_jobs.
+    :param path: See analyze_shard.
+    :param max_source_bytes: See analyze_shard.
+    :param tracer: tracing.Tracer to record spans for the shards
+      and the merge in.
+    """
+    shards = list(shards)
+    jobs_args = [(shard, path, max_source_bytes) for shard in shards]
+    with tracer.span('analyze_shards', shards=len(shards), jobs=jobs):
+        results = utils.parallel_map(_analyze_job, jobs_args, jobs)
+    with tracer.span('ShardResult.merge'):
+        merged = ShardResult.merge(results)
+    with tracer.span('analyze_external', files=len(merged.external)):
+        external = analyze_external(merged, path)
+    result = ShardResult.merge([merged, external])
+    result.external = []
+    return result
+
+
+def generate_all(monocle, shards, jobs=None, path=None, cleanoutput=True):
+    """Analyzes shards with analyze_shards and writes the same reports
+    as monocle.generate_all from the merged results
+    (except coverage, which is not sharded) with monocle.write_reports.
+
+    :param monocle: pynocle.Monocle whose reports to write.
+      Its filenames should be the files of all shards.
+    :param jobs: Number of worker processes.  If None, use monocle.jobs.
+    :param cleanoutput: If True, run ensure_clean_output to clear
+      the output directory.
+    """
+    if jobs is None:
+        jobs = monocle.jobs
+    if cleanoutput:
+        monocle.ensure_clean_output()
+    result = analyze_shards(shards, jobs, path, monocle.max_source_bytes,
+                            monocle.tracer)
+    monocle.write_reports(result.slocgroup(), (result.cc, result.ccfailures),
+                          result.depgroup)
+    return result
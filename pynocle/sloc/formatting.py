@@ -1,5 +1,7 @@
 #!/usr/bin/env python
 
+import itertools
+import os
 import sys
 
 import _doc
@@ -13,10 +15,9 @@ def _fmtperc(i):
     return perc
 
 
-def _get_infostr(leadingpath):
-    s = _doc.about() + '\nShowing SLOC for files under %s.' % (
-        leadingpath.replace('\\', '/'))
-    return s
+def _get_infohtml(leadingpath):
+    return utils.doc_html(_doc.about(), 'Showing SLOC for files under %s.' % (
+        leadingpath.replace('\\', '/')))
 
 
 def _get_totals_row(slocgroup):
@@ -32,21 +33,41 @@ def _get_totals_row(slocgroup):
              totallines('total'), totallines('totalperc')]
 
 
-def _create_rows(slocgroup, leading_path):
-    """Returns a list of rows."""
-    rows = []
-    sortedbyfilename = sorted(
-        slocgroup.filenamesToSlocInfos.items(),
-        key=lambda kvp: kvp[0])
-    for filename, d in sortedbyfilename:
-        row = [utils.prettify_path(filename, leading_path),
+#Columns of the rows from iter_rows, for tableprint.IStreamingTable.
+COLUMNS = [('filename', 'string'),
+           ('code', 'number'),
+           ('codeperc', 'number'),
+           ('comment', 'number'),
+           ('commentperc', 'number'),
+           ('blank', 'number'),
+           ('blankperc', 'number'),
+           ('total', 'number'),
+           ('totalperc', 'number')]
+
+
+def iter_rows(slocgroup, leading_path):
+    """Yields a row for each file in slocgroup, sorted by filename,
+    with a value for each of COLUMNS.
+    Each row is made when it is needed."""
+    mapping = slocgroup.filenamesToSlocInfos
+    for filename in sorted(mapping):
+        d = mapping[filename]
+        name = utils.prettify_path(filename, leading_path)
+        ext = os.path.splitext(filename)[1]
+        if ext != '.py':
+            #Tell apart files of other languages with the same name.
+            name += ext
+        yield [name,
                d['code'], d['codeperc'],
                d['comment'], d['commentperc'],
                d['blank'], d['blankperc'],
                d['total'], d['totalperc']]
-        rows.append(row)
-    rows.append(_get_totals_row(slocgroup))
-    return rows
+
+
+def _create_rows(slocgroup, leading_path):
+    """Yields the rows of every file, then the TOTALS row."""
+    return itertools.chain(iter_rows(slocgroup, leading_path),
+                           [_get_totals_row(slocgroup)])
 
 
 class SlocGoogleChartFormatter(utils.IReportFormatter):
@@ -67,13 +88,13 @@ class SlocGoogleChartFormatter(utils.IReportFormatter):
                 ('Blank%', 'number'),
                 ('Total', 'number'),
                 ('Total%', 'number')]
-        self.chart = tableprint.GoogleChartTable('SLOC', cols)
+        self.chart = tableprint.PagedHtmlTable('SLOC', cols)
 
     def format_report_header(self):
         self.outstream().write(self.chart.first_part())
 
     def format_report_footer(self):
-        s = utils.rst_to_html(_get_infostr(self.leading_path))
+        s = _get_infohtml(self.leading_path)
         self.outstream().write(self.chart.last_part(abovetable=s))
 
     def _js_perc(self, value):
@@ -91,5 +112,6 @@ class SlocGoogleChartFormatter(utils.IReportFormatter):
                row[7], self._js_perc(row[8])]
 
     def format_data(self, slocgroup):
-        rows = map(self._stringify, _create_rows(slocgroup, self.leading_path))
-        self.outstream().write(self.chart.second_part(rows))
+        rows = itertools.imap(
+            self._stringify, _create_rows(slocgroup, self.leading_path))
+        self.chart.write_second_part(self.outstream(), rows)
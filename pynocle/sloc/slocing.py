@@ -1,5 +1,99 @@
 #!/usr/bin/env python
 
+import array
+import collections
+import itertools
+import mmap
+import os
+import re
+
+import pynocle.tracing as tracing
+import pynocle.utils as utils
+
+#Stage name used when releasing files from a sourceunits.SourceUnitStore.
+SOURCE_STAGE = 'sloc'
+
+#Files at least this large are memory-mapped instead of read into memory.
+MMAP_MIN_BYTES = 1024 * 1024
+
+#Whitespace other than newlines, the same characters str.isspace accepts.
+_WS = r'[ \t\r\x0b\x0c]*'
+
+#Classification of blank lines found by CommentSyntax.classifier.
+_BLANK = ''
+#Classification of lines inside a block comment.
+#Longer than one character, so it is never the start of a line.
+_INSIDE_BLOCK = '<inside block comment>'
+
+
+class CommentSyntax(object):
+    """The comment syntax of a language, used to classify lines
+    of its source files.
+
+    A line is blank if it contains only whitespace,
+    a comment if its first non-whitespace characters start a line comment
+    or block comment, or are inside a block comment,
+    and code otherwise.
+    A line that ends a block comment is a comment, even if code follows.
+    Comment markers inside strings are not recognized.
+
+    :param name: Name of the syntax.
+    :param linecomments: Collection of strings that start a comment that
+      runs to the end of the line, such as '#'.
+    :param blockcomments: Collection of (start, end) tuples of strings
+      that delimit comments that can span lines, such as ('/*', '*/').
+    """
+    def __init__(self, name, linecomments, blockcomments=()):
+        self.name = name
+        self.linecomments = tuple(linecomments)
+        self.blockcomments = tuple(blockcomments)
+        #One match per line, consuming the whole line.
+        #The captured group is the line's classification:
+        #the comment marker it starts with, its first character if it is
+        #code, or _BLANK.  Matching whole lines lets the regex engine
+        #scan straight through the file, without retrying at every byte.
+        self.markers = self.linecomments + tuple(
+            start for start, end in self.blockcomments)
+        alternatives = map(re.escape, self.markers) + ['.?']
+        self.classifier = re.compile(
+            '%s(%s)[^\n]*\n?' % (_WS, '|'.join(alternatives)))
+        self.blockfinder = None
+        if self.blockcomments:
+            #Line comments are matched too, so block comment markers
+            #inside them are skipped.
+            comments = ['%s[^\n]*' % re.escape(c) for c in self.linecomments]
+            comments.extend('%s.*?(?:%s|\Z)' % (re.escape(s), re.escape(e))
+                            for s, e in self.blockcomments)
+            self.blockfinder = re.compile('|'.join(comments), re.DOTALL)
+
+    def __repr__(self):
+        return 'CommentSyntax(%s)' % self.name
+
+    __str__ = __repr__
+
+
+PYTHON_SYNTAX = CommentSyntax('python', ['#'])
+C_SYNTAX = CommentSyntax('c', ['//'], [('/*', '*/')])
+CONFIG_SYNTAX = CommentSyntax('config', ['#', ';'])
+
+#Map of lowercase file extension to the CommentSyntax of its files.
+#Files with other extensions are counted as python.
+COMMENT_SYNTAXES = {
+    '.py': PYTHON_SYNTAX, '.pyw': PYTHON_SYNTAX,
+    '.pyx': PYTHON_SYNTAX, '.pxd': PYTHON_SYNTAX, '.pxi': PYTHON_SYNTAX,
+    '.c': C_SYNTAX, '.h': C_SYNTAX, '.cpp': C_SYNTAX, '.cc': C_SYNTAX,
+    '.cxx': C_SYNTAX, '.hpp': C_SYNTAX,
+    '.cfg': CONFIG_SYNTAX, '.ini': CONFIG_SYNTAX, '.conf': CONFIG_SYNTAX,
+    '.toml': PYTHON_SYNTAX, '.yaml': PYTHON_SYNTAX, '.yml': PYTHON_SYNTAX,
+    }
+
+
+def comment_syntax_for(filename):
+    """Returns the CommentSyntax for filename, based on its extension."""
+    ext = os.path.splitext(filename)[1].lower()
+    return COMMENT_SYNTAXES.get(ext, PYTHON_SYNTAX)
+
+
 class SlocInfo(object):
     """Simple data wrapper for SLOC info that can be accessed by attribute, key, or index.  Index order is code,
     comment, blank.
@@ -72,45 +166,330 @@ def count_lines(codelines):
     return SlocInfo(codecount, commentcount, blankcount)
 
 
+def _mark_block_comments(classes, data, syntax):
+    """Changes the classification of every non-blank line that starts
+    inside a block comment to a comment."""
+    lineno = 0
+    pos = 0
+    for match in syntax.blockfinder.finditer(data):
+        numnewlines = match.group().count('\n')
+        if not numnewlines:
+            #Line comments and single-line block comments only affect
+            #the line they start on.
+            continue
+        lineno += data[pos:match.start()].count('\n')
+        lastline = min(lineno + numnewlines, len(classes) - 1)
+        for i in xrange(lineno + 1, lastline + 1):
+            if classes[i] != _BLANK:
+                classes[i] = _INSIDE_BLOCK
+        lineno += numnewlines
+        pos = match.end()
+
+
+def count_bytes(data, syntax=PYTHON_SYNTAX):
+    """Returns a SlocInfo for the raw source in data.
+    Every line is classified by a single regular expression scan,
+    instead of looking at each line in python.
+
+    Lines end at '\\n'; a '\\r' is treated as whitespace.
+
+    :param data: A str or mmap of the file's contents.
+    :param syntax: CommentSyntax of the file's language.
+    """
+    classes = syntax.classifier.findall(data)
+    #The classifier also matches the empty string at the very end.
+    classes.pop()
+    if syntax.blockfinder is not None:
+        _mark_block_comments(classes, data, syntax)
+    blank = classes.count(_BLANK)
+    comment = classes.count(_INSIDE_BLOCK)
+    for marker in syntax.markers:
+        comment += classes.count(marker)
+    return SlocInfo(len(classes) - blank - comment, comment, blank)
+
+
 def count_file(filename):
-    """Returns a SlocInfo for the source code at filename."""
-    with open(filename) as f:
-        return count_lines(f.xreadlines())
+    """Returns a SlocInfo for the source code at filename,
+    using the CommentSyntax for its extension.
+    Large files are memory-mapped, rather than read into memory."""
+    syntax = comment_syntax_for(filename)
+    with open(filename, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        if size < MMAP_MIN_BYTES:
+            return count_bytes(f.read(), syntax)
+        data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            return count_bytes(data, syntax)
+        finally:
+            data.close()
+
+
+def count_unit(filename, store):
+    """Returns a SlocInfo for filename using the source of its SourceUnit in
+    store, and releases it from the store."""
+    try:
+        return count_bytes(store.get(filename).source,
+                           comment_syntax_for(filename))
+    finally:
+        store.release(filename, SOURCE_STAGE)
+
 
+def _count_file_or_unit(filename, store=None):
+    """Returns count_unit if store is provided, otherwise count_file."""
+    if store is None:
+        return count_file(filename)
+    return count_unit(filename, store)
 
-def count_files(filenames):
-    """Yields SlocInfos for each file in filenames."""
+
+def _count_files_cached(filenames, store, jobs, cache, tracer):
+    """Returns a list of SlocInfos for filenames from cache.
+    Files are cached separately for each CommentSyntax, since the same
+    contents are counted differently in different languages."""
+    filenames = list(filenames)
+    indices_by_syntax = {}
+    for i, filename in enumerate(filenames):
+        indices_by_syntax.setdefault(
+            comment_syntax_for(filename), []).append(i)
+    result = [None] * len(filenames)
+    for syntax, indices in indices_by_syntax.items():
+        #Python results are cached the same as before other syntaxes existed.
+        variant = '' if syntax is PYTHON_SYNTAX else syntax.name
+        slocinfos = cache.map(
+            SOURCE_STAGE, [filenames[i] for i in indices], _count_file_or_unit,
+            store, jobs, tracer, variant)
+        for i, si in zip(indices, slocinfos):
+            result[i] = si
+    return result
+
+
+def count_files(filenames, store=None, jobs=None, cache=None,
+                tracer=tracing.NULL_TRACER):
+    """Yields SlocInfos for each file in filenames.
+
+    store: If provided, a sourceunits.SourceUnitStore to read files from.
+        Not used if files are counted in worker processes.
+    jobs: Number of worker processes to count files in.  See utils.resolve_jobs.
+    cache: If provided, an analysiscache.AnalysisCache to load the SlocInfos
+        of unchanged files from.
+    tracer: tracing.Tracer to record a span for each file in.
+    """
+    if cache is not None:
+        for si in _count_files_cached(filenames, store, jobs, cache, tracer):
+            yield si
+        return
+    if utils.resolve_jobs(jobs) > 1:
+        with tracer.span('sloc pool', jobs=jobs):
+            slocinfos = utils.parallel_map(count_file, filenames, jobs)
+        for si in slocinfos:
+            yield si
+        return
     for f in filenames:
-        yield count_file(f)
+        with tracer.span(SOURCE_STAGE, filename=f):
+            si = _count_file_or_unit(f, store)
+        yield si
+
+
+class SlocRow(object):
+    """Lightweight view of one file's row in a SlocTable.
+    It can be accessed by attribute, key, or index the same as a
+    SlocInfoExt with a totalperc, but stores nothing itself.
+    """
+    __slots__ = ('table', 'index')
+
+    #Index order, same as SlocInfoExt.byinds.
+    KEYS = ('code', 'comment', 'blank', 'codeperc', 'commentperc',
+            'blankperc', 'total', 'totalperc')
+
+    def __init__(self, table, index):
+        self.table = table
+        self.index = index
+
+    def __repr__(self):
+        return 'SlocRow(%s)' % self.table.filenames[self.index]
+
+    __str__ = __repr__
+
+    code = property(lambda self: self.table.code[self.index])
+    comment = property(lambda self: self.table.comment[self.index])
+    blank = property(lambda self: self.table.blank[self.index])
+
+    @property
+    def total(self):
+        return self.code + self.comment + self.blank
+
+    def _perc(self, value):
+        return value / max(float(self.total), 1)
+
+    codeperc = property(lambda self: self._perc(self.code))
+    commentperc = property(lambda self: self._perc(self.comment))
+    blankperc = property(lambda self: self._perc(self.blank))
+
+    @property
+    def totalperc(self):
+        return self.total / max(float(self.table.sumtotal()), 1)
+
+    @property
+    def byinds(self):
+        return tuple(getattr(self, key) for key in self.KEYS)
+
+    @property
+    def bykey(self):
+        return dict((key, getattr(self, key)) for key in self.KEYS)
+
+    def __getitem__(self, item):
+        if isinstance(item, basestring):
+            if item not in self.KEYS:
+                raise KeyError(item)
+            return getattr(self, item)
+        elif isinstance(item, int):
+            return getattr(self, self.KEYS[item])
+        raise AttributeError, str(item) + ' could not be used as an index or key.'
+
+
+class SlocTable(object):
+    """Column store of SLOC results.
+    The code, comment, and blank line counts of every file are stored
+    in one array each, instead of as objects per file.
+    Percentages are calculated from whole columns at once.
+
+    :param filenames: Filenames to populate with.
+    :param slocinfos: SlocInfo for each of filenames.
+    """
+    _COUNT_KEYS = ('code', 'comment', 'blank')
+
+    def __init__(self, filenames=(), slocinfos=()):
+        self.filenames = []
+        self.code = array.array('i')
+        self.comment = array.array('i')
+        self.blank = array.array('i')
+        self._sumtotal = 0
+        for filename, slocinfo in itertools.izip(filenames, slocinfos):
+            self.append(filename, slocinfo)
+
+    def __len__(self):
+        return len(self.filenames)
+
+    def append(self, filename, slocinfo):
+        self.filenames.append(filename)
+        self.code.append(slocinfo.code)
+        self.comment.append(slocinfo.comment)
+        self.blank.append(slocinfo.blank)
+        self._sumtotal += slocinfo.code + slocinfo.comment + slocinfo.blank
+
+    def extend(self, other):
+        """Appends every row of the SlocTable other,
+        a whole column at a time."""
+        self.filenames.extend(other.filenames)
+        self.code.extend(other.code)
+        self.comment.extend(other.comment)
+        self.blank.extend(other.blank)
+        self._sumtotal += other._sumtotal
+
+    @classmethod
+    def merge(cls, tables):
+        """Returns a new SlocTable of the rows of each of tables, in order,
+        such as the partial results of analyzing separate sets of files."""
+        result = cls()
+        for table in tables:
+            result.extend(table)
+        return result
+
+    def row(self, index):
+        """Returns a SlocRow for the file at index."""
+        return SlocRow(self, index)
+
+    def sumtotal(self):
+        """Returns the total number of lines of all files."""
+        return self._sumtotal
+
+    def column(self, key):
+        """Returns a numpy array of the values of key (any of SlocRow.KEYS)
+        for every file."""
+        if key in self._COUNT_KEYS:
+            return utils.array_to_numpy(getattr(self, key))
+        total = (self.column('code') + self.column('comment') +
+                 self.column('blank'))
+        if key == 'total':
+            return total
+        if key == 'totalperc':
+            return total / max(float(self.sumtotal()), 1)
+        if key in ('codeperc', 'commentperc', 'blankperc'):
+            counts = self.column(key[:-len('perc')])
+            return counts / total.clip(1, None).astype(float)
+        raise KeyError(key)
+
+    def totallines(self, key='total'):
+        """Returns the sum of key (any of SlocRow.KEYS) over all files,
+        counting a file that is in the table more than once only once.
+        Values are added up in the order of a dict keyed by filename,
+        the same as SlocGroup always has, so the totals of percentages
+        come out the same to the last digit."""
+        byfilename = dict(itertools.izip(self.filenames,
+                                         self.column(key).tolist()))
+        return sum(byfilename.itervalues())
+
+
+class _SlocRowMapping(collections.Mapping):
+    """Read-only dict of filename to the SlocRow for it in a SlocTable.
+    If a filename is in the table more than once, its last row is used."""
+    def __init__(self, table):
+        self.table = table
+        self._indices = dict(
+            (filename, i) for i, filename in enumerate(table.filenames))
+
+    def __getitem__(self, filename):
+        return self.table.row(self._indices[filename])
+
+    def __iter__(self):
+        return iter(self._indices)
+
+    def __len__(self):
+        return len(self._indices)
 
 
 class SlocGroup(object):
-    """Stores a dictionary at self.filenamesToSlocInfos where the keys are filenames and each value is a SlocInfoExt.
-    The SlocInfo objects in the values of SlocGroup.filenamesToSlocInfos will be SlocInfoExt instances with a
-    totalperc attribute which represents the percentage of the total lines in the
-    SlocGroup that are contained in the file.
+    """Stores the SLOC of filenames in a SlocTable at self.table.
+    self.filenamesToSlocInfos is a read-only dictionary where the keys are
+    filenames and each value is a SlocRow view, with the same attributes as
+    a SlocInfoExt plus a totalperc attribute which represents the percentage
+    of the total lines in the SlocGroup that are contained in the file.
 
     filenames: A collection of filenames to populate with.
     slocinfos: A collection of SlocInfo for each filename.  If not provided, calculate the SlocInfo for each
-        filename on initialization.  If values is provided, use that instead.  SlocInfoExt will be derived from
-        them (and they'll have a totalperc/property).
+        filename on initialization.  If values is provided, use that instead.
+    store: If provided, a sourceunits.SourceUnitStore to read files from.
+    jobs: Number of worker processes to count files in.  See utils.resolve_jobs.
+    cache: If provided, an analysiscache.AnalysisCache to load the SlocInfos
+        of unchanged files from.
+    tracer: tracing.Tracer to record a span for each file in.
     """
-    def __init__(self, filenames, slocinfos=None):
-        valuesext = []
-        for si in slocinfos or list(count_files(filenames)):
-            valuesext.append(to_slocinfoext(si)) #We need to use ext for the 'total' attribute below.
-        sumtotal = float(sum(map(lambda x: x.total, valuesext)))
-        self.filenamesToSlocInfos = {}
-        for i in range(len(filenames)):
-            sie = valuesext[i]
-            #update it with totalperc
-            self.filenamesToSlocInfos[filenames[i]] = to_slocinfoext(sie, kvps=[('totalperc', sie.total / sumtotal)])
+    def __init__(self, filenames, slocinfos=None, store=None, jobs=None,
+                 cache=None, tracer=tracing.NULL_TRACER):
+        slocinfos = slocinfos or count_files(
+            filenames, store, jobs, cache, tracer)
+        self._set_table(SlocTable(filenames, slocinfos))
+
+    def _set_table(self, table):
+        self.table = table
+        self.filenamesToSlocInfos = _SlocRowMapping(table)
+
+    @classmethod
+    def from_table(cls, table):
+        """Returns a SlocGroup of the files in a SlocTable,
+        without counting anything."""
+        group = cls.__new__(cls)
+        group._set_table(table)
+        return group
+
+    @classmethod
+    def merge(cls, groups):
+        """Returns a SlocGroup of every file in each of groups, in order.
+        Percentages are of the total lines of all of them."""
+        return cls.from_table(SlocTable.merge([g.table for g in groups]))
 
     def totallines(self, key='total'):
         """Return the total number of lines in the group.
 
-        key: The SlocInfoExt key to get the total of.  Default is to return sum total of all lines.
+        key: The SlocRow key to get the total of.  Default is to return sum total of all lines.
         """
-        values = map(lambda x: x[key], self.filenamesToSlocInfos.values())
-        sumtotal = sum(values)
-        return sumtotal
+        return self.table.totallines(key)
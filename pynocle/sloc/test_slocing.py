@@ -0,0 +1,123 @@
+#!/usr/bin/env python
+
+import os
+import tempfile
+import unittest
+
+import pynocle.sloc.slocing as slocing
+
+
+PYSOURCE = '''#!/usr/bin/env python
+"""Docstrings are code."""
+
+    # indented comment
+x = 1 # trailing comment is code
+\t
+def f():
+    return '#'
+   '''
+
+
+class TestCountBytes(unittest.TestCase):
+    def assertSloc(self, slocinfo, code, comment, blank):
+        self.assertEqual(slocinfo.byinds, (code, comment, blank))
+
+    def testSameAsCountLines(self):
+        """Test that python source is counted the same as count_lines."""
+        for source in [PYSOURCE, PYSOURCE + '\n', PYSOURCE.strip(), '',
+                       '\n', 'x', '#', '  \r\n\r\n#x\r\ny\r\n']:
+            expected = slocing.count_lines(source.splitlines(True))
+            self.assertEqual(slocing.count_bytes(source).byinds,
+                             expected.byinds, repr(source))
+
+    def testBlockComments(self):
+        source = ('#include <x.h>\n'
+                  '/* block\n'
+                  '   comment\n'
+                  '\n'
+                  '   more */\n'
+                  'int x; /* trailing\n'
+                  ' still comment */\n'
+                  '  // line comment /* not a block\n'
+                  'int y;\n')
+        self.assertSloc(slocing.count_bytes(source, slocing.C_SYNTAX), 3, 5, 1)
+
+    def testSyntaxByExtension(self):
+        self.assertTrue(
+            slocing.comment_syntax_for('a/b.H') is slocing.C_SYNTAX)
+        self.assertTrue(
+            slocing.comment_syntax_for('setup.cfg') is slocing.CONFIG_SYNTAX)
+        self.assertTrue(
+            slocing.comment_syntax_for('a.txt') is slocing.PYTHON_SYNTAX)
+
+
+class TestCountFile(unittest.TestCase):
+    def setUp(self):
+        fd, self.filename = tempfile.mkstemp('.py')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(PYSOURCE * 100)
+        self.expected = slocing.count_bytes(PYSOURCE * 100).byinds
+
+    def tearDown(self):
+        os.remove(self.filename)
+
+    def testRead(self):
+        self.assertEqual(slocing.count_file(self.filename).byinds,
+                         self.expected)
+
+    def testMemoryMapped(self):
+        """Test that large files are counted the same when mapped."""
+        old = slocing.MMAP_MIN_BYTES
+        slocing.MMAP_MIN_BYTES = 1
+        try:
+            self.assertEqual(slocing.count_file(self.filename).byinds,
+                             self.expected)
+        finally:
+            slocing.MMAP_MIN_BYTES = old
+
+
+class TestSlocTable(unittest.TestCase):
+    def setUp(self):
+        self.table = slocing.SlocTable(
+            ['a.py', 'b.py', 'empty.py'],
+            [slocing.SlocInfo(6, 2, 2), slocing.SlocInfo(10, 0, 0),
+             slocing.SlocInfo(0, 0, 0)])
+
+    def testRowsSameAsSlocInfoExt(self):
+        """Test that rows have the same values as SlocInfoExt."""
+        row = self.table.row(0)
+        expected = slocing.SlocInfoExt(6, 2, 2)
+        for key in slocing.SlocRow.KEYS[:-1]:
+            self.assertEqual(row[key], expected[key])
+        self.assertEqual(row.totalperc, 0.5)
+        self.assertEqual(self.table.row(2).codeperc, 0)
+
+    def testTotals(self):
+        """Test that totals are summed from the columns."""
+        self.assertEqual(self.table.totallines('code'), 16)
+        self.assertEqual(self.table.totallines(), 20)
+        self.assertAlmostEqual(self.table.totallines('codeperc'), 1.6)
+        self.assertAlmostEqual(self.table.totallines('totalperc'), 1)
+        self.assertEqual(list(self.table.column('blankperc')), [0.2, 0, 0])
+
+    def testTotalsSummedByFilename(self):
+        """Test that percentages are totalled in the order of a dict of
+        filename to value, so totals are the same to the last digit."""
+        filenames = ['f%s.py' % i for i in range(50)]
+        slocinfos = [slocing.SlocInfo(i % 7 + 1, i % 3, i % 5)
+                     for i in range(50)]
+        table = slocing.SlocTable(filenames, slocinfos)
+        for key in 'codeperc', 'commentperc', 'blankperc', 'totalperc':
+            expected = sum(dict(
+                (f, table.row(i)[key]) for i, f in enumerate(filenames)
+            ).values())
+            self.assertEqual(table.totallines(key), expected)
+
+    def testMerge(self):
+        """Test that merged tables have every row and the combined total."""
+        other = slocing.SlocTable(['c.py'], [slocing.SlocInfo(1, 2, 1)])
+        merged = slocing.SlocTable.merge([self.table, other])
+        self.assertEqual(merged.filenames, ['a.py', 'b.py', 'empty.py', 'c.py'])
+        self.assertEqual(merged.totallines(), 24)
+        self.assertEqual(merged.row(3).comment, 2)
+        self.assertEqual(len(self.table), 3)
@@ -0,0 +1,183 @@
+#!/usr/bin/env python
+"""
+Per-run storage of source files, so that each file is read and parsed
+only once no matter how many metrics need it.
+
+A `SourceUnitStore` is created for a run and passed to each metric.
+Every metric identifies itself with a stage name when it is done with a file,
+and once all registered stages are done with a file, it is dropped from
+the store.
+"""
+
+import collections
+import os
+
+import pynocle.utils as utils
+
+compiler = utils.LazyModule('compiler')
+
+#Default approximate memory budget for a SourceUnitStore, in bytes.
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+#compiler ASTs are many times larger than the source they were parsed from.
+#Used to estimate the memory of a unit before it is parsed.
+_AST_SIZE_FACTOR = 12
+
+
+def _universal_newlines(source):
+    """Returns source with all line endings converted to '\\n',
+    same as reading a file with mode 'U'."""
+    return source.replace('\r\n', '\n').replace('\r', '\n')
+
+
+class SourceUnit(object):
+    """The raw bytes, lines, and AST of a single source file.
+    Lines and AST are computed lazily the first time they are asked for.
+
+    :param filename: Path of the file.
+    :param source: Raw contents of the file.  If None, read from filename.
+    """
+    def __init__(self, filename, source=None):
+        self.filename = filename
+        if source is None:
+            with open(filename, 'rb') as f:
+                source = f.read()
+        self.source = source
+        self._lines = None
+        self._ast = None
+        self._syntaxerror = None
+
+    def __repr__(self):
+        return 'SourceUnit(%s)' % self.filename
+
+    __str__ = __repr__
+
+    @property
+    def lines(self):
+        """List of lines in the file, including line endings."""
+        if self._lines is None:
+            self._lines = self.source.splitlines(True)
+        return self._lines
+
+    @property
+    def ast(self):
+        """The compiler.ast.Module for the file.
+        Raises SyntaxError if the file could not be parsed
+        (every time it is asked for, not only the first time).
+        """
+        if self._syntaxerror is not None:
+            raise self._syntaxerror
+        if self._ast is None:
+            try:
+                self._ast = compiler.parse(
+                    _universal_newlines(self.source) + '\n')
+            except SyntaxError as exc:
+                self._syntaxerror = exc
+                raise
+        return self._ast
+
+    def estimated_size(self):
+        """Returns the approximate number of bytes this unit occupies
+        once it is fully parsed."""
+        return len(self.source) * (2 + _AST_SIZE_FACTOR)
+
+
+class SourceUnitStore(object):
+    """Holds SourceUnits for a single run of metric generation.
+
+    Files passed to `register` are kept until every stage has called
+    `release` for them.  Files that were never registered
+    (such as modules outside the project that are traversed for dependencies)
+    are dropped as soon as any stage releases them.
+    If the estimated size of all units exceeds max_bytes,
+    the least recently used units are dropped,
+    and will be re-read if they are asked for again.
+
+    :param stages: Names of all stages that will read registered files.
+    :param max_bytes: Approximate memory budget, in bytes.
+    """
+    def __init__(self, stages=(), max_bytes=DEFAULT_MAX_BYTES):
+        self.stages = frozenset(stages)
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.loads = 0
+        self.evictions = 0
+        self._units = collections.OrderedDict()
+        self._pending = {}
+
+    def __contains__(self, filename):
+        return os.path.abspath(filename) in self._units
+
+    def __len__(self):
+        return len(self._units)
+
+    def register(self, filenames, stages=None):
+        """Register filenames as needed by stages (all stages if None),
+        in addition to any stages they were already registered for."""
+        stages = self.stages if stages is None else frozenset(stages)
+        for f in filenames:
+            self._pending.setdefault(os.path.abspath(f), set()).update(stages)
+
+    def get(self, filename):
+        """Returns the SourceUnit for filename,
+        reading the file if it is not in the store.
+        Raises IOError if the file cannot be read."""
+        key = os.path.abspath(filename)
+        unit = self._units.pop(key, None)
+        if unit is None:
+            unit = SourceUnit(key)
+            self.loads += 1
+            self.nbytes += unit.estimated_size()
+        self._units[key] = unit #Reinsert so it is the most recently used.
+        self._enforce_budget(keep=key)
+        return unit
+
+    def release(self, filename, stage):
+        """Indicate that stage is done with filename.
+        If no other stage needs filename, drop it from the store."""
+        key = os.path.abspath(filename)
+        pending = self._pending.get(key)
+        if pending is not None:
+            pending.discard(stage)
+            if pending:
+                return
+            del self._pending[key]
+        self._evict(key)
+
+    def clear(self):
+        """Drop all units and registrations."""
+        self._units.clear()
+        self._pending.clear()
+        self.nbytes = 0
+
+    def _evict(self, key):
+        unit = self._units.pop(key, None)
+        if unit is not None:
+            self.nbytes -= unit.estimated_size()
+            self.evictions += 1
+
+    def _enforce_budget(self, keep):
+        """Drop least recently used units until we are under budget.
+        Never drops the unit at `keep`."""
+        while self.nbytes > self.max_bytes and len(self._units) > 1:
+            oldest = next(iter(self._units))
+            if oldest == keep:
+                break
+            self._evict(oldest)
+
+
+def parse(filename, stage, store=None):
+    """Returns the compiler.ast.Module for filename.
+    Raises SyntaxError if it cannot be parsed.
+
+    :param stage: Name of the stage that is done with filename
+      once it is parsed.
+    :param store: If provided, a SourceUnitStore to get the AST from.
+      filename is released from it for stage afterwards.
+    """
+    if store is None:
+        return compiler.parseFile(filename)
+    try:
+        return store.get(filename).ast
+    finally:
+        store.release(filename, stage)
@@ -1,8 +1,34 @@
 #!/usr/bin/env python
 """
 Module that handles the formatting of table information.
+
+PagedHtmlTable writes a self-contained html page for people to read,
+and GoogleChartTable one that loads Google Chart Tools to draw the table.
+JsonLinesTable, CsvTable, and SqliteTable write rows for other programs
+to read, one batch at a time, so rows can be streamed from a generator
+without ever being in memory all at once.
 """
 
+import abc
+import cgi
+import itertools
+
+import pynocle.utils as utils
+
+#Number of rows written at a time by the streaming tables.
+BATCH_SIZE = 500
+
+
+def iter_batches(rows, size=BATCH_SIZE):
+    """Yields lists of up to size items of the iterable rows, in order."""
+    rows = iter(rows)
+    while True:
+        batch = list(itertools.islice(rows, size))
+        if not batch:
+            return
+        yield batch
+
+
 class GoogleChartTable(object):
     """Helper for writing out table data using Google Chart Tools.
 
@@ -47,6 +73,15 @@ class GoogleChartTable(object):
         entrystr = '        data.addRow(%s);\n'
         return '\n'.join([entrystr % row for row in rows])
 
+    def write_second_part(self, out, rows):
+        """Writes the same as second_part to the stream out,
+        one batch of rows at a time,
+        so rows can be a generator that is never all in memory."""
+        sep = ''
+        for batch in iter_batches(rows):
+            out.write(sep + self.second_part(batch))
+            sep = '\n'
+
     def last_part(self, abovetable='', belowtable=''):
         """Returns the final part of the html file for a table as a string.
         This includes the actual drawing,
@@ -66,3 +101,331 @@ class GoogleChartTable(object):
     %s<div id='table_div'></div>%s
   </body>
 </html>""" % (self.table_var, abovetable, belowtable)
+
+
+class IStreamingTable(object):
+    """Writes rows of a table for programs to read.
+    Call begin, then write_rows any number of times, then end.
+
+    :param colnames_and_types: Same as for GoogleChartTable,
+      but names should be identifiers, like 'code' or 'filename'.
+    """
+    __metaclass__ = abc.ABCMeta
+
+    def __init__(self, colnames_and_types):
+        self.colnames_and_types = colnames_and_types
+        self.colnames = [name for name, _ in colnames_and_types]
+
+    def begin(self):
+        """Writes anything needed before the first row."""
+
+    @abc.abstractmethod
+    def write_rows(self, rows):
+        """Writes each row (a sequence with a value per column)
+        of the iterable rows."""
+
+    def end(self):
+        """Writes anything needed after the last row."""
+
+
+class JsonLinesTable(IStreamingTable):
+    """Writes each row to the stream out as a JSON object
+    of {column name: value} on its own line."""
+    def __init__(self, out, colnames_and_types):
+        IStreamingTable.__init__(self, colnames_and_types)
+        self.out = out
+
+    def write_rows(self, rows):
+        import json
+        encode = json.JSONEncoder().encode
+        #Keys are written in column order, which a dict would not keep.
+        keys = [encode(name) + ': ' for name in self.colnames]
+        for batch in iter_batches(rows):
+            lines = []
+            for row in batch:
+                lines.append('{%s}\n' % ', '.join(
+                    k + encode(v) for k, v in itertools.izip(keys, row)))
+            self.out.write(''.join(lines))
+
+
+class CsvTable(IStreamingTable):
+    """Writes the column names, then each row, to the stream out as CSV."""
+    def __init__(self, out, colnames_and_types):
+        IStreamingTable.__init__(self, colnames_and_types)
+        import csv
+        self.writer = csv.writer(out, lineterminator='\n')
+
+    def begin(self):
+        self.writer.writerow(self.colnames)
+
+    def write_rows(self, rows):
+        for batch in iter_batches(rows):
+            self.writer.writerows(batch)
+
+
+_SQLITE_TYPES = {'string': 'TEXT', 'number': 'REAL'}
+
+
+class SqliteTable(IStreamingTable):
+    """Writes rows to the table tablename in a SQLite database,
+    replacing any table already there.
+    Rows are inserted in bulk, a batch at a time,
+    all in one transaction that is committed by end.
+
+    :param connection: sqlite3.Connection, or the filename of a
+      database to open (and close in end).
+    :param tablename: Name of the table, which should be an identifier.
+    """
+    def __init__(self, connection, tablename, colnames_and_types):
+        IStreamingTable.__init__(self, colnames_and_types)
+        self.tablename = tablename
+        self._owns_connection = isinstance(connection, basestring)
+        if self._owns_connection:
+            import sqlite3
+            connection = sqlite3.connect(connection)
+        self.connection = connection
+
+    def begin(self):
+        cols = ', '.join('%s %s' % (name, _SQLITE_TYPES.get(coltype, ''))
+                         for name, coltype in self.colnames_and_types)
+        self.connection.execute('DROP TABLE IF EXISTS %s' % self.tablename)
+        self.connection.execute(
+            'CREATE TABLE %s (%s)' % (self.tablename, cols))
+
+    def write_rows(self, rows):
+        sql = 'INSERT INTO %s VALUES (%s)' % (
+            self.tablename, ', '.join('?' * len(self.colnames)))
+        for batch in iter_batches(rows):
+            self.connection.executemany(sql, batch)
+
+    def end(self):
+        self.connection.commit()
+        if self._owns_connection:
+            self.connection.close()
+
+
+class StreamingFormatter(utils.IReportFormatter):
+    """Report formatter that writes the rows of a report to an
+    IStreamingTable as they are generated.
+
+    :param table: IStreamingTable to write to.
+    :param iter_rows: Callable that takes the data passed to
+      format_data and returns an iterable of rows for table.
+    """
+    def __init__(self, table, iter_rows):
+        self.table = table
+        self.iter_rows = iter_rows
+
+    def outstream(self):
+        return getattr(self.table, 'out', None)
+
+    def format_report_header(self):
+        self.table.begin()
+
+    def format_data(self, data):
+        self.table.write_rows(self.iter_rows(data))
+
+    def format_report_footer(self):
+        self.table.end()
+
+
+def _json_default(obj):
+    """Converts numpy scalars, which json cannot encode, to python ones."""
+    if hasattr(obj, 'item'):
+        return obj.item()
+    raise TypeError('%r is not JSON serializable' % obj)
+
+
+_PAGED_HEAD = """<html>
+  <head>
+    <meta charset="utf-8">
+    <title>%(title)s</title>
+    <link rel="stylesheet" type="text/css" href="pynocle.css" media="screen" />
+    <style type="text/css">
+      #table_div table { border-collapse: collapse; font-size: small; }
+      #table_div th, #table_div td { border: 1px solid #ccc; padding: 2px 6px; }
+      #table_div th { background-color: #e2ebff; cursor: pointer; }
+      #table_div td.number { text-align: right; }
+      #table_div .pager { margin: 4px 0; }
+    </style>
+  </head>
+
+  <body>
+"""
+
+_PAGED_SCRIPT = """
+    <script type="text/javascript">
+    (function() {
+      var cols = %(columns)s, pageSize = %(pagesize)s;
+      var rows = [], chunks = document.getElementsByTagName('script');
+      for (var i = 0; i < chunks.length; i++) {
+        if (chunks[i].className === 'pynocle-rows') {
+          rows.push.apply(rows, JSON.parse(chunks[i].text));
+        }
+      }
+      var isObj = function(c) { return c !== null && typeof c === 'object'; };
+      var value = function(c) { return isObj(c) ? c.v : c; };
+      var text = function(c) { return isObj(c) ? c.f : String(c); };
+      var view = rows, page = 0, sortCol = -1, ascending = true;
+      var root = document.getElementById('table_div');
+      var el = function(tag, txt) {
+        var e = document.createElement(tag);
+        if (txt !== undefined) { e.appendChild(document.createTextNode(txt)); }
+        return e;
+      };
+      var pager = el('div'), filter = el('input'), label = el('span');
+      pager.className = 'pager';
+      filter.placeholder = 'Filter';
+      var buttons = {};
+      var addButton = function(name, txt) {
+        buttons[name] = el('button', txt);
+        pager.appendChild(buttons[name]);
+      };
+      pager.appendChild(filter);
+      addButton('first', '<<');
+      addButton('prev', '<');
+      addButton('next', '>');
+      addButton('last', '>>');
+      pager.appendChild(label);
+      var table = el('table'), head = el('tr'), body = el('tbody');
+      head.appendChild(el('th', ''));
+      for (var c = 0; c < cols.length; c++) {
+        var th = el('th', cols[c][0]);
+        th.onclick = (function(c) { return function() { sortBy(c); }; })(c);
+        head.appendChild(th);
+      }
+      var thead = el('thead');
+      thead.appendChild(head);
+      table.appendChild(thead);
+      table.appendChild(body);
+      root.appendChild(pager);
+      root.appendChild(table);
+      var numPages = function() {
+        return Math.max(1, Math.ceil(view.length / pageSize));
+      };
+      var draw = function() {
+        var start = page * pageSize;
+        var end = Math.min(start + pageSize, view.length);
+        var newBody = el('tbody');
+        for (var r = start; r < end; r++) {
+          var tr = el('tr');
+          tr.appendChild(el('td', String(r + 1)));
+          for (var c = 0; c < cols.length; c++) {
+            var td = el('td', text(view[r][c]));
+            td.className = cols[c][1];
+            tr.appendChild(td);
+          }
+          newBody.appendChild(tr);
+        }
+        table.replaceChild(newBody, body);
+        body = newBody;
+        label.firstChild && label.removeChild(label.firstChild);
+        label.appendChild(document.createTextNode(
+          ' Rows ' + (view.length ? start + 1 : 0) + '-' + end + ' of ' +
+          view.length + (view === rows ? '' : ' (' + rows.length + ' total)') +
+          ', page ' + (page + 1) + ' of ' + numPages()));
+      };
+      var sortView = function() {
+        var sign = ascending ? 1 : -1;
+        view.sort(function(a, b) {
+          var x = value(a[sortCol]), y = value(b[sortCol]);
+          return x < y ? -sign : (x > y ? sign : 0);
+        });
+      };
+      var sortBy = function(c) {
+        ascending = sortCol === c ? !ascending : true;
+        sortCol = c;
+        if (view === rows) { view = rows.slice(); }
+        sortView();
+        page = 0;
+        draw();
+      };
+      var applyFilter = function() {
+        var q = filter.value.toLowerCase();
+        view = !q ? rows : rows.filter(function(row) {
+          for (var c = 0; c < row.length; c++) {
+            if (text(row[c]).toLowerCase().indexOf(q) >= 0) { return true; }
+          }
+          return false;
+        });
+        if (sortCol >= 0) {
+          if (view === rows) { view = rows.slice(); }
+          sortView();
+        }
+        page = 0;
+        draw();
+      };
+      var timer = null;
+      filter.onkeyup = function() {
+        clearTimeout(timer);
+        timer = setTimeout(applyFilter, 200);
+      };
+      var goTo = function(p) {
+        page = Math.max(0, Math.min(p, numPages() - 1));
+        draw();
+      };
+      buttons.first.onclick = function() { goTo(0); };
+      buttons.prev.onclick = function() { goTo(page - 1); };
+      buttons.next.onclick = function() { goTo(page + 1); };
+      buttons.last.onclick = function() { goTo(numPages() - 1); };
+      draw();
+    })();
+    </script>
+"""
+
+
+class PagedHtmlTable(object):
+    """Writes a table as a self-contained html page that
+    pages, sorts, and filters its rows in the browser,
+    with no external scripts.
+
+    Has the same methods as GoogleChartTable, and takes the same rows,
+    where a cell can be a {'v': value, 'f': formatted string} dict
+    to sort by value but show the formatted string.
+    Rows are written as compact JSON, one chunk of rows at a time,
+    and only one page of rows is in the document at once.
+
+    :param title: The title of the page.
+    :param colnames_and_types: Same as for GoogleChartTable.
+    :param pagesize: Number of rows on each page.
+    """
+    def __init__(self, title, colnames_and_types, pagesize=100):
+        self.title = title
+        self.colnames_and_types = colnames_and_types
+        self.pagesize = pagesize
+
+    def first_part(self):
+        """Returns the start of the html page, before any rows."""
+        return _PAGED_HEAD % {'title': cgi.escape(self.title)}
+
+    def _chunk(self, rows):
+        import json
+        data = json.dumps(rows, separators=(',', ':'), default=_json_default)
+        #So a string in the data cannot close the script element.
+        data = data.replace('</', '<\\/')
+        return ('    <script type="application/json" class="pynocle-rows">'
+                '%s</script>\n' % data)
+
+    def second_part(self, rows):
+        """Returns rows as a chunk of JSON data."""
+        return self._chunk(list(rows))
+
+    def write_second_part(self, out, rows):
+        """Writes rows to the stream out, one chunk of JSON at a time,
+        so rows can be a generator that is never all in memory."""
+        for batch in iter_batches(rows):
+            out.write(self._chunk(batch))
+
+    def last_part(self, abovetable='', belowtable=''):
+        """Returns the rest of the html page, with the table and the
+        script that draws it.
+
+        :param abovetable: Any HTML to include above the table.
+        :param belowtable: Any HTML to include below the table.
+        """
+        import json
+        columns = json.dumps([list(ct) for ct in self.colnames_and_types])
+        script = _PAGED_SCRIPT % {'columns': columns.replace('</', '<\\/'),
+                                  'pagesize': int(self.pagesize)}
+        return ('    %s<div id="table_div"></div>%s\n%s  </body>\n</html>' % (
+            abovetable, belowtable, script))
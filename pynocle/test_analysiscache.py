@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import pynocle.analysiscache as analysiscache
+import pynocle.cyclcompl as cyclcompl
+import pynocle.inheritance as inheritance
+
+
+def _count_chars(filename, store=None):
+    with open(filename) as f:
+        return len(f.read())
+
+
+class TestAnalysisCache(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.cachedir = os.path.join(self.tempdir, 'cache')
+        self.filename = os.path.join(self.tempdir, 'spam.py')
+        self.write('import os\n')
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    def write(self, contents):
+        with open(self.filename, 'w') as f:
+            f.write(contents)
+
+    def testHitsUnchanged(self):
+        """Test that an unchanged file is loaded from the cache."""
+        analysiscache.AnalysisCache(self.cachedir).map(
+            'chars', [self.filename], _count_chars)
+        cache = analysiscache.AnalysisCache(self.cachedir)
+        result = cache.map('chars', [self.filename], _count_chars)
+        self.assertEqual(result, [10])
+        self.assertEqual((cache.hits, cache.misses), (1, 0))
+
+    def testMissesChanged(self):
+        """Test that a changed file is recomputed."""
+        cache = analysiscache.AnalysisCache(self.cachedir)
+        cache.map('chars', [self.filename], _count_chars)
+        self.write('import sys, os\n')
+        result = cache.map('chars', [self.filename], _count_chars)
+        self.assertEqual(result, [15])
+        self.assertEqual((cache.hits, cache.misses), (0, 2))
+
+    def testKeyedByVersionAndKind(self):
+        """Test that the version and kind are part of the key."""
+        a = analysiscache.AnalysisCache(self.cachedir, version='1')
+        b = analysiscache.AnalysisCache(self.cachedir, version='2')
+        self.assertNotEqual(a.key('sloc', 'x'), b.key('sloc', 'x'))
+        self.assertNotEqual(a.key('sloc', 'x'), a.key('imports', 'x'))
+
+    def testSameContentsDifferentNames(self):
+        """Test that results that include the file's name are not shared
+        by files with the same contents."""
+        one = os.path.join(self.tempdir, 'one.py')
+        two = os.path.join(self.tempdir, 'two.py')
+        for filename in one, two:
+            with open(filename, 'w') as f:
+                f.write('class Spam(object):\n    pass\n')
+        cache = analysiscache.AnalysisCache(self.cachedir)
+        for _ in range(2):
+            table, _ = cyclcompl.measure_cyclcompl([one, two], cache=cache)
+            self.assertEqual([row[2] for row in table.rows()
+                              if row[1] == 'File'], ['one', 'two'])
+            classinfos = inheritance.InheritanceBuilder(
+                [one, two], cache=cache).classinfos()
+            self.assertEqual([ci.filename for ci in classinfos], [one, two])
+        self.assertEqual(cache.hits, 4)
@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+
+import json
+import os
+import shutil
+import sqlite3
+import StringIO
+import tempfile
+import unittest
+
+import pynocle.depgraph as depgraph
+import pynocle.exporting as exporting
+import pynocle.sloc.slocing as slocing
+import pynocle.tableprint as tableprint
+
+
+class TestStreamingTables(unittest.TestCase):
+    columns = [('name', 'string'), ('value', 'number')]
+
+    def rows(self):
+        """Rows as a generator, the way engines stream them."""
+        for i in range(tableprint.BATCH_SIZE + 2):
+            yield ['n%s' % i, i * 0.5]
+
+    def testJsonLines(self):
+        out = StringIO.StringIO()
+        table = tableprint.JsonLinesTable(out, self.columns)
+        table.write_rows(self.rows())
+        lines = out.getvalue().splitlines()
+        self.assertEqual(len(lines), tableprint.BATCH_SIZE + 2)
+        self.assertEqual(json.loads(lines[-1]),
+                         {'name': 'n%s' % (tableprint.BATCH_SIZE + 1),
+                          'value': (tableprint.BATCH_SIZE + 1) * 0.5})
+        self.assertTrue(lines[0].startswith('{"name": '))
+
+    def testCsv(self):
+        out = StringIO.StringIO()
+        table = tableprint.CsvTable(out, self.columns)
+        table.begin()
+        table.write_rows(self.rows())
+        lines = out.getvalue().splitlines()
+        self.assertEqual(lines[:2], ['name,value', 'n0,0.0'])
+        self.assertEqual(len(lines), tableprint.BATCH_SIZE + 3)
+
+    def testSqlite(self):
+        """Test that rows are inserted and the table is replaced."""
+        conn = sqlite3.connect(':memory:')
+        for _ in range(2):
+            table = tableprint.SqliteTable(conn, 'things', self.columns)
+            table.begin()
+            table.write_rows(self.rows())
+            table.end()
+        count, total = conn.execute(
+            'SELECT COUNT(*), SUM(value) FROM things').fetchone()
+        self.assertEqual(count, tableprint.BATCH_SIZE + 2)
+        self.assertEqual(total, sum(r[1] for r in self.rows()))
+
+
+class TestExportReport(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.depgrp = depgraph.DependencyGroup(
+            [('/p/a', '/p/b'), ('/p/b', '/p/c'), ('/p/a', '/p/c')])
+        self.slocgrp = slocing.SlocGroup(
+            ['/p/a.py', '/p/b.py'],
+            [slocing.SlocInfo(3, 1, 0), slocing.SlocInfo(1, 0, 0)])
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    def testSqliteTablePerReport(self):
+        """Test that each report gets its own table in one database."""
+        filename = os.path.join(self.tempdir, 'reports.sqlite')
+        exporting.export_report('coupling', 'sqlite', filename,
+                                self.depgrp, '/p')
+        exporting.export_report('couplingrank', 'sqlite', filename,
+                                self.depgrp, '/p')
+        exporting.export_report('sloc', 'sqlite', filename,
+                                self.slocgrp, '/p')
+        conn = sqlite3.connect(filename)
+        self.assertEqual(
+            conn.execute('SELECT ca, ce FROM coupling WHERE filename = ?',
+                         ['c']).fetchone(), (2, 0))
+        ranked = conn.execute('SELECT filename FROM couplingrank').fetchall()
+        self.assertEqual(ranked[0], ('c',))
+        self.assertEqual(conn.execute('SELECT SUM(code) FROM sloc').fetchone(),
+                         (4,))
+        conn.close()
+
+    def testJsonLines(self):
+        filename = os.path.join(self.tempdir, 'report_coupling.jsonl')
+        exporting.export_report('coupling', 'jsonl', filename,
+                                self.depgrp, '/p')
+        with open(filename) as f:
+            rows = [json.loads(line) for line in f]
+        self.assertEqual([r['filename'] for r in rows], ['a', 'b', 'c'])
+        self.assertEqual(rows[1]['instability'], 0.5)
+
+    def testUnknown(self):
+        self.assertRaises(ValueError, exporting.create_formatter,
+                          'sloc', 'xml', None)
+        self.assertRaises(ValueError, exporting.create_formatter,
+                          'nope', 'csv', None)
@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import pynocle.cyclcompl as cyclcompl
+import pynocle.depgraph as depgraph
+import pynocle.history as history
+import pynocle.sloc.slocing as slocing
+
+#Each run's source for a.py and b.py.  a.py gets more complex every run,
+#b.py only in the last.
+_RUNS = [
+    ('def f(x):\n    return x\n',
+     'def g(x):\n    return x\n'),
+    ('def f(x):\n    if x:\n        return 1\n    return x\n',
+     'def g(x):\n    return x\n'),
+    ('def f(x):\n    if x:\n        return 1\n    elif x > 1:\n'
+     '        return 2\n    while x:\n        x -= 1\n    return x\n',
+     'def g(x):\n    if x:\n        return 1\n    return x\n')]
+
+
+class TestHistoryStore(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.filenames = [os.path.join(self.tempdir, 'a.py'),
+                          os.path.join(self.tempdir, 'b.py')]
+        self.store = history.HistoryStore(':memory:')
+        self.runids = [self.record(i, sources)
+                       for i, sources in enumerate(_RUNS)]
+
+    def tearDown(self):
+        self.store.close()
+        shutil.rmtree(self.tempdir)
+
+    def record(self, i, sources):
+        for filename, source in zip(self.filenames, sources):
+            with open(filename, 'w') as f:
+                f.write(source)
+        slocgrp = slocing.SlocGroup(
+            self.filenames, map(slocing.count_file, self.filenames))
+        ccdata = cyclcompl.measure_cyclcompl(self.filenames)
+        a, b = [os.path.splitext(f)[0] for f in self.filenames]
+        depgrp = depgraph.DependencyGroup([(a, b)])
+        return self.store.record_run('commit%s' % i, slocgrp, ccdata, depgrp,
+                                     self.tempdir, created=i)
+
+    def testRuns(self):
+        self.assertEqual(self.store.runs(2),
+                         [(self.runids[2], 'commit2', 2),
+                          (self.runids[1], 'commit1', 1)])
+        self.assertEqual(len(self.store.runs()), 3)
+
+    def testFileHistory(self):
+        hist = self.store.file_history('a', 'cc.max')
+        self.assertEqual([commit for _, commit, _ in hist],
+                         ['commit0', 'commit1', 'commit2'])
+        values = [value for _, _, value in hist]
+        self.assertTrue(values[0] < values[1] < values[2], values)
+        self.assertEqual(self.store.file_history('a', 'ce')[-1][2], 1)
+
+    def testTopGrowth(self):
+        top = self.store.top_growth('cc.total', runs=3)
+        self.assertEqual([row[0] for row in top], ['a', 'b'])
+        for path, first, last, growth in top:
+            self.assertEqual(growth, last - first)
+        self.assertTrue(top[0][3] > top[1][3] > 0, top)
+        #Over the last two runs, b grew as much as a did.
+        top = self.store.top_growth('cc.total', runs=2, limit=1)
+        self.assertEqual(len(top), 1)
+        self.assertEqual(top[0][3], 2)
+
+    def testIndexes(self):
+        indexes = set(row[0] for row in self.store.connection.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'index'"))
+        for name in ('file_metrics_file_run', 'file_metrics_metric_run',
+                     'func_metrics_file_run', 'func_metrics_metric_run'):
+            self.assertTrue(name in indexes, name)
+        plan = ' '.join(str(row) for row in self.store.connection.execute(
+            'EXPLAIN QUERY PLAN ' + history._TOP_GROWTH, {
+                'metric': 1, 'startrun': 1, 'lastrun': 3, 'limit': 20}))
+        self.assertTrue('file_metrics_metric_run' in plan, plan)
+
+
+if __name__ == '__main__':
+    unittest.main()
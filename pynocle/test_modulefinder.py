@@ -1,16 +1,19 @@
+import imp
 import os
 import shutil
 import sys
 import tempfile
 import unittest
 
+import pynocle
 import pynocle._modulefinder as modulefinder
+import pynocle.utils as utils
 
 
 THISDIR = os.path.dirname(os.path.abspath(__file__))
 
 
-class TestGetModuleFilename(unittest.TestCase):
+class TempDirsTestCase(unittest.TestCase):
     def setUp(self):
         self.temproot = None
 
@@ -39,6 +42,8 @@ class TestGetModuleFilename(unittest.TestCase):
         open(os.path.join(self.temp_fake_aa, 'eggs.py'), 'w').close()
         open(os.path.join(self.temp_fake_aa, 'spam.py'), 'w').close()
 
+
+class TestGetModuleFilename(TempDirsTestCase):
     def testFindsBuiltins(self):
         """Test that it returns only the modulename for builtin modules."""
         self.assertEqual('sys', modulefinder.get_module_filename('sys'))
@@ -74,8 +79,110 @@ class TestGetModuleFilename(unittest.TestCase):
         aaeggs = os.path.join(self.temp_fake_aa, 'eggs.py')
         self.assertEqual(expected, modulefinder.get_module_filename('_fake.a.aa.spam', aaeggs))
 
+    def testTopLevelPackageIsDirectory(self):
+        """Test that an unimported top-level package resolves to its
+        directory, including when it was only imported to start
+        worker processes."""
+        self.buildTempDirs()
+        self.assertEqual(self.temp_fake,
+                         modulefinder.get_module_filename('_fake'))
+        __import__('_fake')
+        try:
+            utils.POOL_MODULES.add('_fake')
+            self.assertEqual(self.temp_fake,
+                             modulefinder.get_module_filename('_fake'))
+        finally:
+            utils.POOL_MODULES.discard('_fake')
+            del sys.modules['_fake']
+
     def testPynocleImportsPynocle(self):
         """Test that importing pynocle works from a folder in the pynocle folder."""
         self.buildTempDirs()
         expected = os.path.join(THISDIR, '__init__')
         self.assertEqual(expected, modulefinder.get_module_filename('pynocle', __file__))
+
+
+class TestModuleIndex(TempDirsTestCase):
+    def testFindModuleMatchesImp(self):
+        """Test that find_module returns the same paths as imp.find_module."""
+        self.buildTempDirs()
+        index = modulefinder.ModuleIndex()
+        for name, paths in [('_fake', None),
+                            ('a', [self.temp_fake]),
+                            ('aa', [self.temp_fake_a]),
+                            ('spam', [self.temp_fake_aa]),
+                            ('os', None)]:
+            self.assertEqual(imp.find_module(name, paths)[1],
+                             index.find_module(name, paths))
+        self.assertRaises(ImportError, index.find_module, 'nope',
+                          [self.temp_fake_aa])
+
+    def testListsDirectoriesOnce(self):
+        """Test that repeated lookups do not list directories again."""
+        self.buildTempDirs()
+        index = modulefinder.ModuleIndex()
+        index.find_module('spam', [self.temp_fake_aa])
+        listdirs = index.listdirs
+        index.find_module('eggs', [self.temp_fake_aa])
+        index.find_module('spam', [self.temp_fake_aa])
+        self.assertEqual(index.listdirs, listdirs)
+
+
+class TestModuleFinderCache(TempDirsTestCase):
+    def testCachedByDirectory(self):
+        """Test that files in the same directory share cached lookups."""
+        self.buildTempDirs()
+        cache = modulefinder.ModuleFinderCache()
+        eggs = os.path.join(self.temp_fake_aa, 'eggs.py')
+        spam = os.path.join(self.temp_fake_aa, 'spam.py')
+        self.assertEqual(cache.get_module_filename('aa', eggs),
+                         cache.get_module_filename('aa', spam))
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+    def testSaveLoad(self):
+        """Test that saved results are loaded until a name
+        they looked up is added or removed."""
+        self.buildTempDirs()
+        #Lookups do not depend on names they never asked about,
+        #so the store can be next to the modules.
+        filename = os.path.join(self.temp_fake_aa, 'cache', 'mfc.pickle')
+        eggs = os.path.join(self.temp_fake_aa, 'eggs.py')
+        cache = modulefinder.ModuleFinderCache()
+        expected = cache.get_module_filename('spam', eggs)
+        cache.save(filename)
+
+        cache = modulefinder.ModuleFinderCache()
+        self.assertEqual(cache.load(filename), 1)
+        self.assertEqual(cache.get_module_filename('spam', eggs), expected)
+        self.assertEqual((cache.hits, cache.misses), (1, 0))
+
+        open(os.path.join(self.temp_fake_aa, 'ham.py'), 'w').close()
+        cache = modulefinder.ModuleFinderCache()
+        self.assertEqual(cache.load(filename), 1)
+        self.assertEqual(cache.stale, 0)
+
+        os.remove(os.path.join(self.temp_fake_aa, 'spam.py'))
+        cache = modulefinder.ModuleFinderCache()
+        self.assertEqual(cache.load(filename), 0)
+        self.assertEqual(cache.stale, 1)
+
+    def testReportsInsideRootdir(self):
+        """Test that rewriting the reports and cache inside rootdir
+        does not make any saved results stale."""
+        self.buildTempDirs()
+        with open(os.path.join(self.temp_fake_aa, 'eggs.py'), 'w') as f:
+            f.write('import os\nimport spam\nimport _fake.a\n')
+        def generate():
+            m = pynocle.Monocle(
+                'proj', os.path.join(self.temproot, 'out'),
+                rootdir=self.temproot,
+                cachedir=os.path.join(self.temproot, 'cache'))
+            try:
+                m.generate_all()
+            except utils.AggregateError:
+                pass #Rendering the graph needs dot, which may be missing.
+            return m.modulefinder_cache
+        generate()
+        cache = generate()
+        self.assertTrue(cache.loaded)
+        self.assertEqual(cache.stale, 0)
@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+
+import os
+import unittest
+
+import pynocle
+import pynocle._testutils as testutils
+import pynocle.depgraph as depgraph
+import pynocle.history as history
+import pynocle.sharding as sharding
+import pynocle.utils as utils
+
+
+class TestShards(unittest.TestCase):
+    def testByRoot(self):
+        """Test that files are sharded by top-level directory."""
+        root = os.path.abspath('root')
+        join = lambda *parts: os.path.join(root, *parts)
+        files = [join('setup.py'), join('a', 'x.py'), join('b', 'y.py'),
+                 join('a', 'sub', 'z.py')]
+        shards = sharding.shards_by_root(root, files)
+        self.assertEqual([s.name for s in shards], ['.', 'a', 'b'])
+        self.assertEqual(shards[1].filenames, [files[1], files[3]])
+
+    def testByCount(self):
+        shards = sharding.shards_by_count(['a', 'b', 'c'], 2)
+        self.assertEqual([s.filenames for s in shards], [['a', 'b'], ['c']])
+        self.assertRaises(ValueError, sharding.shards_by_count, ['a'], 0)
+
+
+class TestAnalyzeShards(testutils.TempModulesTestCase):
+    def setUp(self):
+        testutils.TempModulesTestCase.setUp(self)
+        self.writeModule('_sha/__init__', '')
+        self.writeModule('_sha/mod', 'import _shb.mod\nimport os\n')
+        self.writeModule('_shb/__init__', '')
+        self.writeModule('_shb/mod', 'import _sha\ndef f(a):\n    return a\n')
+        self.writeModule('_shb/bad', 'def (\n')
+
+    def testSameAsOneBuilder(self):
+        """Test that merged shards have the same results as analyzing
+        every file at once, including imports between shards."""
+        filenames = list(utils.walk_recursive(self.tempdir))
+        shards = sharding.shards_by_root(self.tempdir, filenames)
+        self.assertEqual(len(shards), 2)
+        result = sharding.analyze_shards(shards)
+        depb = depgraph.DepBuilder(filenames)
+        self.assertEqual(sorted(map(tuple, result.depgroup.dependencies)),
+                         sorted(map(tuple, depb.dependencies)))
+        self.assertEqual(sorted(result.depgroup.failed), sorted(depb.failed))
+        self.assertEqual(sorted(result.cc.filenames + result.ccfailures),
+                         sorted(filenames))
+        self.assertEqual(result.slocgroup().totallines(), 6)
+        self.assertEqual(result.external, [])
+
+    def testGenerateAllRecordsHistory(self):
+        """Test that sharded runs write the same steps as generate_all,
+        including recording the history."""
+        historyfile = os.path.join(self.tempdir, 'history.sqlite')
+        m = pynocle.Monocle('shards', os.path.join(self.tempdir, 'out'),
+                            rootdir=self.tempdir,
+                            history_filename=historyfile, commit='abc')
+        shards = sharding.shards_by_root(self.tempdir, m.filenames)
+        try:
+            sharding.generate_all(m, shards)
+        except utils.AggregateError:
+            pass #The graph cannot be rendered if dot is not installed.
+        with history.HistoryStore(historyfile) as store:
+            self.assertEqual([run[1] for run in store.runs()], ['abc'])
+            self.assertEqual(len(store.file_history('_shb/mod', 'cc.total')),
+                             1)
@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import pynocle.sourceunits as sourceunits
+
+
+class TestSourceUnitStore(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.filenames = []
+        for name in 'spam', 'eggs':
+            path = os.path.join(self.tempdir, name + '.py')
+            with open(path, 'w') as f:
+                f.write('import os\n\ndef %s():\n    pass\n' % name)
+            self.filenames.append(path)
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    def testReadOnce(self):
+        """Test that a file is only read once while it is in the store."""
+        store = sourceunits.SourceUnitStore(['a', 'b'])
+        store.register(self.filenames)
+        unit = store.get(self.filenames[0])
+        self.assertTrue(store.get(self.filenames[0]) is unit)
+        self.assertTrue(unit.ast is unit.ast)
+        self.assertEqual(store.loads, 1)
+
+    def testEvictedAfterAllStagesRelease(self):
+        """Test that a registered file stays until every stage releases it."""
+        store = sourceunits.SourceUnitStore(['a', 'b'])
+        store.register(self.filenames)
+        store.get(self.filenames[0])
+        store.release(self.filenames[0], 'a')
+        self.assertTrue(self.filenames[0] in store)
+        store.release(self.filenames[0], 'b')
+        self.assertFalse(self.filenames[0] in store)
+        self.assertEqual(store.nbytes, 0)
+
+    def testUnregisteredEvictedOnRelease(self):
+        """Test that unregistered files are dropped on the first release."""
+        store = sourceunits.SourceUnitStore(['a', 'b'])
+        store.get(self.filenames[0])
+        store.release(self.filenames[0], 'a')
+        self.assertEqual(len(store), 0)
+
+    def testRegisterAddsStages(self):
+        """Test that registering a file again adds to its stages,
+        so each stage can register the files it reads."""
+        store = sourceunits.SourceUnitStore(['a', 'b'])
+        store.register(self.filenames, ['a'])
+        store.register(self.filenames[:1], ['b'])
+        for filename in self.filenames:
+            store.get(filename)
+            store.release(filename, 'a')
+        self.assertEqual(list(store._units), self.filenames[:1])
+
+    def testBudget(self):
+        """Test that least recently used units are dropped when over budget."""
+        store = sourceunits.SourceUnitStore(['a'], max_bytes=1)
+        store.register(self.filenames)
+        store.get(self.filenames[0])
+        store.get(self.filenames[1])
+        self.assertFalse(self.filenames[0] in store)
+        self.assertTrue(self.filenames[1] in store)
+        self.assertEqual(store.evictions, 1)
+
+    def testSyntaxErrorRaisedEveryTime(self):
+        """Test that an unparseable unit raises SyntaxError each time."""
+        unit = sourceunits.SourceUnit('bad.py', source='def (:\n')
+        self.assertRaises(SyntaxError, lambda: unit.ast)
+        self.assertRaises(SyntaxError, lambda: unit.ast)
+
+    def testParseReleases(self):
+        """Test that parse releases the file for its stage,
+        even if it cannot be parsed."""
+        store = sourceunits.SourceUnitStore(['a', 'b'])
+        store.register(self.filenames)
+        ast = sourceunits.parse(self.filenames[0], 'a', store)
+        self.assertEqual(ast, store.get(self.filenames[0]).ast)
+        sourceunits.parse(self.filenames[0], 'b', store)
+        self.assertFalse(self.filenames[0] in store)
+        with open(self.filenames[1], 'w') as f:
+            f.write('def (:\n')
+        for stage in 'a', 'b':
+            self.assertRaises(SyntaxError, sourceunits.parse,
+                              self.filenames[1], stage, store)
+        self.assertEqual(len(store), 0)
+        self.assertRaises(SyntaxError, sourceunits.parse, self.filenames[1],
+                          'a')
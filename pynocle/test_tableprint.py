@@ -0,0 +1,48 @@
+#!/usr/bin/env python
+
+import json
+import re
+import StringIO
+import unittest
+
+import pynocle.tableprint as tableprint
+
+
+class TestPagedHtmlTable(unittest.TestCase):
+    def setUp(self):
+        self.table = tableprint.PagedHtmlTable(
+            'Title', [('Name', 'string'), ('Value', 'number')])
+
+    def write(self, rows):
+        out = StringIO.StringIO()
+        out.write(self.table.first_part())
+        self.table.write_second_part(out, rows)
+        out.write(self.table.last_part('<p>above</p>'))
+        return out.getvalue()
+
+    def chunks(self, html):
+        return [json.loads(c) for c in re.findall(
+            r'<script type="application/json" class="pynocle-rows">'
+            r'(.*?)</script>', html)]
+
+    def testChunks(self):
+        """Test that rows are written in chunks of compact JSON."""
+        rows = (['n%s' % i, {'v': i, 'f': '%s%%' % i}]
+                for i in range(tableprint.BATCH_SIZE + 1))
+        chunks = self.chunks(self.write(rows))
+        self.assertEqual(map(len, chunks), [tableprint.BATCH_SIZE, 1])
+        self.assertEqual(chunks[1], [['n%s' % tableprint.BATCH_SIZE,
+                                      {'v': tableprint.BATCH_SIZE,
+                                       'f': '%s%%' % tableprint.BATCH_SIZE}]])
+
+    def testSelfContained(self):
+        """Test that the page loads no scripts from elsewhere."""
+        html = self.write([['a', 1]])
+        self.assertFalse('src=' in html)
+        self.assertTrue('<p>above</p><div id="table_div">' in html)
+
+    def testEscapesScriptEnd(self):
+        """Test that data cannot close the script element it is in."""
+        html = self.write([['</script><b>', 1]])
+        self.assertEqual(self.chunks(html), [[['</script><b>', 1]]])
+        self.assertFalse('</script><b>' in html)
@@ -0,0 +1,60 @@
+#!/usr/bin/env python
+
+import json
+import os
+import tempfile
+import unittest
+
+import pynocle.tracing as tracing
+
+
+class TestTracer(unittest.TestCase):
+    def testSpan(self):
+        """Test that a span records a complete event with its args."""
+        tracer = tracing.Tracer()
+        with tracer.span('parse', filename='a.py'):
+            pass
+        event, = tracer.events
+        self.assertEqual(event['ph'], 'X')
+        self.assertEqual(event['name'], 'parse')
+        self.assertEqual(event['args'], {'filename': 'a.py'})
+        self.assertTrue(event['dur'] >= 0)
+
+    def testSpanRecordsError(self):
+        """Test that a span is recorded if its block raises."""
+        tracer = tracing.Tracer()
+        def fail():
+            with tracer.span('fail'):
+                raise ValueError('boom')
+        self.assertRaises(ValueError, fail)
+        self.assertTrue('boom' in tracer.events[0]['args']['error'])
+
+    def testCounter(self):
+        tracer = tracing.Tracer()
+        tracer.counter('cache', hits=1, misses=2)
+        self.assertEqual(tracer.events[0]['ph'], 'C')
+        self.assertEqual(tracer.events[0]['args'], {'hits': 1, 'misses': 2})
+
+    def testSave(self):
+        """Test that the saved trace is valid JSON in the
+        Trace Event Format."""
+        tracer = tracing.Tracer()
+        with tracer.span('outer'):
+            tracer.instant('mark')
+        fd, filename = tempfile.mkstemp(suffix='.json')
+        os.close(fd)
+        try:
+            tracer.save(filename)
+            with open(filename) as f:
+                data = json.load(f)
+        finally:
+            os.remove(filename)
+        self.assertEqual([e['name'] for e in data['traceEvents']],
+                         ['mark', 'outer'])
+
+    def testNullTracer(self):
+        """Test that the null tracer records nothing."""
+        with tracing.NULL_TRACER.span('x', a=1):
+            tracing.NULL_TRACER.counter('y', b=2)
+        self.assertFalse(tracing.NULL_TRACER.enabled)
+        self.assertFalse(hasattr(tracing.NULL_TRACER, 'events'))
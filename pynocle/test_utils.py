@@ -1,8 +1,13 @@
 #!/usr/bin/env python
 
+import compiler
+import os
+import shutil
+import sys
 import tempfile
 import unittest
 
+import pynocle.analysiscache as analysiscache
 import pynocle.utils as utils
 
 
@@ -54,6 +59,117 @@ class TestSplitRootFileExt(unittest.TestCase):
         self.assertEqual(v, ('', '.eggs', ''))
 
 
+class TestFlatten(unittest.TestCase):
+    tree = ('a', [('b', [('c', []), ('d', [])]), ('e', [])])
+
+    def names(self, **kwargs):
+        return [n[0] for n in utils.flatten(self.tree, lambda n: n[1],
+                                            **kwargs)]
+
+    def testDepthFirst(self):
+        self.assertEqual(self.names(), ['a', 'b', 'c', 'd', 'e'])
+
+    def testPrune(self):
+        """Test that pruned nodes are yielded but their children are not."""
+        self.assertEqual(self.names(prune=lambda n: n[0] == 'b'),
+                         ['a', 'b', 'e'])
+
+    def testDeeperThanRecursionLimit(self):
+        depth = sys.getrecursionlimit() * 2
+        tree = (0, [])
+        for i in range(1, depth):
+            tree = (i, [tree])
+        self.assertEqual(len(list(utils.flatten(tree, lambda n: n[1]))),
+                         depth)
+
+
+class TestFlattenStatements(unittest.TestCase):
+    def testSkipsExpressions(self):
+        """Test that imports and classes in nested statements are found,
+        without walking into expressions."""
+        ast = compiler.parse(
+            'import a\n'
+            'if x(y + 1):\n'
+            '    class C:\n'
+            '        def f(self):\n'
+            '            from b import c\n')
+        nodes = list(utils.flatten_statements(ast))
+        kinds = [n.__class__.__name__ for n in nodes]
+        self.assertTrue('Import' in kinds)
+        self.assertTrue('From' in kinds)
+        self.assertTrue('Class' in kinds)
+        self.assertTrue('CallFunc' in kinds)
+        self.assertFalse('Add' in kinds)
+
+
+class TestWalkRecursive(unittest.TestCase):
+    def testMultiplePatterns(self):
+        """Test that files matching any pattern are yielded once."""
+        root = tempfile.mkdtemp()
+        try:
+            for name in 'a.py', 'b.c', 'c.txt':
+                open(os.path.join(root, name), 'w').close()
+            found = utils.walk_recursive(root, ('*.py', '*.c', 'a.*'))
+            self.assertEqual(sorted(map(os.path.basename, found)),
+                             ['a.py', 'b.c'])
+        finally:
+            shutil.rmtree(root)
+
+
+class TestDocHtml(unittest.TestCase):
+    def setUp(self):
+        self.rendered = []
+        self.oldrst_to_html = utils.rst_to_html
+        def rst_to_html(rststr):
+            self.rendered.append(rststr)
+            return '<p>%s</p>' % rststr
+        utils.rst_to_html = rst_to_html
+
+    def tearDown(self):
+        utils.rst_to_html = self.oldrst_to_html
+
+    def testParagraphsEscaped(self):
+        """Test that paragraphs are escaped rather than rendered."""
+        memo = utils.cached_rst_to_html
+        self.assertEqual(utils.doc_html('about', 'a <b> & *c*_'),
+                         '%s\n<p>a &lt;b&gt; &amp; *c*_</p>' % memo('about'))
+
+    def testRenderedOnce(self):
+        """Test that rst is rendered once per process,
+        and once per cache across processes."""
+        tempdir = tempfile.mkdtemp()
+        try:
+            memo = utils._RstHtmlMemo()
+            memo.cache = analysiscache.AnalysisCache(tempdir)
+            self.assertEqual(memo('x'), '<p>x</p>')
+            self.assertEqual(memo('x'), '<p>x</p>')
+            self.assertEqual(self.rendered, ['x'])
+            memo = utils._RstHtmlMemo()
+            memo.cache = analysiscache.AnalysisCache(tempdir)
+            self.assertEqual(memo('x'), '<p>x</p>')
+            self.assertEqual(self.rendered, ['x'])
+        finally:
+            shutil.rmtree(tempdir)
+
+    def testCacheScopedToReport(self):
+        """Test that a report's cache is only used while writing it."""
+        tempdir = tempfile.mkdtemp()
+        try:
+            cache = analysiscache.AnalysisCache(os.path.join(tempdir, 'c'))
+            class Formatter(utils.IReportFormatter):
+                def format_report_header(self):
+                    utils.doc_html('scoped')
+                def format_data(self, data):
+                    pass
+            utils.write_report(os.path.join(tempdir, 'r.html'), None,
+                               lambda f: Formatter(), rst_cache=cache)
+            self.assertTrue(cache.load(cache.key(
+                utils._RstHtmlMemo.KIND, 'scoped'))[0])
+            self.assertTrue(utils.cached_rst_to_html.cache is None)
+        finally:
+            shutil.rmtree(tempdir)
+
+
 class TestSwapKeysAndValues(unittest.TestCase):
     def testWorks(self):
         """Test that it works as described."""
@@ -67,6 +183,18 @@ class TestSwapKeysAndValues(unittest.TestCase):
         self.assertRaises(KeyError, utils.swap_keys_and_values, d)
 
 
+class TestParallelMap(unittest.TestCase):
+    def testOrderPreserved(self):
+        """Test that results come back in the order of items."""
+        items = range(-50, 50)
+        self.assertEqual(utils.parallel_map(abs, items, jobs=3),
+                         map(abs, items))
+
+    def testSerial(self):
+        """Test that a single job works without a pool."""
+        self.assertEqual(utils.parallel_map(len, ['a', 'bb']), [1, 2])
+
+
 class TestPrettifyPath(unittest.TestCase):
     def testWorks(self):
         """Test basic functionality."""
@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+
+import os
+import StringIO
+import unittest
+
+import pynocle
+import pynocle._testutils as testutils
+import pynocle.depgraph as depgraph
+import pynocle.watch as watch
+
+
+class TestWatcher(testutils.TempModulesTestCase):
+    ROOT = 'proj'
+
+    def setUp(self):
+        testutils.TempModulesTestCase.setUp(self)
+        self.writeModule('_wa', 'import _wb\n')
+        self.writeModule('_wb', 'def f(a):\n    return a\n')
+        m = pynocle.Monocle('proj', os.path.join(self.tempdir, 'out'),
+                            rootdir=self.rootdir)
+        self.out = StringIO.StringIO()
+        self.watcher = watch.Watcher(m, out=self.out)
+        self.watcher.start()
+
+    def testNothingChanged(self):
+        """Test that no reports are written if no files changed."""
+        self.assertEqual(self.watcher.poll_once(), [])
+
+    def testBodyChanged(self):
+        """Test that changing a function but not imports rewrites only
+        the SLOC and CC reports, with the new complexity."""
+        fn = self.writeModule('_wb', 'def f(a):\n    if a:\n        return a\n')
+        written = self.watcher.poll_once()
+        self.assertEqual(written, ['generate_sloc',
+                                   'generate_cyclomatic_complexity',
+                                   'generate_html_jump'])
+        ccs = dict((name, cc) for kind, name, cc in
+                   self.watcher.ccstats[fn].flatStats)
+        self.assertEqual(ccs['f'], 2)
+
+    def testImportsChanged(self):
+        """Test that changing imports updates the dependency graph
+        and rewrites the reports made from it."""
+        self.writeModule('_wb', 'import _wa\n')
+        written = self.watcher.poll_once()
+        self.assertTrue('generate_coupling_report' in written)
+        ext = lambda name: os.path.join(self.rootdir, name)
+        self.assertEqual(self.watcher.graph.outgoing(ext('_wb')), [ext('_wa')])
+
+    def testFileAdded(self):
+        """Test that added files are analyzed and removed files dropped."""
+        fn = self.writeModule('_wc', 'import _wa\n')
+        self.watcher.poll_once()
+        self.assertTrue(fn in self.watcher.monocle.filenames)
+        self.assertTrue(fn in self.watcher.slocinfos)
+        os.remove(fn)
+        self.watcher.poll_once()
+        self.assertFalse(fn in self.watcher.monocle.filenames)
+        self.assertFalse(fn in self.watcher.ccstats)
+
+    def assertSameAsRebuilt(self):
+        builder = depgraph.DepBuilder(self.watcher.monocle.filenames)
+        self.assertEqual(
+            sorted(tuple(d) for d in self.watcher.graph.dependencies),
+            sorted(tuple(d) for d in builder.dependencies))
+
+    def testAddedFileResolvesImports(self):
+        """Test that adding a module that another failed to import
+        adds the dependency on it without building the graph again,
+        and removing it removes the dependency."""
+        builder = self.watcher.builder
+        self.writeModule('_wa', 'import _wb\nimport _wd\n')
+        self.watcher.poll_once()
+        ext = lambda name: os.path.join(self.rootdir, name)
+        self.assertEqual(self.watcher.graph.outgoing(ext('_wa')),
+                         [ext('_wb')])
+        self.writeModule('_wd', 'import _wb\n')
+        self.watcher.poll_once()
+        self.assertTrue(self.watcher.builder is builder)
+        self.assertEqual(self.watcher.graph.outgoing(ext('_wa')),
+                         [ext('_wb'), ext('_wd')])
+        self.assertSameAsRebuilt()
+        os.remove(os.path.join(self.rootdir, '_wd.py'))
+        self.watcher.poll_once()
+        self.assertEqual(self.watcher.graph.outgoing(ext('_wa')),
+                         [ext('_wb')])
+        self.assertEqual(self.watcher.graph.outgoing(ext('_wd')), [])
+        self.assertSameAsRebuilt()
@@ -0,0 +1,124 @@
+#!/usr/bin/env python
+"""
+Opt-in timing traces of pynocle runs.
+
+A `Tracer` records spans (stages, files, external processes) and counters,
+and saves them in the Trace Event Format, which can be loaded into
+chrome://tracing, Perfetto (https://ui.perfetto.dev), or any other viewer
+that supports it.
+
+Everything that accepts a tracer defaults to `NULL_TRACER`,
+which records nothing and costs next to nothing.
+"""
+
+import os
+import thread
+import timeit
+
+
+class _NullSpan(object):
+    """Context manager that does nothing."""
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+class _Span(object):
+    """Context manager that records a complete ('X') event on exit."""
+    def __init__(self, tracer, name, category, args):
+        self.tracer = tracer
+        self.name = name
+        self.category = category
+        self.args = args
+        self.start = None
+
+    def __enter__(self):
+        self.start = self.tracer.now()
+        return self
+
+    def __exit__(self, *exc_info):
+        end = self.tracer.now()
+        event = self.tracer._event('X', self.name, self.category, self.start)
+        event['dur'] = end - self.start
+        if exc_info[0] is not None:
+            self.args['error'] = repr(exc_info[1])
+        if self.args:
+            event['args'] = self.args
+        return False
+
+
+class NullTracer(object):
+    """Tracer that records nothing."""
+    enabled = False
+
+    _nullspan = _NullSpan()
+
+    def span(self, name, category='pynocle', **args):
+        return self._nullspan
+
+    def counter(self, name, **values):
+        pass
+
+    def instant(self, name, category='pynocle', **args):
+        pass
+
+
+NULL_TRACER = NullTracer()
+
+
+class Tracer(NullTracer):
+    """Records spans and counters of a run.
+
+    Usage::
+
+        tracer = Tracer()
+        with tracer.span('parse', filename=filename):
+            ...
+        tracer.counter('cache', hits=10, misses=2)
+        tracer.save('trace.json')
+
+    Spans are recorded only in the process the tracer was created in;
+    work done in worker processes shows up as the span around the pool.
+    """
+    enabled = True
+
+    def __init__(self):
+        self.events = []
+        self.pid = os.getpid()
+        self._zero = timeit.default_timer()
+
+    def now(self):
+        """Returns the current time in microseconds since the tracer
+        was created."""
+        return (timeit.default_timer() - self._zero) * 1000000
+
+    def _event(self, phase, name, category, ts):
+        event = {'ph': phase, 'name': name, 'cat': category, 'ts': ts,
+                 'pid': self.pid, 'tid': thread.get_ident()}
+        self.events.append(event)
+        return event
+
+    def span(self, name, category='pynocle', **args):
+        """Returns a context manager that records how long its
+        block took.  args are shown with the span in the viewer."""
+        return _Span(self, name, category, args)
+
+    def counter(self, name, **values):
+        """Records the numeric values of a counter at this time."""
+        self._event('C', name, 'counter', self.now())['args'] = values
+
+    def instant(self, name, category='pynocle', **args):
+        """Records an event with no duration."""
+        event = self._event('i', name, category, self.now())
+        event['s'] = 't'
+        if args:
+            event['args'] = args
+
+    def save(self, filename):
+        """Writes all events recorded so far to filename as JSON."""
+        import json
+        with open(filename, 'w') as f:
+            json.dump({'traceEvents': self.events,
+                       'displayTimeUnit': 'ms'}, f)
@@ -4,11 +4,15 @@ Utilities for pynocle project.
 """
 
 import abc
-import xml.etree.ElementTree as ElementTree
+import cgi
+import contextlib
 import fnmatch
 import os
+import sys
 import traceback
 
+import pynocle.tracing as tracing
+
 
 class PynocleError(Exception):
     """Base class for custom exception hierarchy."""
@@ -43,6 +47,45 @@ class MissingDependencyError(PynocleError):
     pass
 
 
+class LazyModule(object):
+    """Stands in for the module `name` and imports it the first time
+    one of its attributes is used, so modules that are slow to import
+    (or may not be installed) cost nothing until they are needed.
+    Once imported, attributes are looked up as fast as on the module.
+
+    Usage::
+
+        numpy = utils.LazyModule('numpy')
+
+    :param name: Full name of the module, such as 'compiler.ast'.
+    :param missingmsg: If provided, raise a MissingDependencyError with
+      this message if the module cannot be imported,
+      instead of the ImportError.
+    """
+    def __init__(self, name, missingmsg=None):
+        self._lazyname = name
+        self._lazymissingmsg = missingmsg
+
+    def __repr__(self):
+        return 'LazyModule(%r)' % self._lazyname
+
+    def __getattr__(self, attr):
+        if attr.startswith('_lazy'):
+            raise AttributeError(attr)
+        try:
+            __import__(self._lazyname)
+        except ImportError:
+            if self._lazymissingmsg is None:
+                raise
+            raise MissingDependencyError(self._lazymissingmsg)
+        module = sys.modules[self._lazyname]
+        self.__dict__.update(module.__dict__)
+        return getattr(module, attr)
+
+
+compiler = LazyModule('compiler')
+
+
 class IReportFormatter(object):
     """General abc for all report formatters."""
     __metaclass__ = abc.ABCMeta
@@ -71,7 +114,8 @@ class IReportFormatter(object):
         """Writes data to self.outstream()"""
 
 
-def write_report(filename, data, formatter_factory):
+def write_report(filename, data, formatter_factory,
+                 tracer=tracing.NULL_TRACER, rst_cache=None):
     """Opens a stream for the file at filename and writes the
     header/data/footer using the provided formatter.
 
@@ -79,22 +123,107 @@ def write_report(filename, data, formatter_factory):
     :param data: Data to write into the report.
     :param formatter_factory: Callable that takes the filestream at
       filename and returns an IReportFormatter.
+    :param tracer: tracing.Tracer to record a span for
+      each part of the report in.
+    :param rst_cache: If provided, an analysiscache.AnalysisCache
+      for cached_rst_to_html to keep the report's about text in
+      while the report is written.
     """
     with open(filename, 'w') as f:
-        fmt = formatter_factory(f)
+        with cached_rst_to_html.using(rst_cache):
+            format_report(formatter_factory(f), data, tracer, filename)
+
+
+def format_report(fmt, data, tracer=tracing.NULL_TRACER, filename=None):
+    """Writes the header/data/footer of data using the IReportFormatter fmt,
+    for formatters that do not write to a file stream.
+
+    :param filename: Name of what is written to, for the tracer.
+    """
+    with tracer.span('format_report_header', filename=filename):
         fmt.format_report_header()
+    with tracer.span('format_data', filename=filename):
         fmt.format_data(data)
+    with tracer.span('format_report_footer', filename=filename):
         fmt.format_report_footer()
 
 
+#Names of the modules that were first imported to start worker processes.
+#_modulefinder does not find modules through sys.modules if they are in it,
+#so dependencies are the same whether or not workers were used.
+POOL_MODULES = set()
+
+
+@contextlib.contextmanager
+def _recording_pool_modules():
+    """Adds the modules imported in the block to POOL_MODULES."""
+    before = set(sys.modules)
+    try:
+        yield
+    finally:
+        POOL_MODULES.update(m for m in sys.modules if m not in before)
+
+
+def resolve_jobs(jobs):
+    """Returns the number of processes to use for a `jobs` argument.
+    None means 1 (run in this process),
+    0 or a negative number means one process per CPU.
+    """
+    if jobs is None:
+        return 1
+    if jobs < 1:
+        with _recording_pool_modules():
+            import multiprocessing
+        return multiprocessing.cpu_count()
+    return jobs
+
+
+def parallel_map(func, items, jobs=None):
+    """Returns a list of func(item) for each item in items,
+    in the same order as items.
+
+    If `resolve_jobs(jobs)` is more than 1, items are processed in a pool of
+    that many worker processes, so func and items must be picklable
+    (func should be a module-level function).
+    On platforms that spawn rather than fork processes, callers need an
+    `if __name__ == '__main__'` guard in their main script.
+    """
+    items = list(items)
+    jobs = min(resolve_jobs(jobs), len(items))
+    if jobs <= 1:
+        return map(func, items)
+    with _recording_pool_modules():
+        import multiprocessing
+        pool = multiprocessing.Pool(jobs)
+        try:
+            #Several chunks per worker evens out files of very different
+            #sizes.
+            chunksize = max(1, len(items) // (jobs * 4))
+            return pool.map(func, items, chunksize)
+        finally:
+            pool.close()
+            pool.join()
+
+
 def walk_recursive(root, pattern='*.py'):
     """Walks through all files and directories under `root` and yields
     the full path of any filenames that
     `fnmatch.fnmatch(<fullpath>, pattern)`.
+
+    :param pattern: A pattern, or a collection of patterns,
+      in which case filenames matching any of them are yielded
+      (each only once).
     """
+    if isinstance(pattern, basestring):
+        patterns = [pattern]
+    else:
+        patterns = list(pattern)
     for root, dirnames, filenames in os.walk(root):
-        for filename in fnmatch.filter(filenames, pattern):
-            yield os.path.join(root, filename)
+        for filename in filenames:
+            for pat in patterns:
+                if fnmatch.fnmatch(filename, pat):
+                    yield os.path.join(root, filename)
+                    break
 
 
 def splitpath_root_file_ext(path):
@@ -104,18 +233,61 @@ def splitpath_root_file_ext(path):
     return head, filename, ext
 
 
-def flatten(node, getchildren):
-    """Return a generator that walks node and children recursively
-    (depth-first).
+def flatten(node, getchildren, prune=None):
+    """Return a generator that walks node and children depth-first
+    (node first, then each child and its children in order).
+    Uses an explicit stack, so the depth of the tree is not limited
+    by the recursion limit.
 
     :param node: Any node that has children.
     :param getchildren: A callable that takes node and
-      returns a collection of children that will be walked recursively.
+      returns a collection of children that will be walked.
+    :param prune: If provided, a callable that takes node and returns
+      True if its children should not be walked.
+      The node itself is still yielded.
     """
-    yield node
-    for child in getchildren(node):
-        for gc in flatten(child, getchildren):
-            yield gc
+    stack = [iter((node,))]
+    while stack:
+        for child in stack[-1]:
+            yield child
+            if prune is None or not prune(child):
+                stack.append(iter(getchildren(child)))
+            break
+        else:
+            stack.pop()
+
+
+#Names of compiler.ast nodes that can contain statements.
+_STATEMENT_CONTAINERS = (
+    'Module', 'Stmt', 'Function', 'Class', 'If', 'For', 'While',
+    'TryExcept', 'TryFinally', 'With')
+
+
+def ast_types(names):
+    """Returns a tuple of the compiler.ast node classes for names,
+    for use with isinstance.  Looked up on use so that compiler
+    is only imported when something is parsed."""
+    return tuple(getattr(compiler.ast, name) for name in names)
+
+
+def flatten_statements(astnode):
+    """Return a generator that walks astnode like `flatten`,
+    but does not walk into expressions, which cannot contain
+    statements such as imports, classes, and functions.
+    Expressions directly in a statement (such as the test of an If)
+    are still yielded.
+    """
+    containers = ast_types(_STATEMENT_CONTAINERS)
+    def prune(node):
+        return not isinstance(node, containers)
+    return flatten(astnode, lambda node: node.getChildNodes(), prune)
+
+
+def array_to_numpy(arr):
+    """Returns a numpy array with a copy of the values in the
+    array.array arr.  Copied so arr can still grow afterwards."""
+    import numpy
+    return numpy.frombuffer(arr, dtype=arr.typecode).copy()
 
 
 def swap_keys_and_values(d):
@@ -130,6 +302,14 @@ def swap_keys_and_values(d):
     return result
 
 
+def normsep(path):
+    """Returns path with any os.altsep replaced by os.sep.
+    Returns path unchanged on platforms without an altsep."""
+    if os.altsep:
+        return path.replace(os.altsep, os.sep)
+    return path
+
+
 def prettify_path(path, leading=None):
     """If path begins with `leading`,
     strip it and remove any new leading slashes.
@@ -137,8 +317,8 @@ def prettify_path(path, leading=None):
 
     :param leading: If None, cwd.
     """
-    leading = (leading or os.getcwd()).replace(os.altsep, os.sep)
-    s = os.path.splitext(path.replace(os.altsep, os.sep))[0]
+    leading = normsep(leading or os.getcwd())
+    s = os.path.splitext(normsep(path))[0]
     if s.startswith(leading):
         s = s.replace(leading, '')
     return s.strip(os.sep)
@@ -146,6 +326,7 @@ def prettify_path(path, leading=None):
 
 def rst_to_html(rststr):
     from docutils.core import publish_string
+    import xml.etree.ElementTree as ElementTree
     html = publish_string(rststr, writer_name='xml')
     el = ElementTree.fromstring(html)
     allparas = map(ElementTree.tostring, el)
@@ -155,3 +336,62 @@ def rst_to_html(rststr):
     s = s.replace('reference', 'a')
     s = s.replace('refuri', 'href')
     return s
+
+
+class _RstHtmlMemo(object):
+    """Callable that returns rst_to_html(rststr), rendering each rststr
+    only once per process, since docutils is slow to start.
+    Only use it for static rst, such as the about text of reports.
+
+    Attrs:
+
+    - cache: If set to an analysiscache.AnalysisCache,
+      fragments are also stored in it, to be shared across runs.
+      Set it for a block with `using`.
+    """
+    KIND = 'rst_to_html'
+
+    def __init__(self):
+        self.fragments = {}
+        self.cache = None
+
+    def __call__(self, rststr):
+        html = self.fragments.get(rststr)
+        if html is not None:
+            return html
+        key = None
+        found = False
+        if self.cache is not None:
+            key = self.cache.key(self.KIND, rststr)
+            found, html = self.cache.load(key)
+        if not found:
+            html = rst_to_html(rststr)
+            if key is not None:
+                self.cache.save(key, html)
+        self.fragments[rststr] = html
+        return html
+
+    @contextlib.contextmanager
+    def using(self, cache):
+        """Returns a context manager that sets self.cache to cache
+        until it exits, so a cache is only used by what it was given to."""
+        old = self.cache
+        self.cache = cache
+        try:
+            yield self
+        finally:
+            self.cache = old
+
+
+cached_rst_to_html = _RstHtmlMemo()
+
+
+def doc_html(rststr, *paragraphs):
+    """Returns the html for the static rststr (see cached_rst_to_html),
+    followed by a paragraph for each string in paragraphs.
+    paragraphs are escaped but not rendered as rst,
+    so they can have anything in them, such as paths."""
+    result = [cached_rst_to_html(rststr)]
+    for p in paragraphs:
+        result.append('<p>%s</p>' % cgi.escape(p))
+    return '\n'.join(result)
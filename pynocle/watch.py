@@ -0,0 +1,334 @@
+#!/usr/bin/env python
+"""
+Keeps the reports of a Monocle up to date while its files are edited.
+
+A Watcher analyzes every file once, keeps the results in memory,
+and then polls the files under the Monocle's rootdir for changes
+to their modification time or size.
+Only files that changed are analyzed again,
+and only the reports they affect are written again,
+so a report is usually updated within a poll interval of saving a file.
+
+Commandline usage: python -m pynocle.watch [options] rootdir
+"""
+
+import os
+import sys
+import time
+
+import pynocle
+import pynocle.cyclcompl as cyclcompl
+import pynocle.depgraph as depgraph
+import pynocle.sloc as sloc
+import pynocle.utils as utils
+
+
+def _stat(filename):
+    """Returns (mtime, size) of filename, or None if it does not exist."""
+    try:
+        st = os.stat(filename)
+    except OSError:
+        return None
+    return st.st_mtime, st.st_size
+
+
+class Changes(object):
+    """Files that were changed, added, and removed since the last poll.
+    Each attribute is a sorted list of filenames."""
+    def __init__(self, changed=(), added=(), removed=()):
+        self.changed = sorted(changed)
+        self.added = sorted(added)
+        self.removed = sorted(removed)
+
+    def __repr__(self):
+        return 'Changes(changed=%r, added=%r, removed=%r)' % (
+            self.changed, self.added, self.removed)
+
+    __str__ = __repr__
+
+    def __nonzero__(self):
+        return bool(self.changed or self.added or self.removed)
+
+    def all(self):
+        """Returns a set of every changed, added, and removed filename."""
+        return set(self.changed + self.added + self.removed)
+
+
+class Watcher(object):
+    """Regenerates the reports of a Monocle as its files change.
+
+    Call `start` to analyze every file and write all reports,
+    then `poll_once` (or `run`, which calls it every interval seconds)
+    to analyze the files that changed since and write the reports
+    they affect.
+
+    The coverage report is not generated,
+    since coverage data does not change when files are saved.
+    Dependencies are kept in an IncrementalDependencyGraph,
+    so a module that imports another more than once
+    counts towards its coupling once, unlike in `Monocle.generate_all`.
+
+    :param monocle: pynocle.Monocle to analyze files and write reports with.
+      Its filenames and sloc_filenames are updated as files are added
+      and removed.
+    :param interval: Seconds to wait between polls in `run`.
+    :param out: Stream to write a line to for each poll that
+      regenerated reports, and for each report that failed.
+    """
+    def __init__(self, monocle, interval=1.0, out=sys.stderr):
+        self.monocle = monocle
+        self.interval = interval
+        self.out = out
+        self.stats = {}
+        #Per-file results, so only changed files need to be analyzed.
+        self.slocinfos = {}
+        self.ccstats = {}
+        self.ccfailures = set()
+        self.builder = None
+        self.graph = None
+
+    def _scan_filenames(self):
+        """Returns (python filenames, sloc filenames) under the rootdir."""
+        m = self.monocle
+        filenames = list(utils.walk_recursive(m.rootdir))
+        sloc_filenames = filenames
+        if m.sloc_patterns is not None:
+            sloc_filenames = list(
+                utils.walk_recursive(m.rootdir, m.sloc_patterns))
+        return filenames, sloc_filenames
+
+    def _scan(self):
+        """Updates the Monocle's filenames from the rootdir and returns
+        a dict of {filename: (mtime, size)} for each of them."""
+        m = self.monocle
+        m.filenames, m.sloc_filenames = self._scan_filenames()
+        stats = {}
+        for filename in set(m.filenames + m.sloc_filenames):
+            stat = _stat(filename)
+            if stat is not None:
+                stats[filename] = stat
+        return stats
+
+    def poll(self):
+        """Rescans the rootdir and returns the Changes since the last
+        scan."""
+        old = self.stats
+        self.stats = new = self._scan()
+        changed = [f for f in new if f in old and new[f] != old[f]]
+        added = [f for f in new if f not in old]
+        removed = [f for f in old if f not in new]
+        return Changes(changed, added, removed)
+
+    def _count_sloc(self, filenames):
+        m = self.monocle
+        slocinfos = sloc.slocing.count_files(
+            filenames, jobs=m.jobs, cache=m.analysiscache, tracer=m.tracer)
+        for filename, si in zip(filenames, slocinfos):
+            self.slocinfos[filename] = si
+
+    def _measure_cc(self, filenames):
+        m = self.monocle
+        table, failures = cyclcompl.measure_cyclcompl(
+            filenames, jobs=m.jobs, cache=m.analysiscache, tracer=m.tracer)
+        for filename, view in table:
+            self.ccstats[filename] = view
+            self.ccfailures.discard(filename)
+        for filename in failures:
+            self.ccstats.pop(filename, None)
+            self.ccfailures.add(filename)
+
+    def _build_graph(self):
+        m = self.monocle
+        self.builder = depgraph.DepBuilder(
+            m.filenames, jobs=m.jobs, cache=m.analysiscache, tracer=m.tracer)
+        self.graph = depgraph.IncrementalDependencyGraph(
+            self.builder.dependencies, self.builder.failed)
+
+    def _affected_dirs(self, filenames):
+        """Returns a set of the directories whose listings may have
+        changed when filenames were added or removed: the directory of
+        each, and its parents up to the rootdir, in case it is in a new
+        or removed package."""
+        rootdir = self.monocle.rootdir
+        dirnames = set()
+        for filename in filenames:
+            dirname = os.path.dirname(os.path.abspath(filename))
+            while dirname not in dirnames:
+                dirnames.add(dirname)
+                parent = os.path.dirname(dirname)
+                if dirname == rootdir or parent == dirname:
+                    break
+                dirname = parent
+        return dirnames
+
+    def _update_importers(self, filenames, removed):
+        """Looks up the module names whose results depended on the
+        directories of filenames again, and updates the graph for each
+        tracked module whose import of one of them now resolves
+        differently (including ones that failed and are found now).
+        Modules in removed are skipped.
+        Returns the number of dependencies added and removed."""
+        builder = self.builder
+        mfc = builder.modulefinder_cache
+        dropped = mfc.refresh(self._affected_dirs(filenames))
+        if not dropped:
+            return 0
+        removed = set(removed)
+        results = {}
+        changed = 0
+        for filename, names in sorted(builder.modulenames.items()):
+            if (filename in removed or
+                    not self.graph.tracked(builder._extless(filename),
+                                           builder)):
+                continue
+            dirname = os.path.dirname(filename)
+            for name in names:
+                key = name, dirname
+                if key not in dropped:
+                    continue
+                if key not in results:
+                    results[key] = mfc.get_module_filename(
+                        name, filename, stripext=False)
+                if results[key] != dropped[key]:
+                    changed += self.graph.update_file(filename, builder)
+                    break
+        return changed
+
+    def _update_graph(self, pychanges):
+        """Updates the dependency graph for the Changes to python files
+        in pychanges and returns True if any dependencies changed.
+        Only the lookups that depended on the directories of added and
+        removed files are done again, and only the modules whose imports
+        they change are parsed again."""
+        if not pychanges:
+            return False
+        failed = set(self.graph.failed)
+        changed = 0
+        if pychanges.added or pychanges.removed:
+            changed += self._update_importers(
+                pychanges.added + pychanges.removed, pychanges.removed)
+        for filename in pychanges.removed:
+            changed += self.graph.remove_file(filename, self.builder)
+        for filename in pychanges.added:
+            changed += self.graph.add_file(filename, self.builder)
+        for filename in pychanges.changed:
+            changed += self.graph.update_file(filename, self.builder)
+        return bool(changed) or failed != self.graph.failed
+
+    def _slocgroup(self):
+        filenames = self.monocle.sloc_filenames
+        return sloc.SlocGroup(
+            filenames, [self.slocinfos[f] for f in filenames])
+
+    def _cctable(self):
+        """Returns a CCTable and list of failures, in file order."""
+        filenames = self.monocle.filenames
+        table = cyclcompl.statbuilder.CCTable(
+            (f, self.ccstats[f]) for f in filenames if f in self.ccstats)
+        return table, [f for f in filenames if f in self.ccfailures]
+
+    def _write(self, slocchanged, ccchanged, graphchanged):
+        """Writes the reports affected by what changed with
+        Monocle.write_reports, and returns the names of the ones that
+        were written.  Failures are written to self.out,
+        and do not stop the other reports from being written.
+        Polls are not recorded in the history, since they are not runs."""
+        if not (slocchanged or ccchanged or graphchanged):
+            return []
+        failed = []
+        written = self.monocle.write_reports(
+            self._slocgroup() if slocchanged else None,
+            self._cctable() if ccchanged else None,
+            self.graph.to_group() if graphchanged else None,
+            failed=failed, record_history=False)
+        for name, exc_info in failed:
+            self.out.write('%s failed: %s\n' % (name, exc_info[1]))
+        return written
+
+    def start(self):
+        """Cleans the output directory, analyzes every file,
+        and writes every report.
+        Returns the names of the reports that were written."""
+        m = self.monocle
+        m.ensure_clean_output()
+        self.stats = self._scan()
+        self._count_sloc(m.sloc_filenames)
+        self._measure_cc(m.filenames)
+        self._build_graph()
+        return self._write(True, True, True)
+
+    def poll_once(self):
+        """Analyzes the files that changed since the last poll
+        (or `start`) and writes the reports affected by them.
+        Returns the names of the reports that were written,
+        which is empty if nothing changed."""
+        start = time.time()
+        changes = self.poll()
+        if not changes:
+            return []
+        m = self.monocle
+        slocset = set(m.sloc_filenames)
+        pyset = set(m.filenames)
+        slocremoved = [f for f in changes.removed if f in self.slocinfos]
+        pyremoved = [f for f in changes.removed
+                     if f in self.ccstats or f in self.ccfailures]
+        for filename in changes.removed:
+            self.slocinfos.pop(filename, None)
+            self.ccstats.pop(filename, None)
+            self.ccfailures.discard(filename)
+        slocfiles = [f for f in changes.changed + changes.added
+                     if f in slocset]
+        pychanges = Changes([f for f in changes.changed if f in pyset],
+                            [f for f in changes.added if f in pyset],
+                            pyremoved)
+        self._count_sloc(slocfiles)
+        self._measure_cc(pychanges.changed + pychanges.added)
+        graphchanged = self._update_graph(pychanges)
+        written = self._write(
+            bool(slocfiles or slocremoved), bool(pychanges), graphchanged)
+        self.out.write('%s file(s) changed, regenerated %s in %.2fs\n' % (
+            len(changes.all()), ', '.join(written) or 'nothing',
+            time.time() - start))
+        return written
+
+    def run(self, iterations=None):
+        """Calls `start`, then `poll_once` every self.interval seconds,
+        until interrupted (or iterations polls are done)."""
+        self.start()
+        done = 0
+        try:
+            while iterations is None or done < iterations:
+                time.sleep(self.interval)
+                self.poll_once()
+                done += 1
+        except KeyboardInterrupt:
+            pass
+
+
+def main(argv=None):
+    import optparse
+    parser = optparse.OptionParser(
+        usage='%prog [options] rootdir',
+        description='Writes the reports for rootdir, then rewrites the '
+                    'reports affected by each file that changes, '
+                    'until interrupted.')
+    parser.add_option('-o', '--output', default='pynocle_output',
+                      help='Directory to write reports to. [%default]')
+    parser.add_option('-n', '--name', default=None,
+                      help='Project name. [name of rootdir]')
+    parser.add_option('-i', '--interval', type='float', default=1.0,
+                      help='Seconds between polls. [%default]')
+    parser.add_option('--cachedir', default=None,
+                      help='Directory to cache analysis results in.')
+    opts, args = parser.parse_args(argv)
+    if len(args) != 1:
+        parser.error('Expected one rootdir.')
+    rootdir = os.path.abspath(args[0])
+    name = opts.name or os.path.basename(rootdir)
+    m = pynocle.Monocle(name, opts.output, rootdir=rootdir,
+                        cachedir=opts.cachedir)
+    Watcher(m, opts.interval).run()
+
+
+if __name__ == '__main__':
+    main()
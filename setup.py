@@ -10,6 +10,7 @@ setup(name="pynocle",
     download_url='http://pypi.python.org/pypi/pynocle',
 
     packages=['pynocle',
+              'pynocle.benchmark',
               'pynocle.cyclcompl',
               'pynocle.depgraph',
               'pynocle.funcinfo',